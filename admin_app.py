@@ -8,17 +8,26 @@ import json
 import os
 import re
 import shutil
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from dotenv import load_dotenv
-from flask import Flask, request, render_template, send_from_directory
-from openai import OpenAI
+from flask import Flask, g, jsonify, request, render_template, send_from_directory
+from markupsafe import escape
 
-from product_pipeline import ALLOWED_CATEGORIES, import_product
+from metrics import CATALOG_WRITE_SECONDS, CONTENT_TYPE, REGISTRY
+from nzgift import serialize
+from nzgift.locking import file_lock
+from product_pipeline import ALLOWED_CATEGORIES, REQUIRED_SNIPPETS, import_product, write_catalog_shards
 
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 ROOT = Path.cwd()
+if (ROOT / ".env").exists():
+    from dotenv import load_dotenv
+
+    load_dotenv()
 TEMPLATES_DIR = ROOT / "templates"
 OUTPUT_ROOT = ROOT
 
@@ -26,9 +35,83 @@ PORT = int(os.getenv("ADMIN_PORT", "5000"))
 MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
 OPENAI_API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+client: OpenAI | None = None
+product_page_template = ""
+worker_ready = False
 
 app = Flask(__name__, template_folder=str(TEMPLATES_DIR))
+STARTED_AT = time.time()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "nzgift_admin_request_seconds",
+    "Admin request latency by route.",
+    ("route", "method", "status"),
+)
+OPERATION_SECONDS = REGISTRY.histogram(
+    "nzgift_admin_operation_seconds",
+    "Latency of import_product and generate_full_html calls.",
+    ("operation", "outcome"),
+)
+OPERATIONS_TOTAL = REGISTRY.counter(
+    "nzgift_admin_operations_total",
+    "Count of import_product and generate_full_html calls.",
+    ("operation", "outcome"),
+)
+VALIDATION_FAILURES_TOTAL = REGISTRY.counter(
+    "nzgift_admin_validation_failures_total",
+    "Generated HTML rejected by validate_generated_html, by reason.",
+    ("reason",),
+)
+
+
+def init_worker() -> None:
+    # Build per-process state once: under serve_admin.py this runs in every worker.
+    global client, product_page_template, worker_ready
+    if OPENAI_API_KEY:
+        from openai import OpenAI
+
+        client = OpenAI(api_key=OPENAI_API_KEY)
+    product_page_template = (TEMPLATES_DIR / "product_page.html").read_text(encoding="utf-8")
+    app.jinja_env.get_template("admin_form.html")
+    worker_ready = True
+
+
+def create_app() -> Flask:
+    init_worker()
+    return app
+
+
+def timed_operation(operation: str, func, *args, **kwargs):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        result = func(*args, **kwargs)
+        outcome = "ok"
+        return result
+    finally:
+        OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+        OPERATIONS_TOTAL.inc(operation=operation, outcome=outcome)
+
+
+@app.before_request
+def start_request_timer() -> None:
+    g.request_started = time.perf_counter()
+    if not worker_ready:
+        init_worker()
+
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            route=route,
+            method=request.method,
+            status=str(response.status_code),
+        )
+    return response
 
 
 def slugify(text: str) -> str:
@@ -113,51 +196,54 @@ def extract_meta_description(html: str) -> str:
 
 
 def validate_generated_html(html: str, amazon_link: str) -> None:
-    required_snippets = [
-        "<html",
-        "</html>",
-        '<link rel="stylesheet" href="../style.css"',
-        '<script src="../app.js">',
-        'id="mainProductImage"',
-    ]
-    missing = [snippet for snippet in required_snippets if snippet not in html]
+    missing = [snippet for snippet in REQUIRED_SNIPPETS if snippet not in html]
     if missing:
+        VALIDATION_FAILURES_TOTAL.inc(reason="missing_required_content")
         raise ValueError(f"Generated HTML missing required content: {missing}")
     if amazon_link not in html:
+        VALIDATION_FAILURES_TOTAL.inc(reason="missing_affiliate_link")
         raise ValueError("Generated HTML does not include the affiliate link.")
     if "Swanndri" in html:
+        VALIDATION_FAILURES_TOTAL.inc(reason="template_text_leak")
         raise ValueError("Generated HTML still contains 'Swanndri' text.")
 
+
 def load_products_catalog(path: Path) -> list[dict]:
     if not path.exists():
         return []
-    data = json.loads(path.read_text(encoding="utf-8"))
+    data = serialize.read_json(path)
     if not isinstance(data, list):
         raise ValueError(f"Invalid catalog format in {path.name}: expected a list.")
     return data
 
 
 def write_products_catalog(path: Path, items: list[dict]) -> None:
-    tmp_path = path.with_suffix(".json.tmp")
-    backup_path = path.with_suffix(".json.bak")
+    with CATALOG_WRITE_SECONDS.time(writer="admin_app"):
+        _write_products_catalog(path, items)
+
 
-    payload = json.dumps(items, indent=2, ensure_ascii=True)
-    tmp_path.write_text(f"{payload}\n", encoding="utf-8")
+def _write_products_catalog(path: Path, items: list[dict]) -> None:
+    backup_path = path.with_suffix(".json.bak")
 
-    json.loads(tmp_path.read_text(encoding="utf-8"))
+    payload = serialize.dumps(items, ensure_ascii=True)
+    serialize.loads(payload)
 
     if path.exists():
         shutil.copy2(path, backup_path)
 
-    tmp_path.replace(path)
+    serialize.write_bytes_atomic(path, payload)
+    write_catalog_shards(path, items)
 
 
 def upsert_product_catalog(path: Path, product: dict) -> None:
-    items = load_products_catalog(path)
-    slug = product.get("slug")
-    items = [item for item in items if item.get("slug") != slug]
-    items.insert(0, product)
-    write_products_catalog(path, items)
+    # Held across the read and the write so a concurrent build or worker
+    # cannot slip a catalog write in between and have it overwritten.
+    with file_lock(path):
+        items = load_products_catalog(path)
+        slug = product.get("slug")
+        items = [item for item in items if item.get("slug") != slug]
+        items.insert(0, product)
+        write_products_catalog(path, items)
 
 
 
@@ -171,6 +257,28 @@ def ensure_writable_dir(path: Path) -> None:
         raise PermissionError(f"Cannot write to {path}. Fix permissions. Details: {e}")
 
 
+@app.route("/metrics")
+def metrics():
+    return REGISTRY.render(), 200, {"Content-Type": CONTENT_TYPE}
+
+
+@app.route("/healthz")
+def healthz():
+    checks = {
+        "templates": (TEMPLATES_DIR / "product_page.html").exists()
+        and (TEMPLATES_DIR / "admin_form.html").exists(),
+        "output_root": os.access(OUTPUT_ROOT, os.W_OK),
+    }
+    healthy = all(checks.values())
+    payload = {
+        "status": "ok" if healthy else "degraded",
+        "checks": checks,
+        "openai_configured": client is not None,
+        "uptime_seconds": round(time.time() - STARTED_AT, 1),
+    }
+    return jsonify(payload), 200 if healthy else 503
+
+
 @app.route("/style.css")
 def style_css():
     # Reuse your existing root style.css for the admin UI.
@@ -191,9 +299,16 @@ def admin_form():
             import_category = (request.form.get("import_category") or "").strip().lower()
 
             if import_url:
-                result = import_product(import_url, category=import_category or None)
+                result = timed_operation(
+                    "import_product", import_product, import_url, category=import_category or None
+                )
                 ok = True
                 message = f"Imported <code>{result['path']}</code>"
+                if result.get("possible_duplicates"):
+                    similar = ", ".join(
+                        f"<code>{escape(match['id'])}</code>" for match in result["possible_duplicates"]
+                    )
+                    message += f"<br>Possible duplicates: {similar}"
             else:
                 title = (request.form.get("title") or "").strip()
                 category = (request.form.get("category") or "").strip().lower()
@@ -228,9 +343,7 @@ def admin_form():
                 if OUTPUT_ROOT not in out_path.parents:
                     raise PermissionError("Blocked path traversal attempt.")
 
-                template_html = (TEMPLATES_DIR / "product_page.html").read_text(
-                    encoding="utf-8"
-                )
+                template_html = product_page_template
                 fields = {
                     "title": title,
                     "category": category,
@@ -242,7 +355,7 @@ def admin_form():
                     "image_alt": image_alt or title,
                     "slug": slug,
                 }
-                html = generate_full_html(template_html, fields)
+                html = timed_operation("generate_full_html", generate_full_html, template_html, fields)
                 validate_generated_html(html, amazon_link)
 
                 alt_text = image_alt or title
@@ -276,5 +389,6 @@ def admin_form():
 
 
 if __name__ == "__main__":
-    # Run from repo root: python admin_app.py
-    app.run(host="127.0.0.1", port=PORT, debug=True)
+    # Run from repo root: python admin_app.py (dev server).
+    # For concurrent use run serve_admin.py instead.
+    create_app().run(host="127.0.0.1", port=PORT, debug=os.getenv("FLASK_DEBUG", "1") == "1")
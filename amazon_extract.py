@@ -0,0 +1,280 @@
+# amazon_extract.py
+# Amazon page parsing helpers shared by the import pipeline and discovery.
+# Kept free of requests and the rendering code so callers that only parse
+# (discovery, checks, tooling) import nothing heavy.
+
+from __future__ import annotations
+
+import copy
+import html
+import json
+import os
+import re
+import time
+from typing import Any, Callable
+from urllib.parse import urlparse, urlunparse
+
+from tracing import span, traced
+
+ALLOWED_CATEGORIES = ["artwork", "clothing", "jewelry", "skincare", "food", "books"]
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+}
+# Substrings that mark an outbound link as Amazon's, short links included.
+AMAZON_HOSTS = ("amazon.", "amzn.to", "://a.co/")
+ASIN_RE = re.compile(r"/(?:dp|gp/product)/([A-Z0-9]{10})(?:[/?]|$)", re.I)
+# Point every Amazon fetch at a stand-in server, e.g. scripts/amazon_fixture_server.py.
+AMAZON_BASE_URL = os.getenv("AMAZON_BASE_URL", "").rstrip("/")
+# Per-page extraction budgets. Everything the extractors read sits in the
+# first few hundred KB, so a page past MAX_PAGE_CHARS is cut there; once
+# EXTRACT_TIME_BUDGET seconds are spent, the fields not yet extracted keep
+# their defaults. Either way the page's extraction report says so.
+MAX_PAGE_CHARS = int(os.getenv("NZGIFT_EXTRACT_MAX_CHARS", "3000000"))
+EXTRACT_TIME_BUDGET = float(os.getenv("NZGIFT_EXTRACT_SECONDS", "2"))
+# How far past its marker a block is looked for, so a missing end marker
+# costs a bounded scan rather than the rest of the page.
+BLOCK_WINDOW = 300_000
+
+# Each character can be consumed one way only and the possessive quantifiers
+# never give text back, so a missing close tag fails in one pass, not by
+# backtracking through the rest of the page.
+TITLE_RE = re.compile(r'id="productTitle"[^>]*+>([^<]*+(?:<(?!/span>)[^<]*+)*+)</span>')
+HEAD_TITLE_RE = re.compile(r"<title>([^<]*+)</title>", re.I)
+# An item also ends at the next item's opening tag, so unclosed items each
+# scan only up to their neighbour and the whole page is still one pass.
+LIST_ITEM_RE = re.compile(r'<span class="a-list-item">([^<]*+(?:<(?!/span>|span class="a-list-item">)[^<]*+)*+)</span>')
+DIV_CLOSE_RE = re.compile(r"</div>\s*+</div>")
+DYNAMIC_IMAGE_RE = re.compile(r'data-a-dynamic-image="([^"]+)"')
+MEDIA_URL_RE = re.compile(r"https://m\.media-amazon\.com/images/I/[A-Za-z0-9%+_,.-]+\.(?:jpg|jpeg|png|webp)")
+COLOR_IMAGES_RE = re.compile(r"'colorImages':\s*\{\s*'initial':\s*")
+
+
+def clean_text(text: str) -> str:
+    text = html.unescape(text or "")
+    text = re.sub(r"<[^>]+>", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def resolve_fetch_url(url: str) -> str:
+    if not AMAZON_BASE_URL:
+        return url
+    parsed = urlparse(url)
+    base = urlparse(AMAZON_BASE_URL)
+    return urlunparse((base.scheme, base.netloc, parsed.path, parsed.params, parsed.query, ""))
+
+
+@traced("parse")
+def extract_asin(url: str) -> str | None:
+    match = ASIN_RE.search(url)
+    return match.group(1).upper() if match else None
+
+
+def canonical_amazon_url(url: str) -> str:
+    asin = extract_asin(url)
+    if asin:
+        return f"https://www.amazon.com/dp/{asin}"
+    return url.split("?", 1)[0]
+
+
+def extract_title(raw_html: str) -> str:
+    match = TITLE_RE.search(raw_html)
+    if match:
+        return clean_text(match.group(1))
+    match = HEAD_TITLE_RE.search(raw_html)
+    if match:
+        title = clean_text(match.group(1))
+        title = re.sub(r"\s*:\s*Amazon\..*$", "", title)
+        return title
+    return "NZ Gift"
+
+
+def color_images(raw_html: str) -> list[dict[str, Any]]:
+    # The gallery's 'initial' list is JSON inside a JS object literal, so it is
+    # decoded in place: one linear pass that stops at the list's closing bracket.
+    marker = COLOR_IMAGES_RE.search(raw_html)
+    if not marker:
+        return []
+    try:
+        images, _ = json.JSONDecoder().raw_decode(raw_html[marker.end() : marker.end() + BLOCK_WINDOW])
+    except ValueError:
+        return []
+    return [image for image in images if isinstance(image, dict)] if isinstance(images, list) else []
+
+
+@traced("parse")
+def extract_dynamic_images(raw_html: str) -> list[str]:
+    grouped: list[str] = []
+    seen_media_ids: set[str] = set()
+
+    for image in color_images(raw_html):
+        chosen = (image.get("hiRes") or image.get("large") or "").strip()
+        media_id = image.get("physicalIdForMedia") or chosen
+        if not chosen or media_id in seen_media_ids:
+            continue
+        seen_media_ids.add(media_id)
+        grouped.append(chosen)
+
+    if grouped:
+        return grouped[:6]
+
+    urls: list[str] = []
+    match = DYNAMIC_IMAGE_RE.search(raw_html)
+    if match:
+        payload = html.unescape(match.group(1))
+        try:
+            data = json.loads(payload)
+            urls.extend(data.keys())
+        except Exception:
+            pass
+    if not urls:
+        urls = MEDIA_URL_RE.findall(raw_html)
+    unique: list[str] = []
+    for url in urls:
+        if url not in unique:
+            unique.append(url)
+    return unique[:6]
+
+
+@traced("parse")
+def extract_bullets(raw_html: str) -> list[str]:
+    source = raw_html
+    start = raw_html.find('<div id="feature-bullets"')
+    if start != -1:
+        end = DIV_CLOSE_RE.search(raw_html, start, start + BLOCK_WINDOW)
+        if end:
+            source = raw_html[start : end.end()]
+    bullets = LIST_ITEM_RE.findall(source)
+    cleaned = []
+    banned_fragments = [
+        "image unavailable",
+        "publication date",
+        "publisher",
+        "language",
+        "isbn",
+        "best sellers rank",
+        "customer reviews",
+        "amazon",
+        "ue.count",
+        "topreviewsdetailpagecount",
+        "review",
+    ]
+    for bullet in bullets:
+        text = clean_text(bullet)
+        low = text.lower()
+        if len(text) < 20:
+            continue
+        if any(fragment in low for fragment in banned_fragments):
+            continue
+        if re.search(r"#\d+\s+in\s+", low):
+            continue
+        cleaned.append(text)
+    deduped: list[str] = []
+    for item in cleaned:
+        if item not in deduped:
+            deduped.append(item)
+    return deduped[:5]
+
+
+# Field name -> (extractor, value used when the extractor does not run).
+PRODUCT_FIELDS: dict[str, tuple[Callable[[str], Any], Any]] = {
+    "title": (extract_title, "NZ Gift"),
+    "images": (extract_dynamic_images, []),
+    "bullets": (extract_bullets, []),
+}
+
+
+def extract_page(
+    raw_html: str,
+    fields: dict[str, tuple[Callable[[str], Any], Any]] = PRODUCT_FIELDS,
+    *,
+    max_chars: int = MAX_PAGE_CHARS,
+    seconds: float = EXTRACT_TIME_BUDGET,
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    # Runs each extractor under the page's budgets and returns the values with
+    # a report. Python cannot interrupt a running regex, so the time budget is
+    # checked between fields; the linear patterns and the size cut are what
+    # bound each single field.
+    started = time.perf_counter()
+    report: dict[str, Any] = {"chars": len(raw_html), "truncated": False, "skipped": [], "tripped": []}
+    with span("extract_page", "parse", chars=len(raw_html)) as attrs:
+        if len(raw_html) > max_chars:
+            raw_html = raw_html[:max_chars]
+            report["truncated"] = True
+            report["tripped"].append("size")
+        values: dict[str, Any] = {}
+        for name, (extract, default) in fields.items():
+            if time.perf_counter() - started > seconds:
+                values[name] = copy.copy(default)
+                report["skipped"].append(name)
+                continue
+            values[name] = extract(raw_html)
+        if report["skipped"]:
+            report["tripped"].append("time")
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        attrs.update(tripped=report["tripped"], skipped=report["skipped"])
+    return values, report
+
+
+def closed_by(end: str) -> Callable[[str, int], bool]:
+    return lambda text, begin: text.find(end, begin, begin + BLOCK_WINDOW) != -1
+
+
+def images_decoded(text: str, begin: int) -> bool:
+    return bool(color_images(text[begin : begin + BLOCK_WINDOW]))
+
+
+def bullets_closed(text: str, begin: int) -> bool:
+    return DIV_CLOSE_RE.search(text, begin, begin + BLOCK_WINDOW) is not None
+
+
+# Field name -> (start marker, test that the field is complete in the text
+# read so far, given where its marker starts).
+PRODUCT_MARKERS: dict[str, tuple[str, Callable[[str, int], bool]]] = {
+    "title": ('id="productTitle"', closed_by("</span>")),
+    "images": ("'colorImages':", images_decoded),
+    "bullets": ('<div id="feature-bullets"', bullets_closed),
+}
+AVAILABILITY_MARKER = ('id="availability"', closed_by("</div>"))
+
+
+class PageWatch:
+    # Fed a page as it downloads; says when every field's markup is complete
+    # so the fetch can stop. Marker searches resume where the previous chunk
+    # ended, so a page is scanned about once however it arrives.
+    def __init__(self, markers: dict[str, tuple[str, Callable[[str, int], bool]]] = PRODUCT_MARKERS) -> None:
+        self.waiting = dict(markers)
+        self.starts: dict[str, int] = {}
+        self.scanned = 0
+
+    def feed(self, text: str) -> bool:
+        for name, (marker, complete) in list(self.waiting.items()):
+            begin = self.starts.get(name)
+            if begin is None:
+                begin = text.find(marker, max(0, self.scanned - len(marker)))
+                if begin == -1:
+                    continue
+                self.starts[name] = begin
+            if complete(text, begin):
+                del self.waiting[name]
+        self.scanned = len(text)
+        return not self.waiting
+
+
+def guess_category(title: str, bullets: list[str]) -> str:
+    hay = f"{title} {' '.join(bullets)}".lower()
+    if any(word in hay for word in ["paperback", "hardcover", "book", "storybook", "author", "isbn"]):
+        return "books"
+    if any(word in hay for word in ["chocolate", "coffee", "tea", "honey", "snack", "food", "gift basket"]):
+        return "food"
+    if any(word in hay for word in ["serum", "cleanser", "mask", "oil", "cosmetic", "skincare", "beauty"]):
+        return "skincare"
+    if any(word in hay for word in ["pendant", "necklace", "earrings", "jade", "greenstone", "pounamu"]):
+        return "jewelry"
+    if any(word in hay for word in ["shirt", "beanie", "gloves", "wool", "merino", "clothing"]):
+        return "clothing"
+    return "artwork"
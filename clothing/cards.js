@@ -15,6 +15,8 @@
     const img = document.createElement("img");
     img.src = item.image || "";
     img.alt = item.alt || item.title || "";
+    img.loading = "lazy";
+    img.decoding = "async";
 
     imgWrap.appendChild(img);
 
@@ -33,17 +35,87 @@
     return link;
   };
 
-  fetch("./products.json")
-    .then((res) => (res.ok ? res.json() : []))
-    .then((items) => {
-      if (!Array.isArray(items) || items.length === 0) {
+  const appendCards = (items) => {
+    if (!Array.isArray(items) || items.length === 0) {
+      return;
+    }
+    const fragment = document.createDocumentFragment();
+    items.forEach((item) => {
+      fragment.appendChild(buildCard(item));
+    });
+    mount.appendChild(fragment);
+  };
+
+  const fetchJson = (url) =>
+    fetch(url).then((res) => (res.ok ? res.json() : Promise.reject(new Error(url))));
+
+  // Older deploys only have the single catalog file.
+  const loadFullCatalog = () =>
+    fetchJson("./products.json")
+      .then(appendCards)
+      .catch(() => {
+        // Silent fail for static hosting or missing catalog.
+      });
+
+  const loadShards = (manifest) => {
+    const pages = Array.isArray(manifest.pages) ? manifest.pages : [];
+    let next = 0;
+    let pending = null;
+
+    const loadNext = () => {
+      if (pending || next >= pages.length) {
+        return pending || Promise.resolve();
+      }
+      const url = "./catalog/" + pages[next] + "?v=" + encodeURIComponent(manifest.version || "");
+      pending = fetchJson(url)
+        .then((items) => {
+          next += 1;
+          appendCards(items);
+        })
+        .finally(() => {
+          pending = null;
+        });
+      return pending;
+    };
+
+    return loadNext().then(() => {
+      if (next >= pages.length) {
         return;
       }
-      items.forEach((item) => {
-        mount.appendChild(buildCard(item));
-      });
-    })
+      if (!("IntersectionObserver" in window)) {
+        const loadRest = () => (next < pages.length ? loadNext().then(loadRest) : null);
+        return loadRest();
+      }
+      const sentinel = document.createElement("div");
+      sentinel.className = "cards-sentinel";
+      sentinel.setAttribute("aria-hidden", "true");
+      mount.after(sentinel);
+
+      const observer = new IntersectionObserver(
+        (entries) => {
+          if (!entries.some((entry) => entry.isIntersecting)) {
+            return;
+          }
+          loadNext().then(() => {
+            if (next >= pages.length) {
+              observer.disconnect();
+              sentinel.remove();
+            } else {
+              // Re-observe so a sentinel that is still on screen fires again.
+              observer.unobserve(sentinel);
+              observer.observe(sentinel);
+            }
+          });
+        },
+        { rootMargin: "600px 0px" }
+      );
+      observer.observe(sentinel);
+    });
+  };
+
+  fetchJson("./catalog/manifest.json")
+    .then(loadShards, loadFullCatalog)
     .catch(() => {
-      // Silent fail for static hosting or missing catalog.
+      // A failed page fetch leaves the cards loaded so far in place.
     });
 })();
@@ -3,18 +3,25 @@ from __future__ import annotations
 import argparse
 import json
 
+from profiling import run_cli
 from product_pipeline import ALLOWED_CATEGORIES, import_product
+from tracing import write_run_log
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Import an Amazon product into NZ Gift Finder.")
     parser.add_argument("url", help="Amazon product URL")
     parser.add_argument("--category", choices=ALLOWED_CATEGORIES, help="Optional category override")
+    parser.add_argument("--trace-chrome", action="store_true", help="Also write a Chrome trace file to data/run_logs")
     args = parser.parse_args()
 
-    result = import_product(args.url, category=args.category)
+    try:
+        result = import_product(args.url, category=args.category)
+    finally:
+        trace_paths = write_run_log("import", chrome=args.trace_chrome)
+    result["trace"] = trace_paths
     print(json.dumps(result, indent=2))
 
 
 if __name__ == "__main__":
-    main()
+    run_cli(main, "import_amazon_product")
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import atexit
+import bisect
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from nzgift import serialize
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Set by serve_admin.py so gunicorn workers share their metrics: each process
+# snapshots its values into this directory and /metrics sums every snapshot,
+# whichever worker answers the scrape.
+MULTIPROCESS_DIR = os.getenv("NZGIFT_METRICS_DIR")
+FLUSH_INTERVAL = 0.5
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        on_change: Callable[[], None] | None = None,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        self._on_change = on_change
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        if self._on_change:
+            self._on_change()
+
+    def snapshot(self) -> dict[tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def merge(total: dict[tuple[str, ...], float], other: dict[tuple[str, ...], float]) -> None:
+        for key, value in other.items():
+            total[key] = total.get(key, 0.0) + value
+
+    def render(self, values: dict[tuple[str, ...], float] | None = None) -> list[str]:
+        items = sorted((self.snapshot() if values is None else values).items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        on_change: Callable[[], None] | None = None,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+        self._on_change = on_change
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, then +Inf count and sum.
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+        if self._on_change:
+            self._on_change()
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[dict[str, str]]:
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict[tuple[str, ...], list[float]]:
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def merge(total: dict[tuple[str, ...], list[float]], other: dict[tuple[str, ...], list[float]]) -> None:
+        for key, series in other.items():
+            current = total.get(key)
+            total[key] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, values: dict[tuple[str, ...], list[float]] | None = None) -> list[str]:
+        items = sorted((self.snapshot() if values is None else values).items())
+        lines: list[str] = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, float("inf")), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {_format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    def __init__(self, directory: str | Path | None = None) -> None:
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+        self.directory = Path(directory) if directory else None
+        self._dirty = threading.Event()
+        self._flusher: threading.Thread | None = None
+        self._snapshot_name = self._new_snapshot_name()
+        # A forked child gets no flusher thread, must not write over its
+        # parent's snapshot and must not report its parent's values again.
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @staticmethod
+    def _new_snapshot_name() -> str:
+        # Pids are reused once a worker exits, and the snapshots of exited
+        # workers are kept, so the pid alone could overwrite one of them.
+        return f"{os.getpid()}-{uuid.uuid4().hex[:12]}.json"
+
+    def _after_fork(self) -> None:
+        self._snapshot_name = self._new_snapshot_name()
+        self._flusher = None
+        if self.directory is not None:
+            for metric in self._metrics.values():
+                metric.clear()
+
+    def counter(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> Counter:
+        with self._lock:
+            metric = self._metrics.setdefault(name, Counter(name, help_text, labels, self._changed))
+        assert isinstance(metric, Counter), f"{name} is already registered as a {metric.kind}"
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        with self._lock:
+            metric = self._metrics.setdefault(name, Histogram(name, help_text, labels, buckets, self._changed))
+        assert isinstance(metric, Histogram), f"{name} is already registered as a {metric.kind}"
+        return metric
+
+    def _changed(self) -> None:
+        # Updates only set a flag; a background thread writes the snapshot at
+        # most every FLUSH_INTERVAL, so recording stays off the disk.
+        if self.directory is None:
+            return
+        self._dirty.set()
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+                    self._flusher.start()
+                    atexit.register(self.flush)
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._dirty.wait()
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self) -> None:
+        if self.directory is None:
+            return
+        self._dirty.clear()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        payload = {metric.name: [[list(key), value] for key, value in metric.snapshot().items()] for metric in metrics}
+        serialize.write_bytes_atomic(
+            self.directory / self._snapshot_name, serialize.dumps(payload, compact=True), durable=False
+        )
+
+    def _merged(self) -> dict[str, dict[tuple[str, ...], Any]]:
+        # This process's live values plus every other process's last snapshot
+        # (at most FLUSH_INTERVAL old), so a scrape never writes to disk.
+        # Snapshots of workers that have exited are kept, so counters never go
+        # backwards.
+        with self._lock:
+            metrics = dict(self._metrics)
+        totals: dict[str, dict[tuple[str, ...], Any]] = {name: metric.snapshot() for name, metric in metrics.items()}
+        for path in sorted(self.directory.glob("*.json")):
+            if path.name == self._snapshot_name:
+                continue
+            try:
+                payload = serialize.read_json(path)
+            except (OSError, ValueError):
+                continue
+            for name, entries in payload.items():
+                metric = metrics.get(name)
+                if metric is not None:
+                    metric.merge(totals[name], {tuple(key): value for key, value in entries})
+        return totals
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        merged = self._merged() if self.directory is not None else {}
+        lines: list[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(merged.get(metric.name)))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(MULTIPROCESS_DIR)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+CATALOG_WRITE_SECONDS = REGISTRY.histogram(
+    "nzgift_catalog_write_seconds",
+    "Time spent writing a category products.json.",
+    ("writer",),
+)
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from nzgift import critical_css
+from nzgift.config import DIST_DIR, ROOT
+from nzgift.state import load_json, now_iso, write_json
+
+MANIFEST_PATH = DIST_DIR / "asset-manifest.json"
+SKIP_DIRS = {
+    ".git", ".venv", "venv", "__pycache__", "node_modules",
+    "admin_templates", "data", "dist", "nzgift", "scripts", "templates",
+}
+PUBLISH_SUFFIXES = {
+    ".html", ".css", ".js", ".json", ".ico", ".png", ".jpg", ".jpeg", ".webp", ".gif", ".svg", ".xml",
+}
+PUBLISH_NAMES = {"CNAME", "robots.txt"}
+FINGERPRINT_SUFFIXES = {".css", ".js"}
+COMPRESS_SUFFIXES = {".html", ".css", ".js", ".json", ".svg", ".txt", ".xml", ".ico"}
+MIN_COMPRESS_BYTES = 512
+HASH_LENGTH = 10
+STYLESHEET = "style.css"
+SHELL_FRAGMENTS = ("header.html",)
+
+ASSET_REF_RE = re.compile(r'((?:href|src)=")([^"#?]+\.(?:css|js))([?#][^"]*)?"', re.I)
+HTML_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.S)
+CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+CSS_SPACE_RE = re.compile(r"\s*([{};,])\s*")
+
+
+def publish_sources(root: Path = ROOT) -> list[Path]:
+    found: list[Path] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if name not in SKIP_DIRS and not name.startswith("."))
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            if path.suffix.lower() in PUBLISH_SUFFIXES or name in PUBLISH_NAMES:
+                found.append(path)
+    return found
+
+
+def minify_css(text: str) -> str:
+    text = CSS_COMMENT_RE.sub("", text)
+    text = re.sub(r"\s+", " ", text)
+    return CSS_SPACE_RE.sub(r"\1", text).replace(";}", "}").strip() + "\n"
+
+
+def minify_js(text: str) -> str:
+    # Line-level only: drop indentation, blank lines and whole-line // comments.
+    # Anything finer needs a real tokenizer to stay safe around strings and regexes.
+    lines = [line.strip() for line in text.splitlines()]
+    return "\n".join(line for line in lines if line and not line.startswith("//")) + "\n"
+
+
+def minify_html(text: str) -> str:
+    if "<pre" in text or "<textarea" in text:
+        return text
+    text = HTML_COMMENT_RE.sub("", text)
+    lines = [line.strip() for line in text.splitlines()]
+    return "\n".join(line for line in lines if line) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js, ".html": minify_html}
+
+
+def fingerprinted_name(rel_path: str, data: bytes) -> str:
+    stem, suffix = posixpath.splitext(rel_path)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{suffix}"
+
+
+def rewrite_references(html: str, page_rel: str, asset_map: dict[str, str]) -> str:
+    page_dir = posixpath.dirname(page_rel)
+
+    def replace(match: re.Match[str]) -> str:
+        prefix, ref, tail = match.group(1), match.group(2), match.group(3) or ""
+        if "://" in ref or ref.startswith("//"):
+            return match.group(0)
+        absolute = ref.startswith("/")
+        target = posixpath.normpath(ref.lstrip("/") if absolute else posixpath.join(page_dir, ref))
+        output = asset_map.get(target)
+        if output is None:
+            return match.group(0)
+        new_ref = "/" + output if absolute else posixpath.relpath(output, page_dir or ".")
+        return f'{prefix}{new_ref}{tail}"'
+
+    return ASSET_REF_RE.sub(replace, html)
+
+
+def compress_siblings(path: Path, data: bytes) -> list[Path]:
+    written: list[Path] = []
+    if path.suffix.lower() not in COMPRESS_SUFFIXES or len(data) < MIN_COMPRESS_BYTES:
+        return written
+    gz_path = path.with_name(path.name + ".gz")
+    gz_path.write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    written.append(gz_path)
+    try:
+        import brotli
+    except ImportError:
+        return written
+    br_path = path.with_name(path.name + ".br")
+    br_path.write_bytes(brotli.compress(data, quality=11))
+    written.append(br_path)
+    return written
+
+
+def source_hash(path: Path, rel_path: str, previous: dict[str, Any]) -> str:
+    stat = path.stat()
+    entry = previous.get(rel_path)
+    if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        return entry["source_hash"]
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def critical_styles(sources: list[tuple[Path, str]], category_slugs: set[str]) -> dict[str, str]:
+    # Per page type, the stylesheet rules whose selectors only use classes,
+    # ids and tags that pages of that type (plus the injected header and the
+    # classes their scripts add) actually contain.
+    by_rel = dict((rel_path, path) for path, rel_path in sources)
+    if STYLESHEET not in by_rel:
+        return {}
+    shell: set[str] = set()
+    for name in SHELL_FRAGMENTS:
+        if name in by_rel:
+            shell |= critical_css.html_tokens(by_rel[name].read_text(encoding="utf-8"))
+    if "app.js" in by_rel:
+        shell |= critical_css.js_tokens(by_rel["app.js"].read_text(encoding="utf-8"))
+    tokens: dict[str, set[str]] = {}
+    for path, rel_path in sources:
+        kind = critical_css.page_type(rel_path, category_slugs)
+        if kind is None or path.suffix != ".html":
+            continue
+        found = tokens.setdefault(kind, set(shell))
+        found |= critical_css.html_tokens(path.read_text(encoding="utf-8"))
+        cards = path.parent / "cards.js"
+        if kind == "category" and cards.exists():
+            found |= critical_css.js_tokens(cards.read_text(encoding="utf-8"))
+    css = minify_css(by_rel[STYLESHEET].read_text(encoding="utf-8"))
+    return {kind: critical_css.filter_css(css, found) for kind, found in tokens.items()}
+
+
+def critical_report(critical: dict[str, str], stylesheet_bytes: int, pages: dict[str, int]) -> dict[str, Any]:
+    return {
+        kind: {
+            "pages": pages.get(kind, 0),
+            "blocking_css_bytes_before": stylesheet_bytes,
+            "inlined_critical_bytes": len(css.encode("utf-8")),
+            "blocking_css_bytes_saved": stylesheet_bytes - len(css.encode("utf-8")),
+        }
+        for kind, css in sorted(critical.items())
+    }
+
+
+def build_assets(*, force: bool = False, dist_dir: Path = DIST_DIR) -> dict[str, Any]:
+    started = time.perf_counter()
+    manifest_path = dist_dir / MANIFEST_PATH.name
+    manifest = load_json(manifest_path) if manifest_path.exists() else {}
+    recorded: dict[str, Any] = manifest.get("files", {})
+    previous = {} if force else recorded
+    files: dict[str, Any] = {}
+    stats = {"written": 0, "skipped": 0, "pruned": 0, "source_bytes": 0, "output_bytes": 0}
+
+    def emit(path: Path, rel_path: str, output_rel: str, key: str, produce: Callable[[], bytes | None]) -> None:
+        stat = path.stat()
+        entry = previous.get(rel_path)
+        if entry and entry["key"] == key and entry["output"] == output_rel and (dist_dir / output_rel).exists():
+            files[rel_path] = {**entry, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            stats["skipped"] += 1
+            return
+        out_path = dist_dir / output_rel
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        data = produce()
+        if data is None:
+            shutil.copyfile(path, out_path)
+            siblings: list[Path] = []
+            output_size = stat.st_size
+        else:
+            out_path.write_bytes(data)
+            siblings = compress_siblings(out_path, data)
+            output_size = len(data)
+        files[rel_path] = {
+            "source_hash": digests[rel_path],
+            "key": key,
+            "output": output_rel,
+            "siblings": [sibling.relative_to(dist_dir).as_posix() for sibling in siblings],
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "output_size": output_size,
+        }
+        stats["written"] += 1
+        stats["source_bytes"] += stat.st_size
+        stats["output_bytes"] += output_size
+
+    sources = [(path, path.relative_to(ROOT).as_posix()) for path in publish_sources()]
+    digests = {rel_path: source_hash(path, rel_path, recorded) for path, rel_path in sources}
+
+    # Fingerprinted CSS/JS first: pages can only be rewritten once their names are known.
+    asset_map: dict[str, str] = {}
+    for path, rel_path in sources:
+        suffix = path.suffix.lower()
+        if suffix not in FINGERPRINT_SUFFIXES:
+            continue
+        entry = previous.get(rel_path)
+        data = None
+        if entry and entry["key"] == digests[rel_path] and (dist_dir / entry["output"]).exists():
+            asset_map[rel_path] = entry["output"]
+        else:
+            data = MINIFIERS[suffix](path.read_text(encoding="utf-8")).encode("utf-8")
+            asset_map[rel_path] = fingerprinted_name(rel_path, data)
+        emit(path, rel_path, asset_map[rel_path], digests[rel_path], lambda data=data: data)
+
+    category_slugs = {path.parent.name for path, rel_path in sources if rel_path.count("/") == 1 and path.name == "products.json"}
+    critical = critical_styles(sources, category_slugs)
+    critical_digests = {kind: hashlib.sha256(css.encode("utf-8")).hexdigest()[:16] for kind, css in critical.items()}
+    stylesheet_output = asset_map.get(STYLESHEET)
+    page_counts: dict[str, int] = {}
+
+    # A page is stale when its source, any asset name it may reference, or the
+    # critical CSS for its page type changed.
+    map_digest = hashlib.sha256(json.dumps(asset_map, sort_keys=True).encode("utf-8")).hexdigest()
+    for path, rel_path in sources:
+        suffix = path.suffix.lower()
+        if suffix in FINGERPRINT_SUFFIXES:
+            continue
+        if suffix == ".html":
+            kind = critical_css.page_type(rel_path, category_slugs)
+            if kind:
+                page_counts[kind] = page_counts.get(kind, 0) + 1
+
+            def render_page(path: Path = path, rel_path: str = rel_path, kind: str | None = kind) -> bytes:
+                html = rewrite_references(path.read_text(encoding="utf-8"), rel_path, asset_map)
+                if kind and stylesheet_output:
+                    page_dir = posixpath.dirname(rel_path) or "."
+                    hrefs = {posixpath.relpath(stylesheet_output, page_dir), "/" + stylesheet_output}
+                    html = critical_css.optimise_page(html, kind, hrefs, critical.get(kind))
+                return minify_html(html).encode("utf-8")
+
+            key = f"{digests[rel_path]}:{map_digest}:{critical_digests.get(kind or '', '')}"
+            emit(path, rel_path, rel_path, key, render_page)
+        elif suffix in COMPRESS_SUFFIXES:
+            emit(path, rel_path, rel_path, digests[rel_path], path.read_bytes)
+        else:
+            emit(path, rel_path, rel_path, digests[rel_path], lambda: None)
+
+    live = {entry["output"] for entry in files.values()}
+    live.update(sibling for entry in files.values() for sibling in entry["siblings"])
+    for entry in recorded.values():
+        for output in [entry["output"], *entry.get("siblings", [])]:
+            if output not in live and (dist_dir / output).exists():
+                (dist_dir / output).unlink()
+                stats["pruned"] += 1
+
+    stylesheet_bytes = files[STYLESHEET]["output_size"] if STYLESHEET in files else 0
+    report = critical_report(critical, stylesheet_bytes, page_counts)
+    write_json(
+        manifest_path,
+        {"generated_at": now_iso(), "assets": asset_map, "critical_css": report, "files": files},
+        compact=True,
+    )
+    return {
+        **stats,
+        "files": len(files),
+        "assets": asset_map,
+        "critical_css": report,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Minify, fingerprint and precompress the site into dist/.")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and rebuild every output")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    result = build_assets(force=args.force)
+    print(json.dumps(result, indent=2))
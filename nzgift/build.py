@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from nzgift.config import BUILD_STATE_PATH, PAGE_SOURCES_DIR, PROPOSAL_PATH, ROOT, SCRIPTS_DIR, STATE_PATH
+from nzgift.locking import file_lock
+from nzgift.serialize import write_if_changed
+from nzgift.state import load_json, now_iso, write_json
+from tracing import span
+
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+
+@dataclass
+class Stage:
+    name: str
+    inputs: list[Path]
+    outputs: list[Path]
+    # Called with the inputs whose hash changed since the last successful run,
+    # or None when the stage has never run (or its outputs went missing).
+    run: Callable[[set[Path] | None], None]
+    deps: set[str] = field(default_factory=set)
+
+
+def rel(path: Path) -> str:
+    return path.relative_to(ROOT).as_posix()
+
+
+class FileHashes:
+    # sha256 per file, reused while (mtime_ns, size) is unchanged.
+    def __init__(self, cache: dict[str, list[Any]]) -> None:
+        self.cache = cache
+
+    def get(self, path: Path) -> str | None:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self.cache.pop(rel(path), None)
+            return None
+        key = rel(path)
+        cached = self.cache.get(key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        self.cache[key] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+
+def render_stage(source_path: Path) -> Stage:
+    import product_pipeline
+    from nzgift.related import RELATED_PATH, related_products
+
+    category = source_path.parent.name
+    page_path = ROOT / category / f"{source_path.stem}.html"
+
+    def run(changed: set[Path] | None) -> None:
+        source = load_json(source_path)
+        html_content = product_pipeline.render_page_source(source, related_products(source["id"]))
+        with span("write_product_page", "disk", path=rel(page_path)):
+            # Most related-index updates leave a given page's neighbours as
+            # they were; an identical page keeps its mtime for later stages.
+            write_if_changed(page_path, html_content.encode("utf-8"))
+
+    # The renderer and CATEGORY_META live in product_pipeline.py.
+    inputs = [source_path, ROOT / "product_pipeline.py", RELATED_PATH]
+    return Stage(f"render:{category}/{source_path.stem}", inputs, [page_path], run)
+
+
+def catalog_stage(category: str, source_paths: list[Path]) -> Stage:
+    import product_pipeline
+
+    catalog_path = ROOT / category / "products.json"
+
+    def run(changed: set[Path] | None) -> None:
+        paths = source_paths if changed is None else [path for path in source_paths if path in changed]
+        entries = [load_json(path)["card"] for path in paths]
+        with file_lock(catalog_path):
+            items = product_pipeline.load_catalog(catalog_path)
+            product_pipeline.write_catalog(catalog_path, product_pipeline.merge_catalog_entries(items, entries))
+
+    return Stage(f"catalog:{category}", list(source_paths), [catalog_path], run)
+
+
+def shards_stage(category_dir: Path) -> Stage:
+    import product_pipeline
+
+    catalog_path = category_dir / "products.json"
+
+    def run(changed: set[Path] | None) -> None:
+        product_pipeline.write_catalog_shards(catalog_path, product_pipeline.load_catalog(catalog_path))
+
+    manifest_path = category_dir / product_pipeline.CATALOG_SHARD_DIR / "manifest.json"
+    return Stage(f"shards:{category_dir.name}", [catalog_path], [manifest_path], run)
+
+
+def site_map_stage(category_inputs: dict[str, list[Path]]) -> Stage:
+    import build_site_map
+
+    shared = [ROOT / "index.html", *(ROOT / page / "index.html" for page in build_site_map.STATIC_PAGES)]
+    owner = {path: category for category, paths in category_inputs.items() for path in paths}
+
+    def run(changed: set[Path] | None) -> None:
+        if changed is None:
+            build_site_map.patch_site_map()
+            return
+        categories = {owner[path] for path in changed if path in owner}
+        build_site_map.patch_site_map(categories)
+
+    inputs = [*shared, *(path for paths in category_inputs.values() for path in paths)]
+    return Stage("site_map", inputs, [build_site_map.OUTPUT_PATH], run)
+
+
+def similarity_stage() -> Stage:
+    from similarity_index import INDEX_PATH, sync_index, update_index
+
+    def run(changed: set[Path] | None) -> None:
+        state = load_json(STATE_PATH) if STATE_PATH.exists() else None
+        proposals = load_json(PROPOSAL_PATH) if PROPOSAL_PATH.exists() else None
+        update_index(lambda index: sync_index(index, state, proposals))
+
+    return Stage("similarity_index", [STATE_PATH, PROPOSAL_PATH], [INDEX_PATH], run)
+
+
+def related_stage(source_paths: list[Path]) -> Stage:
+    from nzgift.related import RELATED_PATH, build_related, catalog_paths
+
+    def run(changed: set[Path] | None) -> None:
+        # build_related works out which products changed from its own digests.
+        build_related()
+
+    # A category's first import creates its products.json during this build.
+    catalogs = set(catalog_paths()) | {ROOT / path.parent.name / "products.json" for path in source_paths}
+    inputs = [*sorted(catalogs), *source_paths]
+    return Stage("related", inputs, [RELATED_PATH], run)
+
+
+def assets_stage(generated: set[Path]) -> Stage:
+    from nzgift.assets import MANIFEST_PATH, build_assets, publish_sources
+
+    def run(changed: set[Path] | None) -> None:
+        build_assets()
+
+    # The pipeline keeps its own per-file manifest; the graph only needs to
+    # know when any published file changed.
+    inputs = sorted(set(publish_sources()) | generated)
+    return Stage("assets", inputs, [MANIFEST_PATH], run)
+
+
+def deploy_manifest_stage() -> Stage:
+    from nzgift.assets import MANIFEST_PATH as ASSET_MANIFEST_PATH
+    from nzgift.deploy import DIFF_PATH, MANIFEST_PATH, write_build_manifest
+
+    def run(changed: set[Path] | None) -> None:
+        write_build_manifest()
+
+    return Stage("deploy_manifest", [ASSET_MANIFEST_PATH], [MANIFEST_PATH, DIFF_PATH], run)
+
+
+def build_graph() -> dict[str, Stage]:
+    import build_site_map
+
+    stages: list[Stage] = []
+    sources_by_category: dict[str, list[Path]] = {}
+    for source_path in sorted(PAGE_SOURCES_DIR.glob("*/*.json")):
+        sources_by_category.setdefault(source_path.parent.name, []).append(source_path)
+        stages.append(render_stage(source_path))
+    for category, source_paths in sources_by_category.items():
+        stages.append(catalog_stage(category, source_paths))
+
+    rendered = {path for stage in stages for path in stage.outputs}
+    category_inputs: dict[str, list[Path]] = {}
+    for category_dir in build_site_map.CATEGORY_DIRS:
+        stages.append(shards_stage(category_dir))
+        pages = set(category_dir.glob("*.html")) | {path for path in rendered if path.parent == category_dir}
+        category_inputs[category_dir.name] = [
+            category_dir / "products.json",
+            category_dir / "cards.js",
+            *sorted(pages),
+        ]
+    stages.append(assets_stage({path for stage in stages for path in stage.outputs}))
+    stages.append(deploy_manifest_stage())
+    stages.append(site_map_stage(category_inputs))
+    stages.append(similarity_stage())
+    stages.append(related_stage([path for paths in sources_by_category.values() for path in paths]))
+
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+    for stage in stages:
+        stage.deps = {producers[path] for path in stage.inputs if path in producers} - {stage.name}
+    return {stage.name: stage for stage in stages}
+
+
+def product_targets(category: str, slug: str) -> list[str]:
+    # Everything one imported product changes: its page, its category's
+    # catalog and shards, and that category's slice of the site map. Other
+    # pages pick up the new product as a related item on the next full build.
+    return [f"render:{category}/{slug}", f"catalog:{category}", f"shards:{category}", "site_map"]
+
+
+def select(graph: dict[str, Stage], targets: list[str] | None, *, with_deps: bool = True) -> dict[str, Stage]:
+    if not targets:
+        return graph
+    unknown = [name for name in targets if name not in graph]
+    if unknown:
+        raise ValueError(f"Unknown build target(s): {', '.join(unknown)}")
+    if not with_deps:
+        return {name: stage for name, stage in graph.items() if name in targets}
+    wanted: set[str] = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in wanted:
+            wanted.add(name)
+            pending.extend(graph[name].deps)
+    return {name: stage for name, stage in graph.items() if name in wanted}
+
+
+def levels(graph: dict[str, Stage]) -> list[list[Stage]]:
+    remaining = dict(graph)
+    done: set[str] = set()
+    ordered: list[list[Stage]] = []
+    while remaining:
+        ready = [stage for stage in remaining.values() if stage.deps & graph.keys() <= done]
+        if not ready:
+            raise ValueError(f"Build graph has a cycle among: {', '.join(sorted(remaining))}")
+        ordered.append(sorted(ready, key=lambda stage: stage.name))
+        for stage in ready:
+            done.add(stage.name)
+            del remaining[stage.name]
+    return ordered
+
+
+def run_build(
+    targets: list[str] | None = None,
+    *,
+    workers: int | None = None,
+    dry_run: bool = False,
+    force: bool = False,
+    with_deps: bool = True,
+) -> dict[str, Any]:
+    # with_deps=False runs exactly the named stages (in dependency order
+    # among themselves) and leaves their other upstream stages as they are.
+    started = time.perf_counter()
+    graph = select(build_graph(), targets, with_deps=with_deps)
+    # Builds share outputs and build_state.json, so concurrent runs (two admin
+    # imports, say) take turns rather than interleave.
+    with file_lock(BUILD_STATE_PATH):
+        build_state = load_json(BUILD_STATE_PATH) if BUILD_STATE_PATH.exists() else {}
+        records: dict[str, Any] = build_state.setdefault("stages", {})
+        hashes = FileHashes(build_state.setdefault("files", {}))
+
+        def snapshot(paths: list[Path]) -> dict[str, str | None]:
+            return {rel(path): hashes.get(path) for path in paths}
+
+        def plan(stage: Stage) -> tuple[bool, set[Path] | None]:
+            record = records.get(stage.name)
+            if force or record is None or snapshot(stage.outputs) != record["outputs"]:
+                return True, None
+            current = snapshot(stage.inputs)
+            changed = {path for path in stage.inputs if current[rel(path)] != record["inputs"].get(rel(path))}
+            return bool(changed), changed
+
+        ran: list[str] = []
+        skipped: list[str] = []
+        failed: dict[str, str] = {}
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            for level in levels(graph):
+                # Upstream stages have finished, so hashes here already reflect
+                # their outputs; a stage whose inputs came out identical is skipped.
+                planned = [(stage, *plan(stage)) for stage in level if not stage.deps & failed.keys()]
+                dirty = [(stage, changed) for stage, needed, changed in planned if needed]
+                skipped.extend(stage.name for stage, needed, _ in planned if not needed)
+                if dry_run:
+                    ran.extend(stage.name for stage, _ in dirty)
+                    continue
+
+                def execute(item: tuple[Stage, set[Path] | None]) -> None:
+                    stage, changed = item
+                    with span(stage.name, "build", changed=len(changed) if changed is not None else "all"):
+                        stage.run(changed)
+
+                futures = {stage.name: pool.submit(execute, (stage, changed)) for stage, changed in dirty}
+                for stage, _ in dirty:
+                    try:
+                        futures[stage.name].result()
+                    except Exception as exc:
+                        failed[stage.name] = f"{type(exc).__name__}: {exc}"
+                        continue
+                    records[stage.name] = {
+                        "inputs": snapshot(stage.inputs),
+                        "outputs": snapshot(stage.outputs),
+                        "built_at": now_iso(),
+                    }
+                    ran.append(stage.name)
+
+        if not dry_run:
+            write_json(BUILD_STATE_PATH, build_state, compact=True)
+    result = {
+        "stages": len(graph),
+        "ran": ran,
+        "skipped": len(skipped),
+        "failed": failed,
+        "dry_run": dry_run,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+    if failed:
+        raise RuntimeError(f"Build failed: {failed}")
+    return result
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from typing import Callable
+
+from nzgift.config import ROOT, SCRIPTS_DIR
+
+CHAIN_SEPARATOR = "+"
+
+# command -> (module, help). Modules are only imported when their command runs,
+# so `python -m nzgift validate` never pays for requests, bs4 or the admin app.
+COMMANDS: dict[str, tuple[str, str]] = {
+    "import": ("import_amazon_product", "Import an Amazon product into the site"),
+    "discover": ("discover_amazon_candidates", "Search Amazon and queue new product proposals"),
+    "build-map": ("build_site_map", "Rebuild data/site_map.json from the live pages"),
+    "bootstrap": ("bootstrap_state", "Create or normalise the automation state files"),
+    "validate": ("validate_automation_state", "Validate the automation state files"),
+    "lifecycle": ("nzgift.lifecycle", "Archive/restore products or approve/reject/import proposals"),
+    "copy-qa": ("run_copy_qa", "Lint generated product pages"),
+    "check-links": ("check_affiliate_links", "Check every Amazon affiliate link"),
+    "serve": ("serve_admin", "Serve the admin app with gunicorn"),
+    "posts": ("nzgift.posts", "Queue the next batch of posts and render roundup pages"),
+    "related": ("nzgift.related", "Precompute related products for product pages"),
+    "assets": ("nzgift.assets", "Minify, fingerprint and precompress the site into dist/"),
+    "deploy": ("nzgift.deploy", "Upload only what changed in dist/ to a target"),
+    "preview": ("nzgift.preview", "Serve the site locally"),
+    "watch": ("nzgift.watch", "Rebuild on file changes and live-reload the preview"),
+}
+
+
+def _ensure_paths() -> None:
+    for path in (SCRIPTS_DIR, ROOT):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+
+
+def run_module(module_name: str, prog: str, args: list[str]) -> None:
+    _ensure_paths()
+    module = importlib.import_module(module_name)
+    saved_argv = sys.argv
+    # Each entry point parses sys.argv itself; hand it just this command's args.
+    sys.argv = [prog, *args]
+    try:
+        module.main()
+    finally:
+        sys.argv = saved_argv
+
+
+def run_serve(args: list[str]) -> None:
+    if "--dev" in args:
+        parser = argparse.ArgumentParser(prog="nzgift serve --dev", description="Run the admin app on the dev server.")
+        parser.add_argument("--dev", action="store_true")
+        parser.add_argument("--host", default=os.getenv("ADMIN_HOST", "127.0.0.1"))
+        parser.add_argument("--port", type=int, default=int(os.getenv("ADMIN_PORT", "5000")))
+        options = parser.parse_args(args)
+        _ensure_paths()
+        from admin_app import create_app
+
+        # Same defaults as `python admin_app.py`: debugger on unless FLASK_DEBUG=0.
+        create_app().run(host=options.host, port=options.port, debug=os.getenv("FLASK_DEBUG", "1") == "1")
+        return
+    run_module("serve_admin", "nzgift serve", args)
+
+
+def run_build_command(args: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="nzgift build",
+        description="Rerun only the build stages whose inputs changed, in parallel where independent.",
+    )
+    parser.add_argument("targets", nargs="*", help="Stages to bring up to date, with their upstream (default: all)")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would run without running it")
+    parser.add_argument("--force", action="store_true", help="Rerun every selected stage")
+    parser.add_argument("--workers", type=int, help="Parallel stages (default: CPU count)")
+    parser.add_argument("--list", action="store_true", help="List stages and their dependencies")
+    options = parser.parse_args(args)
+
+    _ensure_paths()
+    from nzgift.build import build_graph, levels, run_build
+
+    if options.list:
+        for level in levels(build_graph()):
+            for stage in level:
+                print(f"{stage.name:<60} <- {', '.join(sorted(stage.deps)) or '-'}")
+        return
+    result = run_build(options.targets, workers=options.workers, dry_run=options.dry_run, force=options.force)
+    print(json.dumps(result, indent=2))
+
+
+def run_rebuild(args: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog="nzgift rebuild", description="Rebuild derived site data in one pass.")
+    parser.add_argument("--skip-copy-qa", action="store_true", help="Skip linting generated pages")
+    options = parser.parse_args(args)
+
+    # bootstrap is deliberately not part of this: it resets the queues.
+    run_build_command([])
+    if not options.skip_copy_qa:
+        run_module("run_copy_qa", "nzgift copy-qa", [])
+    run_module("validate_automation_state", "nzgift validate", [])
+
+
+def handler_for(command: str) -> Callable[[list[str]], None]:
+    if command == "serve":
+        return run_serve
+    if command == "rebuild":
+        return run_rebuild
+    if command == "build":
+        return run_build_command
+    module_name = COMMANDS[command][0]
+    return lambda args: run_module(module_name, f"nzgift {command}", args)
+
+
+def split_chain(argv: list[str]) -> list[list[str]]:
+    steps: list[list[str]] = [[]]
+    for arg in argv:
+        if arg == CHAIN_SEPARATOR:
+            steps.append([])
+        else:
+            steps[-1].append(arg)
+    return [step for step in steps if step]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    lines = [f"  {name:<12} {help_text}" for name, (_, help_text) in COMMANDS.items()]
+    lines.append(f"  {'build':<12} Rerun only the pages, catalogs and data files whose inputs changed")
+    lines.append(f"  {'rebuild':<12} build, then copy QA and validation in one process")
+    parser = argparse.ArgumentParser(
+        prog="nzgift",
+        description="NZ Gift Finder tooling.",
+        epilog="commands:\n" + "\n".join(lines) + "\n\nChain commands in one process with ' + ', e.g.\n"
+        "  python -m nzgift build-map + bootstrap + validate",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=[*COMMANDS, "build", "rebuild"], metavar="command")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    return parser
+
+
+def main() -> None:
+    _ensure_paths()
+    from profiling import run_cli
+
+    run_cli(_main, "nzgift")
+
+
+def _main() -> None:
+    parser = build_parser()
+    steps = split_chain(sys.argv[1:])
+    if not steps:
+        parser.print_help()
+        raise SystemExit(2)
+    parsed = [parser.parse_args(step) for step in steps]
+    for options in parsed:
+        started = time.perf_counter()
+        handler_for(options.command)(options.args)
+        if len(parsed) > 1:
+            print(f"[nzgift] {options.command} finished in {time.perf_counter() - started:.2f}s", file=sys.stderr)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = ROOT / "scripts"
+DATA_DIR = ROOT / "data"
+SITE_MAP_PATH = DATA_DIR / "site_map.json"
+STATE_PATH = DATA_DIR / "product_state.json"
+POST_QUEUE_PATH = DATA_DIR / "post_queue.json"
+PROPOSAL_PATH = DATA_DIR / "proposal_queue.json"
+RECHECK_QUEUE_PATH = DATA_DIR / "recheck_queue.json"
+RUN_LOGS_DIR = DATA_DIR / "run_logs"
+PAGE_SOURCES_DIR = DATA_DIR / "page_sources"
+BUILD_STATE_PATH = DATA_DIR / "build_state.json"
+LOCKS_DIR = DATA_DIR / "locks"
+DIST_DIR = ROOT / "dist"
+
+HTTP_TIMEOUT = float(os.getenv("NZGIFT_HTTP_TIMEOUT", "30"))
+FETCH_MAX_BYTES = int(os.getenv("NZGIFT_FETCH_MAX_BYTES", "3000000"))
+LOCK_TIMEOUT = float(os.getenv("NZGIFT_LOCK_TIMEOUT", "60"))
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import re
+from urllib.parse import urlparse
+
+PAGE_TYPES = ("home", "category", "product", "static")
+HINT_ORIGINS = ("https://fonts.googleapis.com", "https://fonts.gstatic.com")
+# Font files are fetched in CORS mode, so only their preconnect may carry
+# crossorigin; on any other origin it opens a connection the page never uses.
+CORS_ORIGINS = {"https://fonts.gstatic.com"}
+
+CLASS_ATTR_RE = re.compile(r'\bclass="([^"]*)"', re.I)
+ID_ATTR_RE = re.compile(r'\bid="([^"]*)"', re.I)
+TAG_RE = re.compile(r"<([a-zA-Z][\w-]*)")
+JS_CLASS_RE = re.compile(r"""(?:className\s*=|classList\.(?:add|toggle)\()\s*["']([^"']+)["']""")
+SELECTOR_CLASS_RE = re.compile(r"\.([\w-]+)")
+SELECTOR_ID_RE = re.compile(r"#([\w-]+)")
+SELECTOR_TAG_RE = re.compile(r"(?:^|[\s>+~])([a-zA-Z][\w-]*)")
+SELECTOR_NOISE_RE = re.compile(r"::?[\w-]+(?:\([^)]*\))?|\[[^\]]*\]")
+STYLESHEET_LINK_RE = re.compile(r'<link\s+rel="stylesheet"\s+href="([^"]+)"\s*/?>', re.I)
+MAIN_IMAGE_RE = re.compile(r'<img\b[^>]*\bid="mainProductImage"[^>]*>', re.I | re.S)
+SRC_RE = re.compile(r'\bsrc="([^"]+)"')
+
+
+def page_type(rel_path: str, category_slugs: set[str]) -> str | None:
+    parts = rel_path.split("/")
+    if rel_path == "index.html":
+        return "home"
+    if len(parts) != 2 or not parts[1].endswith(".html"):
+        return None
+    if parts[0] in category_slugs:
+        return "category" if parts[1] == "index.html" else "product"
+    return "static" if parts[1] == "index.html" else None
+
+
+def html_tokens(html: str) -> set[str]:
+    tokens = {f".{name}" for attr in CLASS_ATTR_RE.findall(html) for name in attr.split()}
+    tokens.update(f"#{value}" for value in ID_ATTR_RE.findall(html))
+    tokens.update(tag.lower() for tag in TAG_RE.findall(html))
+    return tokens
+
+
+def js_tokens(js: str) -> set[str]:
+    return {f".{name}" for value in JS_CLASS_RE.findall(js) for name in value.split()}
+
+
+def split_rules(css: str) -> list[tuple[str, str | None]]:
+    # Top-level (prelude, body) pairs; statements such as @import have no body.
+    rules: list[tuple[str, str | None]] = []
+    depth = 0
+    start = 0
+    body_start = 0
+    prelude = ""
+    quote = ""
+    for index, char in enumerate(css):
+        if quote:
+            if char == quote:
+                quote = ""
+            continue
+        if char in "\"'":
+            quote = char
+        elif char == "{":
+            if depth == 0:
+                prelude = css[start:index].strip()
+                body_start = index + 1
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                rules.append((prelude, css[body_start:index]))
+                start = index + 1
+        elif char == ";" and depth == 0:
+            rules.append((css[start:index].strip(), None))
+            start = index + 1
+    return rules
+
+
+def selector_used(selector: str, tokens: set[str]) -> bool:
+    selector = SELECTOR_NOISE_RE.sub("", selector).strip()
+    if not selector or selector == "*":
+        return True
+    needed = {f".{name}" for name in SELECTOR_CLASS_RE.findall(selector)}
+    needed.update(f"#{name}" for name in SELECTOR_ID_RE.findall(selector))
+    needed.update(tag.lower() for tag in SELECTOR_TAG_RE.findall(selector))
+    return needed <= tokens
+
+
+def filter_css(css: str, tokens: set[str]) -> str:
+    kept: list[str] = []
+    for prelude, body in split_rules(css):
+        if body is None:
+            if prelude.startswith("@import") or prelude.startswith("@charset"):
+                kept.append(prelude + ";")
+            continue
+        if prelude.startswith("@media") or prelude.startswith("@supports"):
+            inner = filter_css(body, tokens)
+            if inner:
+                kept.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith("@font-face"):
+            kept.append(f"{prelude}{{{body}}}")
+        elif prelude.startswith("@"):
+            continue
+        elif any(selector_used(selector, tokens) for selector in prelude.split(",")):
+            kept.append(f"{prelude}{{{body}}}")
+    return "".join(kept)
+
+
+def add_resource_hints(html: str, origins: list[str], preload_image: str | None) -> str:
+    hints = [
+        f'<link rel="preconnect" href="{origin}"{" crossorigin" if origin in CORS_ORIGINS else ""} />'
+        for origin in origins
+        if f'rel="preconnect" href="{origin}"' not in html
+    ]
+    if preload_image and f'rel="preload" as="image" href="{preload_image}"' not in html:
+        hints.append(f'<link rel="preload" as="image" href="{preload_image}" fetchpriority="high" />')
+    if not hints:
+        return html
+    # Straight after <head> so the preload scanner sees them before any CSS.
+    return re.sub(r"(<head(?:\s[^>]*)?>)", lambda match: match.group(1) + "\n" + "\n".join(hints), html, count=1)
+
+
+def prioritise_main_image(html: str) -> tuple[str, str | None]:
+    # The product hero is the LCP element: load it eagerly and at high priority.
+    match = MAIN_IMAGE_RE.search(html)
+    if not match:
+        return html, None
+    tag = match.group(0).replace('loading="lazy"', 'loading="eager"')
+    if "fetchpriority=" not in tag:
+        tag = tag.replace("<img", '<img fetchpriority="high"', 1)
+    src = SRC_RE.search(tag)
+    return html[: match.start()] + tag + html[match.end():], src.group(1) if src else None
+
+
+def inline_critical(html: str, stylesheet_hrefs: set[str], critical: str) -> str:
+    # Inline the above-the-fold rules and let the full sheet load without
+    # blocking first paint; <noscript> keeps it working without JS.
+    def replace(match: re.Match[str]) -> str:
+        if match.group(1) not in stylesheet_hrefs:
+            return match.group(0)
+        href = match.group(1)
+        return (
+            f"<style>{critical}</style>\n"
+            f'<link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'" />\n'
+            f'<noscript><link rel="stylesheet" href="{href}" /></noscript>'
+        )
+
+    return STYLESHEET_LINK_RE.sub(replace, html, count=1)
+
+
+def optimise_page(html: str, kind: str, stylesheet_hrefs: set[str], critical: str | None) -> str:
+    origins = list(HINT_ORIGINS) if critical and "fonts.googleapis.com" in critical else []
+    preload_image = None
+    if kind == "product":
+        html, preload_image = prioritise_main_image(html)
+        if preload_image and preload_image.startswith("http"):
+            parsed = urlparse(preload_image)
+            origins.append(f"{parsed.scheme}://{parsed.netloc}")
+    if stylesheet_hrefs and critical:
+        html = inline_critical(html, stylesheet_hrefs, critical)
+    return add_resource_hints(html, origins, preload_image)
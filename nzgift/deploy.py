@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from nzgift.config import DATA_DIR, DIST_DIR
+from nzgift.state import load_json, now_iso, write_json
+
+DEPLOY_DIR = DATA_DIR / "deploy"
+MANIFEST_PATH = DEPLOY_DIR / "manifest.json"
+DIFF_PATH = DEPLOY_DIR / "diff.json"
+# Kept inside the target so any machine can deploy against it.
+TARGET_MANIFEST = ".deploy-manifest.json"
+TARGET_JOURNAL = ".deploy-journal.jsonl"
+IGNORED_NAMES = {TARGET_MANIFEST, TARGET_JOURNAL, "asset-manifest.json"}
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_manifest(source: Path = DIST_DIR, previous: dict[str, Any] | None = None) -> dict[str, Any]:
+    # path -> {sha256, size}; files whose mtime and size match the previous
+    # manifest keep their recorded hash instead of being read again.
+    known = (previous or {}).get("files", {})
+    files: dict[str, Any] = {}
+    for dirpath, dirnames, filenames in os.walk(source):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name in IGNORED_NAMES or name.endswith(".tmp"):
+                continue
+            path = Path(dirpath) / name
+            rel_path = path.relative_to(source).as_posix()
+            stat = path.stat()
+            entry = known.get(rel_path)
+            if entry and entry.get("mtime_ns") == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                sha256 = entry["sha256"]
+            else:
+                sha256 = file_digest(path)
+            files[rel_path] = {"sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return {
+        "generated_at": now_iso(),
+        "source": str(source),
+        "file_count": len(files),
+        "total_bytes": sum(entry["size"] for entry in files.values()),
+        "files": files,
+    }
+
+
+def diff_manifests(old: dict[str, Any], new: dict[str, Any]) -> dict[str, Any]:
+    old_files = old.get("files", {})
+    new_files = new.get("files", {})
+    added = sorted(path for path in new_files if path not in old_files)
+    removed = sorted(path for path in old_files if path not in new_files)
+    changed = sorted(
+        path for path in new_files if path in old_files and new_files[path]["sha256"] != old_files[path]["sha256"]
+    )
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "upload_bytes": sum(new_files[path]["size"] for path in added + changed),
+        "unchanged": len(new_files) - len(added) - len(changed),
+    }
+
+
+def write_build_manifest(source: Path = DIST_DIR) -> dict[str, Any]:
+    previous = load_json(MANIFEST_PATH) if MANIFEST_PATH.exists() else {}
+    manifest = build_manifest(source, previous)
+    diff = {"generated_at": manifest["generated_at"], **diff_manifests(previous, manifest)}
+    write_json(MANIFEST_PATH, manifest, compact=True)
+    write_json(DIFF_PATH, diff)
+    return diff
+
+
+def is_page(path: str) -> bool:
+    return path.endswith((".html", ".html.gz", ".html.br"))
+
+
+def copy_atomic(source: Path, destination: Path) -> None:
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(destination.name + ".tmp")
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def deploy(
+    target: Path,
+    *,
+    source: Path = DIST_DIR,
+    workers: int = 8,
+    dry_run: bool = False,
+    prune: bool = True,
+) -> dict[str, Any]:
+    started = time.perf_counter()
+    previous_local = load_json(MANIFEST_PATH) if MANIFEST_PATH.exists() else None
+    local = build_manifest(source, previous_local)
+    target_manifest_path = target / TARGET_MANIFEST
+    remote = load_json(target_manifest_path) if target_manifest_path.exists() else {"files": {}}
+    plan = diff_manifests(remote, local)
+
+    # A journal of finished uploads from an interrupted run: anything already
+    # copied with the same hash is not sent again.
+    journal_path = target / TARGET_JOURNAL
+    done: dict[str, str] = {}
+    if journal_path.exists():
+        for line in journal_path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                record = json.loads(line)
+                done[record["path"]] = record["sha256"]
+
+    uploads = sorted(plan["added"] + plan["changed"])
+    pending = [path for path in uploads if done.get(path) != local["files"][path]["sha256"]]
+    result = {
+        "target": str(target),
+        "added": len(plan["added"]),
+        "changed": len(plan["changed"]),
+        "removed": len(plan["removed"]) if prune else 0,
+        "resumed": len(uploads) - len(pending),
+        "uploaded": 0,
+        "upload_bytes": sum(local["files"][path]["size"] for path in pending),
+        "unchanged": plan["unchanged"],
+        "dry_run": dry_run,
+    }
+    if dry_run:
+        result["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return result
+
+    target.mkdir(parents=True, exist_ok=True)
+    journal_lock = threading.Lock()
+
+    def upload(path: str) -> None:
+        copy_atomic(source / path, target / path)
+        with journal_lock, journal_path.open("a", encoding="utf-8") as journal:
+            journal.write(json.dumps({"path": path, "sha256": local["files"][path]["sha256"]}) + "\n")
+
+    # Assets before the pages that reference them, so a half-finished deploy
+    # never serves HTML pointing at a fingerprinted file that is not there yet.
+    assets = [path for path in pending if not is_page(path)]
+    pages = [path for path in pending if is_page(path)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch in (assets, pages):
+            list(pool.map(upload, batch))
+    result["uploaded"] = len(pending)
+
+    if prune:
+        for path in plan["removed"]:
+            (target / path).unlink(missing_ok=True)
+
+    remote_files = dict(local["files"])
+    if not prune:
+        remote_files = {**remote.get("files", {}), **remote_files}
+    write_json(target_manifest_path, {**local, "files": remote_files, "deployed_at": now_iso()}, compact=True)
+    journal_path.unlink(missing_ok=True)
+    result["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Upload only the files that changed since the target's last deploy.")
+    parser.add_argument("target", type=Path, help="Target directory (stand-in for the bucket or web root)")
+    parser.add_argument("--source", type=Path, default=DIST_DIR, help="Built tree to deploy (default: dist/)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent uploads")
+    parser.add_argument("--dry-run", action="store_true", help="Show the delta without uploading")
+    parser.add_argument("--no-prune", action="store_true", help="Keep files on the target that are no longer built")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if not args.source.exists():
+        raise SystemExit(f"{args.source} does not exist; run `python -m nzgift build` first.")
+    result = deploy(
+        args.target.resolve(),
+        source=args.source.resolve(),
+        workers=args.workers,
+        dry_run=args.dry_run,
+        prune=not args.no_prune,
+    )
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import codecs
+from contextlib import AbstractContextManager, nullcontext
+from typing import TYPE_CHECKING, Any, Callable
+from urllib.parse import urljoin
+
+from amazon_extract import HEADERS, PageWatch, resolve_fetch_url
+from nzgift.config import FETCH_MAX_BYTES, HTTP_TIMEOUT
+
+if TYPE_CHECKING:
+    import requests
+
+CHUNK_BYTES = 64 * 1024
+MAX_REDIRECTS = 10
+
+_session: requests.Session | None = None
+
+
+def session() -> requests.Session:
+    # One pooled session per process, so chained runs reuse connections.
+    global _session
+    if _session is None:
+        import requests
+
+        _session = requests.Session()
+        _session.headers.update(HEADERS)
+    return _session
+
+
+def get(url: str, *, timeout: float = HTTP_TIMEOUT, **kwargs: Any) -> requests.Response:
+    return session().get(resolve_fetch_url(url), timeout=timeout, **kwargs)
+
+
+def follow(
+    method: str,
+    url: str,
+    *,
+    guard: Callable[[str], AbstractContextManager] | None = None,
+    timeout: float = HTTP_TIMEOUT,
+    max_redirects: int = MAX_REDIRECTS,
+) -> tuple[requests.Response, list[str]]:
+    # Follows redirects one request at a time so guard(url) (a per-host
+    # limiter, say) is held around every hop, not just the first. The body is
+    # never read; returns the final response and the URLs redirected from.
+    import requests
+
+    url = resolve_fetch_url(url)
+    history: list[str] = []
+    while True:
+        with guard(url) if guard is not None else nullcontext():
+            response = session().request(method, url, allow_redirects=False, timeout=timeout, stream=True)
+            response.close()
+        location = response.headers.get("Location") if response.is_redirect else None
+        if not location:
+            return response, history
+        if len(history) >= max_redirects:
+            raise requests.TooManyRedirects(f"Exceeded {max_redirects} redirects from {history[0]}", response=response)
+        history.append(url)
+        url = urljoin(url, location)
+
+
+def fetch_until(
+    url: str,
+    watch: PageWatch | None = None,
+    *,
+    max_bytes: int = FETCH_MAX_BYTES,
+    timeout: float = HTTP_TIMEOUT,
+) -> tuple[str, dict[str, Any]]:
+    # Streams the body until watch has every field it waits for or max_bytes
+    # have arrived, then closes the connection rather than draining the rest.
+    # Returns the text read and a transfer report; bytes_saved is only known
+    # when the server sent a Content-Length.
+    with get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        text = ""
+        stopped = "eof"
+        received = 0
+        for chunk in response.iter_content(CHUNK_BYTES):
+            received += len(chunk)
+            text += decoder.decode(chunk)
+            if watch is not None and watch.feed(text):
+                stopped = "complete"
+                break
+            if received >= max_bytes:
+                stopped = "max_bytes"
+                break
+        else:
+            text += decoder.decode(b"", final=True)
+        wire_bytes = response.raw.tell()
+        length = response.headers.get("Content-Length")
+    content_length = int(length) if length and length.isdigit() else None
+    return text, {
+        "stopped": stopped,
+        "bytes_read": wire_bytes,
+        "content_length": content_length,
+        "bytes_saved": max(content_length - wire_bytes, 0) if content_length is not None else None,
+        "waiting_for": sorted(watch.waiting) if watch is not None else [],
+    }
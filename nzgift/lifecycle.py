@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal
+
+from amazon_extract import extract_asin
+from nzgift.config import PROPOSAL_PATH, STATE_PATH
+from nzgift.records import (
+    INVENTORY_STATUSES,
+    PROPOSAL_STATUSES,
+    Dedupe,
+    InventoryRecord,
+    InventorySource,
+    ProposalRecord,
+    Timestamps,
+    decode,
+    encode,
+)
+from nzgift.state import Version, VersionConflict, commit_json, now_iso, read_versioned, with_retries
+
+Kind = Literal["inventory", "proposal"]
+
+
+class TransitionError(ValueError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class Transition:
+    sources: frozenset[str]
+    target: str
+
+
+INVENTORY_TRANSITIONS = {
+    "archive": Transition(frozenset({"live", "restored"}), "archived"),
+    "restore": Transition(frozenset({"archived"}), "restored"),
+}
+PROPOSAL_TRANSITIONS = {
+    "approve": Transition(frozenset({"pending"}), "approved"),
+    "reject": Transition(frozenset({"pending", "approved"}), "rejected"),
+    "archive": Transition(frozenset({"pending", "approved"}), "archived"),
+    "reopen": Transition(frozenset({"rejected", "archived"}), "pending"),
+    "import": Transition(frozenset({"approved"}), "imported"),
+}
+PROPOSAL_TIMESTAMPS = {
+    "pending": "proposed_at",
+    "approved": "approved_at",
+    "rejected": "rejected_at",
+    "archived": "archived_at",
+    "imported": "imported_at",
+}
+# kind -> (file key holding the records, status values counted in stats)
+COLLECTIONS: dict[str, tuple[str, tuple[str, ...]]] = {
+    "inventory": ("inventory", INVENTORY_STATUSES),
+    "proposal": ("items", PROPOSAL_STATUSES),
+}
+
+
+def transition_for(table: dict[str, Transition], action: str, current: str, item_id: str) -> Transition:
+    transition = table.get(action)
+    if transition is None:
+        raise TransitionError(f"Unknown action {action!r}; expected one of {sorted(table)}")
+    if current not in transition.sources:
+        allowed = ", ".join(sorted(transition.sources))
+        raise TransitionError(f"{item_id}: cannot {action} from {current!r} (allowed from {allowed})")
+    return transition
+
+
+def apply_inventory(
+    record: InventoryRecord, action: str, at: str, reason: str | None = None, notes: str | None = None
+) -> None:
+    transition = transition_for(INVENTORY_TRANSITIONS, action, record.status, record.id)
+    record.status = transition.target
+    record.archived = transition.target == "archived"
+    record.restored = transition.target == "restored"
+    if action == "archive":
+        record.archive_reason = reason or "manual"
+        record.archive_notes = notes
+        record.archive_history.append({"timestamp": at, "reason": record.archive_reason, "notes": notes})
+    else:
+        record.archive_reason = None
+        record.archive_notes = None
+        record.last_seen_in_stock = at
+        record.restore_history.append({"timestamp": at, "reason": reason or "back_in_stock", "notes": notes})
+    record.timestamps.updated_at = at
+
+
+def apply_proposal(
+    record: ProposalRecord, action: str, at: str, reason: str | None = None, notes: str | None = None
+) -> None:
+    transition = transition_for(PROPOSAL_TRANSITIONS, action, record.proposal_status, record.id)
+    record.proposal_status = transition.target
+    setattr(record.timestamps, PROPOSAL_TIMESTAMPS[transition.target], at)
+    record.timestamps.updated_at = at
+    record.review_history.append({"timestamp": at, "status": transition.target, "reason": reason or action})
+    if notes is not None:
+        record.review_notes = notes
+
+
+def ensure_stats(payload: dict[str, Any], kind: Kind) -> dict[str, int]:
+    # Counters are maintained by every add and transition; a full count only
+    # happens for files written before that, which have no complete stats.
+    key, statuses = COLLECTIONS[kind]
+    stats = payload.setdefault("stats", {})
+    if all(status in stats for status in statuses) and (kind != "inventory" or "total_products" in stats):
+        return stats
+    items = payload.get(key, [])
+    field = "status" if kind == "inventory" else "proposal_status"
+    stats.update({status: 0 for status in statuses})
+    for item in items:
+        if item.get(field) in stats:
+            stats[item[field]] += 1
+    if kind == "inventory":
+        stats["total_products"] = len(items)
+    return stats
+
+
+def bump_stats(stats: dict[str, int], old: str | None, new: str) -> None:
+    if old is None:
+        if "total_products" in stats:
+            stats["total_products"] += 1
+    else:
+        stats[old] = stats.get(old, 0) - 1
+    stats[new] = stats.get(new, 0) + 1
+
+
+def new_inventory_record(
+    *,
+    product_id: str,
+    category: str,
+    slug: str,
+    title: str,
+    amazon_url: str,
+    site_url: str,
+    page_path: str,
+    image: str = "",
+    import_method: str = "existing_repo_inventory",
+    imported_at: str | None = None,
+) -> InventoryRecord:
+    at = now_iso()
+    return InventoryRecord(
+        id=product_id,
+        slug=slug,
+        title=title,
+        category=category,
+        amazon_url=amazon_url,
+        site_url=site_url,
+        page_path=page_path,
+        catalog_path=f"{category}/products.json",
+        image=image,
+        status="live",
+        archived=False,
+        restored=False,
+        last_checked=None,
+        last_seen_in_stock=None,
+        last_posted=None,
+        archive_reason=None,
+        dedupe=Dedupe(stable_product_id=product_id, amazon_url=amazon_url, site_url=site_url, slug=slug),
+        timestamps=Timestamps(created_at=at, updated_at=at),
+        source=InventorySource(import_method=import_method, imported_at=imported_at),
+    )
+
+
+class Transaction:
+    # Batches adds and transitions over product_state.json and
+    # proposal_queue.json. Files are read fresh (not from the shared cache), so
+    # an exception part-way through simply drops the batch; on success each
+    # touched file is written once, atomically, through commit_json. If another
+    # process wrote either file since it was read, commit raises
+    # VersionConflict and nothing is written; callers re-run the batch.
+    def __init__(self, *, state_path: Path = STATE_PATH, proposal_path: Path = PROPOSAL_PATH) -> None:
+        self.paths: dict[str, Path] = {"inventory": state_path, "proposal": proposal_path}
+        self.now = now_iso()
+        self.applied: list[dict[str, Any]] = []
+        self._payloads: dict[str, dict[str, Any]] = {}
+        self._positions: dict[str, dict[str, int]] = {}
+        self._versions: dict[str, Version | None] = {}
+
+    def __enter__(self) -> Transaction:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def _collection(self, kind: Kind) -> tuple[dict[str, Any], list[dict[str, Any]], dict[str, int]]:
+        if kind not in self._payloads:
+            payload, self._versions[kind] = read_versioned(self.paths[kind])
+            items = payload.setdefault(COLLECTIONS[kind][0], [])
+            ensure_stats(payload, kind)
+            self._payloads[kind] = payload
+            self._positions[kind] = {item.get("id"): index for index, item in enumerate(items)}
+        payload = self._payloads[kind]
+        return payload, payload[COLLECTIONS[kind][0]], self._positions[kind]
+
+    def get(self, kind: Kind, item_id: str) -> dict[str, Any] | None:
+        _, items, positions = self._collection(kind)
+        return items[positions[item_id]] if item_id in positions else None
+
+    def find(self, kind: Kind, predicate) -> str | None:
+        _, items, _ = self._collection(kind)
+        return next((item.get("id") for item in items if predicate(item)), None)
+
+    def add(self, kind: Kind, record: InventoryRecord | ProposalRecord) -> None:
+        payload, items, positions = self._collection(kind)
+        if record.id in positions:
+            raise TransitionError(f"{record.id} is already in {self.paths[kind].name}")
+        status = record.status if kind == "inventory" else record.proposal_status
+        items.append(encode(record))
+        positions[record.id] = len(items) - 1
+        bump_stats(payload["stats"], None, status)
+        self.applied.append({"kind": kind, "id": record.id, "action": "add", "from": None, "to": status})
+
+    def transition(
+        self,
+        kind: Kind,
+        item_id: str,
+        action: str,
+        *,
+        reason: str | None = None,
+        notes: str | None = None,
+    ) -> InventoryRecord | ProposalRecord:
+        payload, items, positions = self._collection(kind)
+        if item_id not in positions:
+            raise TransitionError(f"{item_id} is not in {self.paths[kind].name}")
+        index = positions[item_id]
+        if kind == "inventory":
+            record = decode(InventoryRecord, items[index], f"inventory[{index}]")
+            old = record.status
+            apply_inventory(record, action, self.now, reason, notes)
+            new = record.status
+        else:
+            record = decode(ProposalRecord, items[index], f"proposals.items[{index}]")
+            old = record.proposal_status
+            apply_proposal(record, action, self.now, reason, notes)
+            new = record.proposal_status
+        items[index] = encode(record)
+        bump_stats(payload["stats"], old, new)
+        self.applied.append({"kind": kind, "id": item_id, "action": action, "from": old, "to": new})
+        return record
+
+    def commit(self) -> dict[str, Any]:
+        touched = [kind for kind in ("inventory", "proposal") if any(change["kind"] == kind for change in self.applied)]
+        for kind in touched:
+            self._payloads[kind]["generated_at"] = self.now
+        commit_json([(self.paths[kind], self._payloads[kind], self._versions[kind]) for kind in touched])
+        return {"applied": self.applied, "stats": {kind: self._payloads[kind]["stats"] for kind in self._payloads}}
+
+
+def record_import(
+    *,
+    product_id: str,
+    category: str,
+    slug: str,
+    title: str,
+    amazon_url: str,
+    image: str,
+    source_url: str,
+) -> list[dict[str, Any]]:
+    # An import adds the live inventory record and closes out the proposal it
+    # came from (approving it first if it was still pending), in one batch.
+    if not STATE_PATH.exists():
+        return []
+    return with_retries(lambda: _record_import(product_id, category, slug, title, amazon_url, image, source_url))
+
+
+def _record_import(
+    product_id: str, category: str, slug: str, title: str, amazon_url: str, image: str, source_url: str
+) -> list[dict[str, Any]]:
+    with Transaction() as txn:
+        if txn.get("inventory", product_id) is None:
+            txn.add(
+                "inventory",
+                new_inventory_record(
+                    product_id=product_id,
+                    category=category,
+                    slug=slug,
+                    title=title,
+                    amazon_url=amazon_url,
+                    site_url=f"/{category}/{slug}.html",
+                    page_path=f"{category}/{slug}.html",
+                    image=image,
+                    import_method="amazon_import",
+                    imported_at=txn.now,
+                ),
+            )
+        if PROPOSAL_PATH.exists():
+            # Matched on ASIN as well, since the import URL may be a regional or
+            # tracking variant of the canonical one the proposal was queued under.
+            asin = extract_asin(source_url)
+            proposal_id = txn.find(
+                "proposal",
+                lambda item: source_url in (item.get("canonical_url"), item.get("amazon_url"))
+                or (asin is not None and item.get("asin") == asin),
+            )
+            status = txn.get("proposal", proposal_id)["proposal_status"] if proposal_id else None
+            if status == "pending":
+                txn.transition("proposal", proposal_id, "approve", reason="imported")
+                status = "approved"
+            if status == "approved":
+                txn.transition("proposal", proposal_id, "import", reason=product_id)
+    return txn.applied
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Apply lifecycle transitions to products or proposals in one write.")
+    parser.add_argument("kind", choices=["inventory", "proposal"])
+    parser.add_argument(
+        "action",
+        help=f"inventory: {', '.join(INVENTORY_TRANSITIONS)}; proposal: {', '.join(PROPOSAL_TRANSITIONS)}",
+    )
+    parser.add_argument("ids", nargs="+", help="Product or proposal ids; all are applied together or not at all")
+    parser.add_argument("--reason", default=None)
+    parser.add_argument("--notes", default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Check the transitions without writing")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    def apply() -> dict[str, Any]:
+        txn = Transaction()
+        for item_id in args.ids:
+            txn.transition(args.kind, item_id, args.action, reason=args.reason, notes=args.notes)
+        return {"applied": txn.applied, "dry_run": True} if args.dry_run else txn.commit()
+
+    try:
+        result = with_retries(apply)
+    except (ValueError, VersionConflict) as exc:
+        raise SystemExit(f"No changes written: {exc}") from exc
+    print(json.dumps(result, indent=2, ensure_ascii=False))
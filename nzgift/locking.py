@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from nzgift.config import LOCK_TIMEOUT, LOCKS_DIR
+
+# Paths this thread already holds, so nested sections (an update inside a
+# transaction, say) do not deadlock against their own lock.
+_held = threading.local()
+
+
+class LockTimeout(TimeoutError):
+    pass
+
+
+def lock_file(path: Path) -> Path:
+    # Lock files live under data/locks rather than beside the data, so category
+    # directories never pick up files that would be deployed or committed.
+    path = Path(path).resolve()
+    digest = hashlib.sha1(str(path).encode("utf-8")).hexdigest()[:12]
+    return LOCKS_DIR / f"{path.name}.{digest}.lock"
+
+
+@contextmanager
+def _acquire(path: Path, timeout: float) -> Iterator[None]:
+    held: set[Path] = _held.__dict__.setdefault("paths", set())
+    if path in held:
+        yield
+        return
+    target = lock_file(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(target, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f"Timed out after {timeout:g}s waiting for the lock on {path.name}") from None
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(*paths: Path, timeout: float = LOCK_TIMEOUT) -> Iterator[None]:
+    # Exclusive advisory lock on each path, taken in sorted order so two jobs
+    # locking overlapping sets of files can never deadlock each other.
+    with ExitStack() as stack:
+        for path in sorted({Path(path).resolve() for path in paths}):
+            stack.enter_context(_acquire(path, timeout))
+        yield
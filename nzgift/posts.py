@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from nzgift.config import POST_QUEUE_PATH, ROOT, STATE_PATH
+from nzgift.records import InventoryRecord, decode, encode
+from nzgift.serialize import write_if_changed
+from nzgift.state import commit_json, load_json, now_iso, read_versioned, with_retries
+
+ROUNDUPS_DIR = ROOT / "roundups"
+ELIGIBLE_STATUSES = {"live", "restored"}
+DEFAULT_CYCLE = ["product", "opinion", "product", "roundup"]
+ROUNDUP_SIZE = 6
+MIN_ROUNDUP = 3
+
+
+def due_key(item: dict[str, Any]) -> tuple[int, str, float]:
+    # Never-posted products come first, newest first; after that, whichever
+    # was posted longest ago.
+    created = item.get("timestamps", {}).get("created_at")
+    recency = -datetime.fromisoformat(created).timestamp() if created else 0.0
+    last_posted = item.get("last_posted")
+    return (1, last_posted, recency) if last_posted else (0, "", recency)
+
+
+class PostIndex:
+    # Eligible inventory ordered by due_key, as one heap for the whole site and
+    # one per category, built in a single pass. Picks pop lazily: a product
+    # taken through either heap is skipped when it surfaces in the other.
+    def __init__(self, inventory: list[dict[str, Any]]) -> None:
+        self.items = {item["id"]: item for item in inventory}
+        self.overall: list[tuple[tuple[int, str, float], str]] = []
+        self.by_category: dict[str, list[tuple[tuple[int, str, float], str]]] = {}
+        self.available: dict[str, int] = {}
+        for item in inventory:
+            if item.get("status") not in ELIGIBLE_STATUSES:
+                continue
+            entry = (due_key(item), item["id"])
+            self.overall.append(entry)
+            self.by_category.setdefault(item["category"], []).append(entry)
+            self.available[item["category"]] = self.available.get(item["category"], 0) + 1
+        heapq.heapify(self.overall)
+        for heap in self.by_category.values():
+            heapq.heapify(heap)
+        self.taken: set[str] = set()
+
+    def _pop(self, heap: list[tuple[tuple[int, str, float], str]]) -> str | None:
+        while heap:
+            _, product_id = heapq.heappop(heap)
+            if product_id not in self.taken:
+                self.taken.add(product_id)
+                self.available[self.items[product_id]["category"]] -= 1
+                return product_id
+        return None
+
+    def next_product(self) -> str | None:
+        return self._pop(self.overall)
+
+    def take(self, category: str, count: int) -> list[str]:
+        heap = self.by_category.get(category, [])
+        picked = [self._pop(heap) for _ in range(min(count, self.available.get(category, 0)))]
+        return [product_id for product_id in picked if product_id]
+
+    def roundup_category(self, last_roundups: dict[str, str]) -> str | None:
+        # The category with enough unpicked products whose last roundup is oldest.
+        ready = [category for category, count in self.available.items() if count >= MIN_ROUNDUP]
+        return min(ready, key=lambda category: (last_roundups.get(category, ""), category), default=None)
+
+
+def card_subs(category: str) -> dict[str, str]:
+    path = ROOT / category / "products.json"
+    if not path.exists():
+        return {}
+    return {card.get("slug"): card.get("sub", "") for card in load_json(path)}
+
+
+def plan_batch(state: dict[str, Any], queue: dict[str, Any], count: int, now: str) -> dict[str, Any]:
+    # Fills the next `count` slots of the cycle. Mutates state and queue in
+    # place and returns the new posts and the roundup pages to write.
+    import product_pipeline
+
+    index = PostIndex(state.get("inventory", []))
+    cycle = queue.setdefault("cycle", {"order": DEFAULT_CYCLE, "current_index": 0})
+    order = cycle.get("order") or DEFAULT_CYCLE
+    items = queue.setdefault("items", [])
+    last_roundups = queue.setdefault("roundups", {})
+    posts: list[dict[str, Any]] = []
+    pages: dict[Path, str] = {}
+    touched: dict[str, list[dict[str, Any]]] = {}
+    stopped = None
+
+    for _ in range(count):
+        kind = order[cycle.get("current_index", 0) % len(order)]
+        post: dict[str, Any] = {
+            "id": f"post/{len(items) + 1:05d}",
+            "kind": kind,
+            "status": "queued",
+            "created_at": now,
+            "cycle_index": cycle.get("current_index", 0) % len(order),
+        }
+        if kind in ("product", "opinion"):
+            product_id = index.next_product()
+            if product_id is None:
+                stopped = f"no product left to post for a {kind} slot"
+                break
+            item = index.items[product_id]
+            post.update(
+                products=[product_id],
+                title=item.get("title", ""),
+                link=f"/{item.get('page_path', '')}",
+                image=item.get("image", ""),
+                amazon_url=item.get("amazon_url", ""),
+            )
+            if kind == "opinion":
+                # The take itself is written by hand; the engine only picks what it is about.
+                post["status"] = "needs_copy"
+        elif kind == "roundup":
+            category = index.roundup_category(last_roundups)
+            if category is None:
+                stopped = f"no category has {MIN_ROUNDUP} products left for a roundup"
+                break
+            product_ids = index.take(category, ROUNDUP_SIZE)
+            label = product_pipeline.CATEGORY_META.get(category, {}).get("label", category.title())
+            slug = f"{category}-{now[:10]}"
+            # Slugs already queued count as taken even before their page is on
+            # disk: pages are written only after the batch is committed.
+            taken = (
+                {path.stem for path in pages}
+                | {path.stem for path in ROUNDUPS_DIR.glob(f"{slug}*.html")}
+                | {Path(item["page_path"]).stem for item in items if item.get("page_path")}
+            )
+            slug = next(
+                candidate
+                for candidate in (slug, *(f"{slug}-{number}" for number in range(2, len(taken) + 3)))
+                if candidate not in taken
+            )
+            title = f"{len(product_ids)} New Zealand {label} Gifts Worth Giving"
+            subs = card_subs(category)
+            picks = [
+                {
+                    "category": category,
+                    "path": index.items[product_id].get("page_path", ""),
+                    "title": index.items[product_id].get("title", ""),
+                    "image": index.items[product_id].get("image", ""),
+                    "sub": subs.get(index.items[product_id].get("slug"), ""),
+                }
+                for product_id in product_ids
+            ]
+            page_path = ROUNDUPS_DIR / f"{slug}.html"
+            pages[page_path] = product_pipeline.render_roundup_page(
+                title=title,
+                intro=f"Our current pick of {label.lower()} gifts from New Zealand, in one place.",
+                meta_description=f"{title}: a roundup from NZ Gifts.",
+                products=picks,
+            )
+            last_roundups[category] = now
+            post.update(
+                products=product_ids,
+                title=title,
+                link=f"/{page_path.relative_to(ROOT).as_posix()}",
+                image=picks[0]["image"],
+                page_path=page_path.relative_to(ROOT).as_posix(),
+            )
+        else:
+            stopped = f"unknown post kind {kind!r} in cycle.order"
+            break
+        items.append(post)
+        posts.append(post)
+        cycle["current_index"] = (cycle.get("current_index", 0) + 1) % len(order)
+        for product_id in post["products"]:
+            touched.setdefault(product_id, []).append({"timestamp": now, "post_id": post["id"], "kind": kind})
+
+    for position, item in enumerate(state.get("inventory", [])):
+        if item["id"] in touched:
+            record = decode(InventoryRecord, item, f"inventory[{position}]")
+            record.last_posted = now
+            record.post_history.extend(touched[item["id"]])
+            record.timestamps.updated_at = now
+            state["inventory"][position] = encode(record)
+    queue["generated_at"] = now
+    return {"posts": posts, "pages": pages, "products": len(touched), "stopped": stopped}
+
+
+def run_posts(count: int, *, dry_run: bool = False) -> dict[str, Any]:
+    def attempt() -> dict[str, Any]:
+        state, state_version = read_versioned(STATE_PATH)
+        queue, queue_version = read_versioned(POST_QUEUE_PATH)
+        now = now_iso()
+        batch = plan_batch(state, queue, count, now)
+        if not dry_run and batch["posts"]:
+            # Histories, last_posted and the cycle position land together or not at all.
+            commit_json([(STATE_PATH, state, state_version), (POST_QUEUE_PATH, queue, queue_version)])
+            # Pages go out only once the posts pointing at them are committed, so
+            # a conflict and retry cannot leave an orphan page behind.
+            for path, html_content in batch["pages"].items():
+                write_if_changed(path, html_content.encode("utf-8"))
+        return {
+            "posts": batch["posts"],
+            "products_updated": batch["products"],
+            "pages": [path.relative_to(ROOT).as_posix() for path in batch["pages"]],
+            "next_kind": (queue["cycle"].get("order") or DEFAULT_CYCLE)[queue["cycle"]["current_index"]],
+            "stopped": batch["stopped"],
+            "dry_run": dry_run,
+        }
+
+    return with_retries(attempt)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Queue the next posts in the post_queue.json cycle.")
+    parser.add_argument("--count", type=int, default=len(DEFAULT_CYCLE), help="Posts to generate (default: one cycle)")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would be queued without writing")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    print(json.dumps(run_posts(max(0, args.count), dry_run=args.dry_run), indent=2, ensure_ascii=False))
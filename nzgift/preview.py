@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import argparse
+import email.utils
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from nzgift.config import DIST_DIR, ROOT
+
+LIVE_RELOAD_PATH = "/__livereload"
+LIVE_RELOAD_SNIPPET = (
+    b'<script>new EventSource("' + LIVE_RELOAD_PATH.encode() + b'").onmessage = () => location.reload();</script>\n'
+)
+# Fingerprinted names like style.3f9a1c2b.css never change content.
+HASHED_ASSET_RE = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("image/webp", ".webp")
+
+
+class ReloadHub:
+    def __init__(self) -> None:
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def notify(self) -> None:
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> int:
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != seen, timeout=timeout)
+            return self.version
+
+
+class ETagCache:
+    # Content hashes keyed on (mtime_ns, size), so a file is read once per change.
+    def __init__(self) -> None:
+        self.entries: dict[str, tuple[int, int, str]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, path: str, stat: os.stat_result) -> str:
+        with self.lock:
+            cached = self.entries.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as handle:
+            for chunk in iter(lambda: handle.read(1 << 16), b""):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()[:32]}"'
+        with self.lock:
+            self.entries[path] = (stat.st_mtime_ns, stat.st_size, etag)
+        return etag
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    # Single ranges only; anything else is served in full, as RFC 9110 allows.
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        return (max(0, size - length), size - 1) if length else (size, size - 1)
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+class PreviewHandler(SimpleHTTPRequestHandler):
+    hub: ReloadHub | None = None
+    etags = ETagCache()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.hub is not None and self.path == LIVE_RELOAD_PATH:
+            self.stream_reloads()
+            return
+        self.serve(head_only=False)
+
+    def do_HEAD(self) -> None:
+        self.serve(head_only=True)
+
+    def resolve(self) -> str | None:
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not self.path.split("?", 1)[0].endswith("/"):
+                self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+                self.send_header("Location", self.path.split("?", 1)[0] + "/")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        return path
+
+    def pick_encoding(self, path: str) -> tuple[str, str | None]:
+        accepted = {
+            token.split(";", 1)[0].strip()
+            for token in self.headers.get("Accept-Encoding", "").split(",")
+            if not token.strip().endswith(";q=0")
+        }
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding in accepted and os.path.isfile(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+    def serve(self, *, head_only: bool) -> None:
+        path = self.resolve()
+        if path is None:
+            return
+        content_type = self.guess_type(path)
+        if self.hub is not None and path.endswith(".html"):
+            self.send_live_html(path, head_only=head_only)
+            return
+
+        body_path, encoding = self.pick_encoding(path)
+        stat = os.stat(body_path)
+        etag = self.etags.get(body_path, stat)
+        name = os.path.basename(path)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(stat.st_mtime, usegmt=True),
+            "Cache-Control": IMMUTABLE_CACHE if HASHED_ASSET_RE.search(name) else REVALIDATE_CACHE,
+            "Accept-Ranges": "none" if encoding else "bytes",
+        }
+        if any(os.path.isfile(path + suffix) for _, suffix in PRECOMPRESSED):
+            headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+        if etag in {tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")}:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            return
+
+        size = stat.st_size
+        start, end = 0, size - 1
+        status = HTTPStatus.OK
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and not encoding and (if_range is None or if_range.strip() == etag):
+            requested = parse_range(range_header, size)
+            if requested is not None:
+                start, end = requested
+                if start >= size or start > end:
+                    self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                status = HTTPStatus.PARTIAL_CONTENT
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        if head_only or size == 0:
+            return
+        with open(body_path, "rb") as handle:
+            # socket.sendfile uses os.sendfile (zero-copy) where the platform
+            # has it and falls back to read/send otherwise.
+            self.connection.sendfile(handle, offset=start, count=end - start + 1)
+
+    def send_live_html(self, path: str, *, head_only: bool) -> None:
+        body = Path(path).read_bytes()
+        marker = body.rfind(b"</body>")
+        body = body[:marker] + LIVE_RELOAD_SNIPPET + body[marker:] if marker != -1 else body + LIVE_RELOAD_SNIPPET
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def stream_reloads(self) -> None:
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        seen = self.hub.version
+        try:
+            while True:
+                version = self.hub.wait(seen, timeout=15)
+                # A comment line doubles as a keep-alive and a dead-client probe.
+                self.wfile.write(b"data: reload\n\n" if version != seen else b": ping\n\n")
+                self.wfile.flush()
+                seen = version
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def default_root() -> Path:
+    # The published build (fingerprinted, minified, precompressed) once
+    # `nzgift assets` has run; the repo root, with data/ and .git in it,
+    # only as a fallback for a fresh checkout.
+    return DIST_DIR if (DIST_DIR / "index.html").is_file() else ROOT
+
+
+def make_server(host: str, port: int, *, root: Path | None = None, hub: ReloadHub | None = None) -> ThreadingHTTPServer:
+    handler = type("BoundPreviewHandler", (PreviewHandler,), {"hub": hub, "protocol_version": "HTTP/1.1"})
+    server = ThreadingHTTPServer((host, port), partial(handler, directory=str(root or default_root())))
+    server.daemon_threads = True
+    return server
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the site locally with production-like caching headers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5500)
+    parser.add_argument("--root", type=Path, help="Directory to serve (default: dist/ if built, else the repo root)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    root = (args.root or default_root()).resolve()
+    try:
+        server = make_server(args.host, args.port, root=root)
+    except OSError as exc:
+        raise SystemExit(f"Could not bind {args.host}:{args.port}: {exc.strerror}. Is another preview running?") from exc
+    print(f"Previewing {root} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
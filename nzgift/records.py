@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import sys
+import types
+import typing
+from dataclasses import MISSING, dataclass, field, fields, is_dataclass
+from typing import Any
+
+INVENTORY_STATUSES = ("live", "archived", "restored")
+PROPOSAL_STATUSES = ("pending", "approved", "rejected", "archived", "imported")
+
+
+class RecordError(ValueError):
+    def __init__(self, path: str, problem: str) -> None:
+        super().__init__(f"{path}: {problem}" if path else problem)
+        self.path = path
+        self.problem = problem
+
+    def within(self, prefix: str) -> RecordError:
+        if not self.path:
+            return RecordError(prefix, self.problem)
+        return RecordError(prefix + ("" if self.path.startswith("[") else ".") + self.path, self.problem)
+
+
+def choices(*values: str) -> dict[str, Any]:
+    return {"choices": frozenset(values)}
+
+
+# Low-cardinality strings repeated on every record; interning them keeps one
+# copy per distinct value instead of one per record.
+INTERN = {"intern": True}
+
+
+@dataclass(slots=True)
+class Dedupe:
+    stable_product_id: str
+    amazon_url: str = ""
+    site_url: str = ""
+    slug: str = ""
+
+
+@dataclass(slots=True)
+class CopyQA:
+    last_checked: str | None = None
+    status: str = field(default="unknown", metadata=INTERN)
+    notes: list = field(default_factory=list)
+    content_hash: str | None = None
+
+
+@dataclass(slots=True)
+class InventorySource:
+    import_method: str = field(default="existing_repo_inventory", metadata=INTERN)
+    discovered_at: str | None = None
+    imported_at: str | None = None
+
+
+@dataclass(slots=True)
+class Timestamps:
+    created_at: str | None = None
+    updated_at: str | None = None
+
+
+@dataclass(slots=True)
+class InventoryRecord:
+    id: str
+    slug: str
+    title: str
+    category: str = field(metadata=INTERN)
+    amazon_url: str
+    site_url: str
+    page_path: str
+    status: str = field(metadata={**choices(*INVENTORY_STATUSES), **INTERN})
+    archived: bool
+    restored: bool
+    last_checked: str | None
+    last_seen_in_stock: str | None
+    last_posted: str | None
+    archive_reason: str | None
+    dedupe: Dedupe
+    timestamps: Timestamps
+    catalog_path: str = field(default="", metadata=INTERN)
+    image: str = ""
+    archive_notes: str | None = None
+    archive_history: list = field(default_factory=list)
+    restore_history: list = field(default_factory=list)
+    post_history: list = field(default_factory=list)
+    check_history: list = field(default_factory=list)
+    copy_qa: CopyQA = field(default_factory=CopyQA)
+    source: InventorySource = field(default_factory=InventorySource)
+    # Keys this schema does not know about, kept so a decode/encode round trip
+    # never drops data written by newer code.
+    extra: dict = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class ProposalSource:
+    type: str = field(default="amazon_search", metadata=INTERN)
+    discovered_at: str | None = None
+    last_seen_at: str | None = None
+
+
+@dataclass(slots=True)
+class ProposalTimestamps:
+    created_at: str | None = None
+    updated_at: str | None = None
+    proposed_at: str | None = None
+    approved_at: str | None = None
+    rejected_at: str | None = None
+    archived_at: str | None = None
+    imported_at: str | None = None
+
+
+@dataclass(slots=True)
+class ProposalDedupe:
+    canonical_url: str
+    asin: str | None = None
+    possible_duplicates: list = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class ProposalRecord:
+    id: str
+    amazon_url: str
+    canonical_url: str
+    proposal_status: str = field(metadata={**choices(*PROPOSAL_STATUSES), **INTERN})
+    timestamps: ProposalTimestamps
+    dedupe: ProposalDedupe
+    asin: str | None = None
+    title: str = ""
+    category_guess: str = field(default="artwork", metadata=INTERN)
+    image: str = ""
+    bullets: list = field(default_factory=list)
+    inventory_status: str = field(default="unknown", metadata=INTERN)
+    search_query: str = field(default="", metadata=INTERN)
+    review_notes: str | None = None
+    review_history: list = field(default_factory=list)
+    source: ProposalSource = field(default_factory=ProposalSource)
+    extra: dict = field(default_factory=dict)
+
+
+# Field order for encoding follows the layout the writers have always produced,
+# which is not the same as the declaration order above (required fields first).
+ENCODE_ORDER = {
+    InventoryRecord: (
+        "id", "slug", "title", "category", "amazon_url", "site_url", "page_path", "catalog_path", "image",
+        "status", "archived", "restored", "last_checked", "last_seen_in_stock", "last_posted",
+        "archive_reason", "archive_notes", "archive_history", "restore_history", "post_history",
+        "check_history", "dedupe", "copy_qa", "source", "timestamps",
+    ),
+    ProposalRecord: (
+        "id", "asin", "amazon_url", "canonical_url", "title", "category_guess", "image", "bullets",
+        "proposal_status", "inventory_status", "search_query", "review_notes", "review_history",
+        "source", "timestamps", "dedupe",
+    ),
+}
+
+
+class FieldSpec(typing.NamedTuple):
+    name: str
+    accepts: frozenset[type]
+    nested: type | None
+    default: Any
+    factory: Any
+    choices: frozenset | None
+    intern: bool
+
+
+def _field_types(hint: Any) -> tuple[frozenset[type], type | None]:
+    if is_dataclass(hint):
+        return frozenset({dict}), hint
+    if isinstance(hint, types.UnionType) or typing.get_origin(hint) is typing.Union:
+        return frozenset(typing.get_origin(member) or member for member in typing.get_args(hint)), None
+    return frozenset({typing.get_origin(hint) or hint}), None
+
+
+def _specs(cls: type) -> list[FieldSpec]:
+    hints = typing.get_type_hints(cls)
+    specs = []
+    for item in fields(cls):
+        accepts, nested = _field_types(hints[item.name])
+        specs.append(
+            FieldSpec(
+                item.name,
+                accepts,
+                nested,
+                item.default,
+                item.default_factory,
+                item.metadata.get("choices"),
+                bool(item.metadata.get("intern")),
+            )
+        )
+    return specs
+
+
+def _type_error(name: str, value: Any, accepts: frozenset[type]) -> RecordError:
+    expected = " | ".join(sorted("null" if kind is type(None) else kind.__name__ for kind in accepts))
+    return RecordError(name, f"expected {expected}, got {type(value).__name__}")
+
+
+_SPECS: dict[type, tuple[list[FieldSpec], frozenset[str]]] = {}
+_ENCODE_SPECS: dict[type, list[tuple[str, type | None]]] = {}
+
+
+def _cached_specs(cls: type) -> tuple[list[FieldSpec], frozenset[str]]:
+    cached = _SPECS.get(cls)
+    if cached is None:
+        specs = _specs(cls)
+        cached = _SPECS[cls] = specs, frozenset(spec.name for spec in specs if spec.name != "extra")
+    return cached
+
+
+def _decode(cls: type, data: Any) -> Any:
+    # JSON only produces exact builtin types, so ``type(x) is`` checks are safe
+    # and also keep true/false out of int fields.
+    if type(data) is not dict:
+        raise RecordError("", f"expected an object, got {type(data).__name__}")
+    specs, known = _cached_specs(cls)
+    values = []
+    for spec in specs:
+        name = spec.name
+        if name == "extra":
+            values.append({} if known.issuperset(data) else {k: v for k, v in data.items() if k not in known})
+            continue
+        value = data.get(name, MISSING)
+        if value is MISSING:
+            if spec.factory is not MISSING:
+                value = spec.factory()
+            elif spec.default is not MISSING:
+                value = spec.default
+            else:
+                raise RecordError("", f"missing required field {name!r}")
+        elif spec.nested is not None:
+            try:
+                value = _decode(spec.nested, value)
+            except RecordError as exc:
+                raise exc.within(name) from None
+        elif type(value) not in spec.accepts:
+            raise _type_error(name, value, spec.accepts)
+        elif spec.choices is not None and value not in spec.choices:
+            raise RecordError(name, f"invalid value {value!r}")
+        if spec.intern and type(value) is str:
+            value = sys.intern(value)
+        values.append(value)
+    return cls(*values)
+
+
+def _encode_specs(cls: type) -> list[tuple[str, type | None]]:
+    specs = _ENCODE_SPECS.get(cls)
+    if specs is None:
+        nested = {spec.name: spec.nested for spec in _cached_specs(cls)[0] if spec.name != "extra"}
+        order = [name for name in ENCODE_ORDER.get(cls, ()) if name in nested]
+        order += [name for name in nested if name not in order]
+        specs = _ENCODE_SPECS[cls] = [(name, nested[name]) for name in order]
+    return specs
+
+
+def _encode(record: Any) -> dict[str, Any]:
+    payload = {
+        name: getattr(record, name) if nested is None else _encode(getattr(record, name))
+        for name, nested in _encode_specs(type(record))
+    }
+    extra = getattr(record, "extra", None)
+    if extra:
+        payload.update(extra)
+    return payload
+
+
+# Decoding is the validation: a payload that decodes has every required key
+# with the right JSON type. Errors name the path, e.g. inventory[3].dedupe.
+def decode(cls: type, data: Any, where: str = "") -> Any:
+    try:
+        return _decode(cls, data)
+    except RecordError as exc:
+        raise exc.within(where or cls.__name__) from None
+
+
+def decode_all(cls: type, items: Any, where: str) -> list[Any]:
+    if type(items) is not list:
+        raise RecordError(where, f"expected a list, got {type(items).__name__}")
+    records = []
+    append = records.append
+    for index, item in enumerate(items):
+        try:
+            append(_decode(cls, item))
+        except RecordError as exc:
+            raise exc.within(f"{where}[{index}]") from None
+    return records
+
+
+def encode(record: Any) -> dict[str, Any]:
+    return _encode(record)
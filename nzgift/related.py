@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+from nzgift.config import DATA_DIR, PAGE_SOURCES_DIR, ROOT
+from nzgift.state import load_json, now_iso, write_json
+from similarity_index import shingles
+
+RELATED_PATH = DATA_DIR / "related_index.json"
+SCHEMA_VERSION = 1
+TOP_K = 3
+MIN_SCORE = 0.05
+CATEGORY_WEIGHT = 2.0
+# Document frequencies are frozen at the last full rebuild so unchanged rows
+# keep their exact scores; once the products changed since then pass this
+# share they are stale enough that rescoring everything is the better deal.
+REBUILD_FRACTION = 0.2
+
+Vector = dict[str, float]
+Neighbour = list  # [product_id, score], kept as a list so it round-trips through JSON
+
+
+def catalog_paths() -> list[Path]:
+    return [path for path in sorted(ROOT.glob("*/products.json")) if path.parent.name != "data"]
+
+
+def collect_products() -> dict[str, dict[str, Any]]:
+    # Every card on the site, plus the bullet points of pages built from a
+    # page source, which carry most of the descriptive text.
+    products: dict[str, dict[str, Any]] = {}
+    for catalog_path in catalog_paths():
+        category = catalog_path.parent.name
+        for card in load_json(catalog_path):
+            slug = card.get("slug")
+            if not slug:
+                continue
+            source_path = PAGE_SOURCES_DIR / category / f"{slug}.json"
+            details = load_json(source_path)["render"].get("details", []) if source_path.exists() else []
+            text = " ".join([card.get("title", ""), card.get("sub", ""), *details])
+            products[f"{category}/{slug}"] = {
+                "category": category,
+                "path": f"{category}/{card.get('href') or slug + '.html'}",
+                "title": card.get("title", ""),
+                "image": card.get("image", ""),
+                "text": text,
+                "digest": hashlib.sha1(f"{category}\n{text}".encode("utf-8")).hexdigest()[:16],
+            }
+    return products
+
+
+def terms(product: dict[str, Any]) -> dict[str, float]:
+    counts: dict[str, float] = dict.fromkeys(shingles(product["text"]), 1.0)
+    counts[f"category:{product['category']}"] = CATEGORY_WEIGHT
+    return counts
+
+
+def tfidf(counts: dict[str, float], df: dict[str, int], docs: int) -> Vector:
+    vector = {term: tf * (math.log((1 + docs) / (1 + df.get(term, 0))) + 1) for term, tf in counts.items()}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {term: weight / norm for term, weight in vector.items()}
+
+
+def score_rows(vectors: list[Vector], rows: list[int]) -> dict[int, dict[int, float]]:
+    # Cosine similarity of each requested row against every document, keeping
+    # scores at or above MIN_SCORE. Terms that occur in a single document add
+    # nothing to any pair, so they are dropped after normalising. The walk over
+    # an inverted index is a sparse matrix product: each row only meets the
+    # documents it shares a term with.
+    if not rows:
+        return {}
+    occurrences = Counter(term for vector in vectors for term in vector)
+    keep = {term for term, count in occurrences.items() if count > 1}
+    postings: dict[str, list[tuple[int, float]]] = {}
+    for index, vector in enumerate(vectors):
+        for term, weight in vector.items():
+            if term in keep:
+                postings.setdefault(term, []).append((index, weight))
+    result = {}
+    for row in rows:
+        scores: dict[int, float] = {}
+        for term, weight in vectors[row].items():
+            for col, other in postings.get(term, ()):
+                scores[col] = scores.get(col, 0.0) + weight * other
+        result[row] = {col: score for col, score in scores.items() if score >= MIN_SCORE and col != row}
+    return result
+
+
+def top(candidates: dict[str, float], k: int) -> list[Neighbour]:
+    ranked = sorted((-round(score, 4), product_id) for product_id, score in candidates.items())
+    return [[product_id, -score] for score, product_id in ranked[:k]]
+
+
+def build_related(*, full: bool = False, k: int = TOP_K, path: Path = RELATED_PATH) -> dict[str, Any]:
+    started = time.perf_counter()
+    products = collect_products()
+    ids = sorted(products)
+    position = {product_id: index for index, product_id in enumerate(ids)}
+    counts = [terms(products[product_id]) for product_id in ids]
+
+    previous = load_json(path) if path.exists() else None
+    if previous is not None and (previous.get("schema_version") != SCHEMA_VERSION or previous.get("k") != k):
+        previous = None
+    changed: list[str] = ids
+    removed: set[str] = set()
+    drift = 0
+    if previous is not None:
+        old_items = previous["items"]
+        changed = [
+            product_id
+            for product_id in ids
+            if old_items.get(product_id, {}).get("digest") != products[product_id]["digest"]
+        ]
+        removed = set(old_items) - set(ids)
+        drift = previous.get("drift", 0) + len(changed) + len(removed)
+    incremental = previous is not None and not full and drift <= REBUILD_FRACTION * len(ids)
+
+    if incremental:
+        df, docs = previous["df"], previous["docs"]
+    else:
+        df = dict(Counter(term for document in counts for term in document))
+        docs = len(ids)
+    vectors = [tfidf(document, df, docs) for document in counts]
+
+    if not incremental:
+        scored = score_rows(vectors, list(range(len(ids))))
+        neighbours = {ids[row]: top({ids[col]: score for col, score in scored[row].items()}, k) for row in scored}
+        rows_scored = len(ids)
+    else:
+        # Only rows for changed products are scored. Unchanged lists take the
+        # new scores against those products; a list that loses an entry to a
+        # change or removal is rescored in full, since an unchanged product
+        # outside it may now belong in the top k.
+        scored = score_rows(vectors, [position[product_id] for product_id in changed])
+        stale = set(changed) | removed
+        neighbours = {product_id: previous["neighbours"].get(product_id, []) for product_id in ids}
+        against: dict[str, dict[str, float]] = {}
+        for row, scores in scored.items():
+            neighbours[ids[row]] = top({ids[col]: score for col, score in scores.items()}, k)
+            for col, score in scores.items():
+                against.setdefault(ids[col], {})[ids[row]] = score
+        rescore = []
+        for product_id in ids:
+            if product_id in stale:
+                continue
+            old = neighbours[product_id]
+            kept = {entry[0]: entry[1] for entry in old if entry[0] not in stale}
+            if len(kept) < len(old):
+                rescore.append(position[product_id])
+            elif product_id in against:
+                neighbours[product_id] = top({**kept, **against[product_id]}, k)
+        for row, scores in score_rows(vectors, rescore).items():
+            neighbours[ids[row]] = top({ids[col]: score for col, score in scores.items()}, k)
+        rows_scored = len(changed) + len(rescore)
+
+    payload = {
+        "schema_version": SCHEMA_VERSION,
+        "generated_at": now_iso(),
+        "k": k,
+        "docs": docs,
+        "drift": drift if incremental else 0,
+        "df": df,
+        "items": {
+            product_id: {field: products[product_id][field] for field in ("path", "title", "image", "digest")}
+            for product_id in ids
+        },
+        "neighbours": neighbours,
+    }
+    write_json(path, payload, compact=True)
+    return {
+        "mode": "incremental" if incremental else "full",
+        "products": len(ids),
+        "changed": len(changed),
+        "removed": len(removed),
+        "rows_scored": rows_scored,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def related_products(product_id: str, path: Path = RELATED_PATH) -> list[dict[str, Any]]:
+    if not path.exists():
+        return []
+    index = load_json(path)
+    items = index["items"]
+    neighbours = index["neighbours"].get(product_id, [])
+    return [
+        {"path": items[other]["path"], "title": items[other]["title"], "image": items[other]["image"], "score": score}
+        for other, score in neighbours
+        if other in items
+    ]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Precompute related products for every catalog item.")
+    parser.add_argument("--full", action="store_true", help="Recompute document frequencies and every row")
+    parser.add_argument("--k", type=int, default=TOP_K, help="Neighbours kept per product")
+    parser.add_argument("--show", metavar="PRODUCT_ID", help="Print the stored neighbours of one product")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.show:
+        print(json.dumps(related_products(args.show), indent=2, ensure_ascii=False))
+        return
+    print(json.dumps(build_related(full=args.full, k=args.k), indent=2))
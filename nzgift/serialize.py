@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import os
+import stat
+import tempfile
+from json.decoder import WHITESPACE
+from pathlib import Path
+from typing import Any, Iterator
+
+# orjson is used when installed unless NZGIFT_JSON=stdlib. Both produce the
+# same bytes for the payloads these files hold (tests/test_serialize.py pins
+# that), so switching causes no diffs; values orjson cannot encode go to stdlib.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+if os.environ.get("NZGIFT_JSON") == "stdlib":
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(payload: Any, *, compact: bool = False, ensure_ascii: bool = False) -> bytes:
+    # Pretty is the two-space layout the repo has always committed; compact is
+    # for machine-only state that nobody reads in a diff. Both end in a newline.
+    if orjson is not None and not ensure_ascii:
+        try:
+            return orjson.dumps(payload, option=0 if compact else orjson.OPT_INDENT_2) + b"\n"
+        except TypeError:
+            # Big ints, non-str keys and the like: let the stdlib decide.
+            pass
+    if compact:
+        text = json.dumps(payload, ensure_ascii=ensure_ascii, separators=(",", ":"))
+    else:
+        text = json.dumps(payload, ensure_ascii=ensure_ascii, indent=2)
+    return (text + "\n").encode("utf-8")
+
+
+def read_json(path: Path) -> Any:
+    return loads(Path(path).read_bytes())
+
+
+def iter_array(path: Path, key: str) -> Iterator[Any]:
+    # Items of a top-level array, decoded one at a time, so a caller holding
+    # only a window of them never has the whole list of objects alive. The
+    # text is still read in full; other top-level values are skipped.
+    text = Path(path).read_text(encoding="utf-8")
+    decoder = json.JSONDecoder()
+
+    def skip(index: int, expected: str = "") -> int:
+        index = WHITESPACE.match(text, index).end()
+        if expected:
+            if text[index : index + 1] != expected:
+                raise ValueError(f"{path}: expected {expected!r} at offset {index}")
+            index += 1
+        return index
+
+    index = skip(skip(0, "{"))
+    while text[index : index + 1] != "}":
+        name, index = decoder.raw_decode(text, index)
+        index = skip(skip(index, ":"))
+        if name == key:
+            index = skip(skip(index, "["))
+            while text[index : index + 1] != "]":
+                item, index = decoder.raw_decode(text, index)
+                yield item
+                index = skip(index)
+                index = skip(index + 1) if text[index : index + 1] == "," else index
+            return
+        _, index = decoder.raw_decode(text, index)
+        index = skip(index)
+        index = skip(index + 1) if text[index : index + 1] == "," else index
+
+
+def write_bytes_atomic(path: Path, data: bytes, *, durable: bool = True) -> None:
+    # Readers see the old file or the new one, never a partial write. The temp
+    # name is unique so concurrent writers cannot clobber each other's temp file.
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        os.fchmod(fd, stat.S_IMODE(path.stat().st_mode) if path.exists() else 0o644)
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+            if durable:
+                handle.flush()
+                os.fsync(handle.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def write_json(path: Path, payload: Any, *, compact: bool = False, ensure_ascii: bool = False) -> None:
+    write_bytes_atomic(path, dumps(payload, compact=compact, ensure_ascii=ensure_ascii))
+
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    # Unchanged outputs keep their mtime, so incremental steps downstream skip them.
+    path = Path(path)
+    if path.exists() and path.read_bytes() == data:
+        return False
+    write_bytes_atomic(path, data, durable=False)
+    return True
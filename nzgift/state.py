@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import random
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Callable, Literal, TypeVar
+
+from nzgift import serialize
+from nzgift.locking import file_lock
+from tracing import traced
+
+T = TypeVar("T")
+# (inode, mtime_ns, size). Every write is an atomic rename onto a new inode,
+# so this changes on each write even when the size and mtime tick do not.
+Version = tuple[int, int, int]
+# What a write expects to find on disk: a version, None for "no file yet",
+# "cached" for the version the payload was loaded at, or "any" for no check.
+Expected = Version | None | Literal["cached", "any"]
+RETRIES = 5
+
+
+class VersionConflict(RuntimeError):
+    def __init__(self, path: Path, expected: Version | None, found: Version | None) -> None:
+        super().__init__(f"{Path(path).name} changed on disk since it was read")
+        self.path = path
+        self.expected = expected
+        self.found = found
+
+
+def now_iso() -> str:
+    return datetime.now(UTC).isoformat()
+
+
+def version_of(path: Path) -> Version | None:
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class StateStore:
+    # Process-wide cache of parsed data files. An entry is reused only while the
+    # file's version is unchanged, so chained commands share one parse and
+    # writes from other processes are still picked up. Callers that mutate a
+    # loaded payload are expected to write it back; that write is refused if
+    # another process replaced the file in between.
+    def __init__(self) -> None:
+        self._cache: dict[Path, tuple[Version, Any]] = {}
+
+    def load(self, path: Path) -> Any:
+        path = Path(path).resolve()
+        signature = version_of(path)
+        if signature is None:
+            raise FileNotFoundError(path)
+        cached = self._cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        payload = serialize.read_json(path)
+        self._cache[path] = (signature, payload)
+        return payload
+
+    def loaded_version(self, path: Path) -> Version | None:
+        cached = self._cache.get(Path(path).resolve())
+        return cached[0] if cached else None
+
+    def write(
+        self,
+        path: Path,
+        payload: Any,
+        *,
+        expected: Expected = "cached",
+        compact: bool = False,
+        ensure_ascii: bool = False,
+    ) -> None:
+        path = Path(path).resolve()
+        if expected == "cached":
+            cached = self._cache.get(path)
+            expected = cached[0] if cached and cached[1] is payload else "any"
+        with file_lock(path):
+            if expected != "any":
+                found = version_of(path)
+                if found != expected:
+                    self._cache.pop(path, None)
+                    raise VersionConflict(path, expected, found)
+            serialize.write_json(path, payload, compact=compact, ensure_ascii=ensure_ascii)
+            self._cache[path] = (version_of(path), payload)
+
+    def invalidate(self, path: Path | None = None) -> None:
+        if path is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(Path(path).resolve(), None)
+
+
+STORE = StateStore()
+
+
+def load_json(path: Path) -> Any:
+    return STORE.load(path)
+
+
+@traced("disk")
+def write_json(
+    path: Path,
+    payload: Any,
+    *,
+    expected: Expected = "cached",
+    compact: bool = False,
+    ensure_ascii: bool = False,
+) -> None:
+    STORE.write(path, payload, expected=expected, compact=compact, ensure_ascii=ensure_ascii)
+
+
+def read_versioned(path: Path) -> tuple[Any, Version | None]:
+    # A private copy (not the shared cache) plus the version to commit against.
+    # The version is taken first, so a write landing in between shows up as a
+    # conflict at commit rather than going unnoticed.
+    version = version_of(path)
+    return serialize.read_json(path), version
+
+
+def commit_json(changes: list[tuple[Path, Any, Version | None]], *, compact: bool = False) -> None:
+    # Writes several files as one unit: every version is checked under all the
+    # locks before anything is written, so a conflict on one file cannot leave
+    # another half of the change on disk.
+    with file_lock(*(path for path, _, _ in changes)):
+        for path, _, expected in changes:
+            found = version_of(path)
+            if found != expected:
+                raise VersionConflict(path, expected, found)
+        for path, payload, expected in changes:
+            write_json(path, payload, expected=expected, compact=compact)
+
+
+def with_retries(func: Callable[[], T], *, attempts: int = RETRIES) -> T:
+    # Re-runs func after a VersionConflict; func must re-read what it changes.
+    for attempt in range(attempts):
+        try:
+            return func()
+        except VersionConflict:
+            if attempt + 1 == attempts:
+                raise
+            time.sleep(0.01 * 2**attempt * (1 + random.random()))
+    raise AssertionError("unreachable")
+
+
+def update_json(
+    path: Path,
+    apply: Callable[[Any], Any],
+    *,
+    default: Callable[[], Any] | None = None,
+    compact: bool = False,
+    ensure_ascii: bool = False,
+) -> Any:
+    # Optimistic read-modify-write: apply runs on the current payload without
+    # holding the lock, and is re-applied to a fresh read if another process
+    # wrote in between. apply mutates in place or returns a replacement.
+    path = Path(path)
+
+    def attempt() -> Any:
+        if default is not None and not path.exists():
+            payload, expected = default(), None
+        else:
+            payload = load_json(path)
+            expected = STORE.loaded_version(path)
+        result = apply(payload)
+        payload = payload if result is None else result
+        write_json(path, payload, expected=expected, compact=compact, ensure_ascii=ensure_ascii)
+        return payload
+
+    return with_retries(attempt)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from nzgift.assets import build_assets
+from nzgift.build import Stage, build_graph, run_build
+from nzgift.config import DIST_DIR, PAGE_SOURCES_DIR, ROOT
+from nzgift.preview import ReloadHub, make_server
+
+SKIP_DIRS = {".git", "venv", ".venv", "__pycache__", "node_modules", "dist", "data"}
+SKIP_SUFFIXES = (".swp", ".swx", ".tmp", "~", ".pyc")
+# Publishing stages: the preview refreshes dist/ itself and nothing is
+# deployed from watch mode.
+PUBLISH_STAGES = {"assets", "deploy_manifest"}
+
+Snapshot = dict[str, tuple[int, int]]
+
+
+def scan(root: Path = ROOT) -> Snapshot:
+    found: Snapshot = {}
+    # data/ is mostly build output; page source records are the one input in it.
+    for top in (root, PAGE_SOURCES_DIR):
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [name for name in dirnames if name not in SKIP_DIRS]
+            for name in filenames:
+                if name.endswith(SKIP_SUFFIXES) or name.startswith(".#"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found[path] = (stat.st_mtime_ns, stat.st_size)
+    return found
+
+
+def changed_paths(before: Snapshot, after: Snapshot) -> set[str]:
+    return {path for path in before.keys() | after.keys() if before.get(path) != after.get(path)}
+
+
+def targets_for(graph: dict[str, Stage], changes: set[str]) -> list[str]:
+    # The stages that read a changed file, plus everything downstream of them.
+    dirty = {Path(path) for path in changes}
+    wanted: set[str] = set()
+    while True:
+        found = {
+            name
+            for name, stage in graph.items()
+            if name not in PUBLISH_STAGES and name not in wanted and not dirty.isdisjoint(stage.inputs)
+        }
+        if not found:
+            return sorted(wanted)
+        wanted |= found
+        dirty = {path for name in found for path in graph[name].outputs}
+
+
+def event_waiter(root: Path) -> tuple[Callable[[float], bool], str]:
+    # inotify (or the platform equivalent) through watchdog when it is
+    # installed; otherwise the caller just polls on every timeout.
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return (lambda timeout: (time.sleep(timeout), True)[1]), "polling"
+
+    woke = threading.Event()
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event) -> None:
+            woke.set()
+
+    observer = Observer()
+    observer.schedule(Handler(), str(root), recursive=True)
+    observer.daemon = True
+    observer.start()
+
+    def wait(timeout: float) -> bool:
+        fired = woke.wait(timeout)
+        woke.clear()
+        return fired
+
+    return wait, type(observer).__name__
+
+
+def watch(*, debounce: float, interval: float, on_change: Callable[[set[str]], None]) -> None:
+    wait, mode = event_waiter(ROOT)
+    print(f"Watching {ROOT} ({mode}); Ctrl-C to stop")
+    last = scan()
+    while True:
+        if not wait(interval):
+            continue
+        current = scan()
+        if not changed_paths(last, current):
+            continue
+        # Editors and the admin app write in bursts; settle before building.
+        while True:
+            time.sleep(debounce)
+            settled = scan()
+            if settled == current:
+                break
+            current = settled
+        changes = changed_paths(last, current)
+        on_change(changes)
+        # Take the build's own writes as the new baseline so they do not
+        # trigger a second round.
+        last = scan()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rebuild changed pages, catalogs and the site map as files change.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5500)
+    parser.add_argument("--no-serve", action="store_true", help="Only rebuild; do not run the live-reload preview")
+    parser.add_argument("--debounce", type=float, default=0.1, help="Seconds of quiet before a rebuild")
+    parser.add_argument("--interval", type=float, default=0.25, help="Polling interval when inotify is unavailable")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    hub = ReloadHub()
+    if not args.no_serve:
+        server = make_server(args.host, args.port, root=DIST_DIR, hub=hub)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Live preview on http://{args.host}:{args.port}")
+
+    initial = run_build([name for name in build_graph() if name not in PUBLISH_STAGES])
+    if not args.no_serve:
+        build_assets()
+    print(f"Initial build: ran {len(initial['ran'])} of {initial['stages']} stages in {initial['elapsed_s']}s")
+
+    def on_change(changes: set[str]) -> None:
+        started = time.perf_counter()
+        names = sorted(os.path.relpath(path, ROOT) for path in changes)
+        targets = targets_for(build_graph(), changes)
+        try:
+            ran = run_build(targets, with_deps=False)["ran"] if targets else []
+            if not args.no_serve:
+                # Incremental: only pages and assets that changed are re-emitted.
+                build_assets()
+        except Exception as exc:
+            print(f"Build failed after {', '.join(names[:5])}: {exc}")
+            return
+        hub.notify()
+        ran = ", ".join(ran) or "nothing to rebuild"
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"{', '.join(names[:5])}{' …' if len(names) > 5 else ''} -> {ran} ({elapsed_ms:.0f} ms)")
+
+    try:
+        watch(debounce=args.debounce, interval=args.interval, on_change=on_change)
+    except KeyboardInterrupt:
+        pass
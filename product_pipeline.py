@@ -1,22 +1,37 @@
 from __future__ import annotations
 
+import hashlib
 import html
-import json
 import re
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse, urlunparse
 
-import requests
+from amazon_extract import (
+    ALLOWED_CATEGORIES,
+    PageWatch,
+    clean_text,
+    extract_page,
+    guess_category,
+)
+from metrics import CATALOG_WRITE_SECONDS
+from nzgift import http, serialize
+from nzgift.config import PAGE_SOURCES_DIR, STATE_PATH
+from nzgift.locking import file_lock
+from nzgift.state import load_json, write_json
+from similarity_index import SimilarityIndex, product_text, sync_index, update_index
+from tracing import span, traced
 
 ROOT = Path(__file__).resolve().parent
-ALLOWED_CATEGORIES = ["artwork", "clothing", "jewelry", "skincare", "food", "books"]
-HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
-    ),
-    "Accept-Language": "en-US,en;q=0.9",
-}
+CATALOG_SHARD_DIR = "catalog"
+# What every product page must contain; checked on generation and by copy QA.
+REQUIRED_SNIPPETS = [
+    "<html",
+    "</html>",
+    '<link rel="stylesheet" href="../style.css"',
+    '<script src="../app.js">',
+    'id="mainProductImage"',
+]
+CATALOG_PAGE_SIZE = 24
 
 
 def slugify(text: str) -> str:
@@ -27,13 +42,6 @@ def slugify(text: str) -> str:
     return s or "product"
 
 
-def clean_text(text: str) -> str:
-    text = html.unescape(text or "")
-    text = re.sub(r"<[^>]+>", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
-
 def truncate(text: str, limit: int) -> str:
     text = clean_text(text)
     if len(text) <= limit:
@@ -63,110 +71,6 @@ def normalize_affiliate_url(url: str) -> str:
     return urlunparse((parsed.scheme, parsed.netloc, parsed.path, "", query_str, ""))
 
 
-def extract_title(raw_html: str) -> str:
-    match = re.search(r'id="productTitle"[^>]*>(.*?)</span>', raw_html, re.S)
-    if match:
-        return clean_text(match.group(1))
-    match = re.search(r"<title>(.*?)</title>", raw_html, re.S | re.I)
-    if match:
-        title = clean_text(match.group(1))
-        title = re.sub(r":\s*Amazon\..*$", "", title)
-        return title
-    return "NZ Gift"
-
-
-def extract_dynamic_images(raw_html: str) -> list[str]:
-    grouped: list[str] = []
-    seen_media_ids: set[str] = set()
-
-    start = raw_html.find("'colorImages':")
-    end = raw_html.find("'colorToAsin':", start) if start != -1 else -1
-    if start != -1 and end != -1:
-        block = raw_html[start:end]
-        object_pattern = re.compile(
-            r'"hiRes":"([^"]*)".*?"large":"([^"]*)".*?"physicalIdForMedia":"([^"]+)"',
-            re.S,
-        )
-        for hi_res, large, media_id in object_pattern.findall(block):
-            if media_id in seen_media_ids:
-                continue
-            seen_media_ids.add(media_id)
-            chosen = hi_res.strip() or large.strip()
-            if chosen:
-                grouped.append(chosen)
-
-    if grouped:
-        return grouped[:6]
-
-    urls: list[str] = []
-    match = re.search(r'data-a-dynamic-image="([^"]+)"', raw_html)
-    if match:
-        payload = html.unescape(match.group(1))
-        try:
-            data = json.loads(payload)
-            urls.extend(data.keys())
-        except Exception:
-            pass
-    if not urls:
-        pattern = r"https://m\.media-amazon\.com/images/I/[A-Za-z0-9%+_,.-]+\.(?:jpg|jpeg|png|webp)"
-        urls = re.findall(pattern, raw_html)
-    unique: list[str] = []
-    for url in urls:
-        if url not in unique:
-            unique.append(url)
-    return unique[:6]
-
-
-def extract_bullets(raw_html: str) -> list[str]:
-    block = re.search(r'<div id="feature-bullets".*?</div>\s*</div>', raw_html, re.S)
-    source = block.group(0) if block else raw_html
-    bullets = re.findall(r'<span class="a-list-item">(.*?)</span>', source, re.S)
-    cleaned = []
-    banned_fragments = [
-        "image unavailable",
-        "publication date",
-        "publisher",
-        "language",
-        "isbn",
-        "best sellers rank",
-        "customer reviews",
-        "amazon",
-        "ue.count",
-        "topreviewsdetailpagecount",
-        "review",
-    ]
-    for bullet in bullets:
-        text = clean_text(bullet)
-        low = text.lower()
-        if len(text) < 20:
-            continue
-        if any(fragment in low for fragment in banned_fragments):
-            continue
-        if re.search(r"#\d+\s+in\s+", low):
-            continue
-        cleaned.append(text)
-    deduped: list[str] = []
-    for item in cleaned:
-        if item not in deduped:
-            deduped.append(item)
-    return deduped[:5]
-
-
-def guess_category(title: str, bullets: list[str]) -> str:
-    hay = f"{title} {' '.join(bullets)}".lower()
-    if any(word in hay for word in ["paperback", "hardcover", "book", "storybook", "author", "isbn"]):
-        return "books"
-    if any(word in hay for word in ["chocolate", "coffee", "tea", "honey", "snack", "food", "gift basket"]):
-        return "food"
-    if any(word in hay for word in ["serum", "cleanser", "mask", "oil", "cosmetic", "skincare", "beauty"]):
-        return "skincare"
-    if any(word in hay for word in ["pendant", "necklace", "earrings", "jade", "greenstone", "pounamu"]):
-        return "jewelry"
-    if any(word in hay for word in ["shirt", "beanie", "gloves", "wool", "merino", "clothing"]):
-        return "clothing"
-    return "artwork"
-
-
 CATEGORY_META = {
     "artwork": {
         "label": "Artwork",
@@ -195,6 +99,7 @@ CATEGORY_META = {
 }
 
 
+@traced("copy")
 def generate_copy(title: str, category: str, bullets: list[str]) -> dict:
     joined = "; ".join(bullets[:3])
     label = CATEGORY_META[category]["label"]
@@ -278,7 +183,8 @@ def generate_copy(title: str, category: str, bullets: list[str]) -> dict:
     }
 
 
-def render_product_page(*, title: str, category: str, images: list[str], amazon_link: str, meta_description: str, meta_keywords: str, intro: str, details: list[str], why: str, story_title: str, story_paragraphs: list[str]) -> str:
+@traced("render")
+def render_product_page(*, title: str, category: str, images: list[str], amazon_link: str, meta_description: str, meta_keywords: str, intro: str, details: list[str], why: str, story_title: str, story_paragraphs: list[str], related: list[dict] | None = None) -> str:
     category_label = CATEGORY_META[category]["label"]
     image1 = images[0] if images else "../images/pounamu_twist.png"
     thumbs = "\n".join(
@@ -289,42 +195,17 @@ def render_product_page(*, title: str, category: str, images: list[str], amazon_
     )
     detail_html = "\n".join([f"              <li>{html.escape(item)}</li>" for item in details])
     story_html = "\n".join([f"            <p class=\"body\">{html.escape(p)}</p>" for p in story_paragraphs])
+    related_html = render_card_section(related or [], "Related gifts", "related-gifts")
 
-    return f'''<!DOCTYPE html>
-<html lang="en">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width,initial-scale=1" />
-
-    <title>{html.escape(title)} | NZ Gifts</title>
-
-    <meta name="description" content="{html.escape(meta_description)}" />
-    <meta name="keywords" content="{html.escape(meta_keywords)}" />
-    <meta name="author" content="NZ Gifts" />
-
-    <link rel="stylesheet" href="../style.css" />
-  </head>
-  <body>
-    <div id="site-header"></div>
-
-    <main class="wrap">
-      <section class="hero">
-        <div class="breadcrumb">
-          <a href="../">Home</a> / <a href="./">{html.escape(category_label)}</a> /
-          {html.escape(title)}
-        </div>
-        <h1 class="page-title">{html.escape(title)}</h1>
-        <p class="intro">{html.escape(intro)}</p>
-      </section>
-
-      <section class="product-grid">
+    main_html = f'''      <section class="product-grid">
         <div class="gallery gallery-thumbs">
           <div class="main-image">
             <img
               id="mainProductImage"
               src="{html.escape(image1)}"
               alt="{html.escape(title)}"
-              loading="lazy"
+              loading="eager"
+              fetchpriority="high"
             />
           </div>
 
@@ -368,7 +249,50 @@ def render_product_page(*, title: str, category: str, images: list[str], amazon_
           </p>
         </div>
       </section>
-    </main>
+{related_html}'''
+    crumbs = f'<a href="../">Home</a> / <a href="./">{html.escape(category_label)}</a> /'
+    return render_page_shell(
+        title=title,
+        meta_description=meta_description,
+        meta_keywords=meta_keywords,
+        crumbs=crumbs,
+        intro=intro,
+        main_html=main_html,
+    )
+
+
+def render_page_shell(*, title: str, meta_description: str, meta_keywords: str, crumbs: str, intro: str, main_html: str) -> str:
+    # Head, hero and footer shared by product and roundup pages, both of which
+    # sit one directory below the site root. Resource hints for the hero image
+    # are added at publish time by nzgift.critical_css.
+    return f'''<!DOCTYPE html>
+<html lang="en">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width,initial-scale=1" />
+
+    <title>{html.escape(title)} | NZ Gifts</title>
+
+    <meta name="description" content="{html.escape(meta_description)}" />
+    <meta name="keywords" content="{html.escape(meta_keywords)}" />
+    <meta name="author" content="NZ Gifts" />
+
+    <link rel="stylesheet" href="../style.css" />
+  </head>
+  <body>
+    <div id="site-header"></div>
+
+    <main class="wrap">
+      <section class="hero">
+        <div class="breadcrumb">
+          {crumbs}
+          {html.escape(title)}
+        </div>
+        <h1 class="page-title">{html.escape(title)}</h1>
+        <p class="intro">{html.escape(intro)}</p>
+      </section>
+
+{main_html}    </main>
 
     <div id="site-footer" class="footer-mount"></div>
 
@@ -378,42 +302,153 @@ def render_product_page(*, title: str, category: str, images: list[str], amazon_
 '''
 
 
+def render_card_section(items: list[dict], heading: str, css_class: str) -> str:
+    # Cards link by site-relative path (category/slug.html), so they work from
+    # any page one level down, whichever category the product is in.
+    if not items:
+        return ""
+    cards = "\n".join(
+        f'''          <a class="card" href="../{html.escape(item['path'])}">
+            <div class="card-img"><img src="{html.escape(item['image'])}" alt="{html.escape(item['title'])}" loading="lazy" decoding="async" /></div>
+            <div class="card-title">{html.escape(item['title'])}</div>{render_card_sub(item)}
+          </a>'''
+        for item in items
+    )
+    return f'''
+      <section class="{css_class}">
+        <div class="kicker">{html.escape(heading)}</div>
+        <div class="cards">
+{cards}
+        </div>
+      </section>
+'''
+
+
+def render_card_sub(item: dict) -> str:
+    if not item.get("sub"):
+        return ""
+    return f'\n            <div class="card-sub">{html.escape(item["sub"])}</div>'
+
+
+@traced("render")
+def render_roundup_page(*, title: str, intro: str, meta_description: str, products: list[dict]) -> str:
+    categories = dict.fromkeys(item["category"] for item in products if item["category"] in CATEGORY_META)
+    keywords = ", ".join(CATEGORY_META[category]["keywords"] for category in categories)
+    return render_page_shell(
+        title=title,
+        meta_description=meta_description,
+        meta_keywords=keywords,
+        crumbs='<a href="../">Home</a> /',
+        intro=intro,
+        main_html=render_card_section(products, f"{len(products)} picks", "roundup-picks").lstrip("\n"),
+    )
+
+
 def load_catalog(path: Path) -> list[dict]:
     if not path.exists():
         return []
-    return json.loads(path.read_text(encoding="utf-8"))
+    return serialize.read_json(path)
 
 
+@traced("disk")
 def write_catalog(path: Path, items: list[dict]) -> None:
-    path.write_text(json.dumps(items, indent=2, ensure_ascii=True) + "\n", encoding="utf-8")
+    with CATALOG_WRITE_SECONDS.time(writer="product_pipeline"):
+        serialize.write_json(path, items, ensure_ascii=True)
+        write_catalog_shards(path, items)
+
+
+def compact_card(item: dict) -> dict:
+    # cards.js falls back to the title for alt text, so identical copies are dropped.
+    return {key: value for key, value in item.items() if value and not (key == "alt" and value == item.get("title"))}
+
+
+def write_catalog_shards(catalog_path: Path, items: list[dict]) -> dict:
+    # Compact fixed-size pages plus a manifest, so the category page can load
+    # the first page only and fetch the rest as the visitor scrolls.
+    shard_dir = catalog_path.parent / CATALOG_SHARD_DIR
+    shard_dir.mkdir(exist_ok=True)
+    cards = [compact_card(item) for item in items]
+    payloads = [
+        serialize.dumps(cards[start : start + CATALOG_PAGE_SIZE], compact=True)
+        for start in range(0, len(cards), CATALOG_PAGE_SIZE)
+    ]
+    names = [f"page-{number}.json" for number in range(1, len(payloads) + 1)]
+    for name, payload in zip(names, payloads):
+        serialize.write_if_changed(shard_dir / name, payload)
+    for stale in shard_dir.glob("page-*.json"):
+        if stale.name not in names:
+            stale.unlink()
+    manifest = {
+        "version": hashlib.sha256(b"".join(payloads).rstrip(b"\n")).hexdigest()[:12],
+        "page_size": CATALOG_PAGE_SIZE,
+        "total": len(cards),
+        "pages": names,
+    }
+    serialize.write_if_changed(shard_dir / "manifest.json", serialize.dumps(manifest, compact=True))
+    return manifest
+
+
+def merge_catalog_entries(items: list[dict], entries: list[dict]) -> list[dict]:
+    # Existing slugs keep their position; new products go to the top.
+    by_slug = {entry["slug"]: entry for entry in entries}
+    merged = [by_slug.pop(item.get("slug"), item) for item in items]
+    return [entry for entry in entries if entry["slug"] in by_slug] + merged
+
+
+def page_source_path(category: str, slug: str) -> Path:
+    return PAGE_SOURCES_DIR / category / f"{slug}.json"
+
+
+def render_page_source(source: dict, related: list[dict] | None = None) -> str:
+    return render_product_page(category=source["category"], related=related, **source["render"])
 
 
-def upsert_catalog(category: str, entry: dict) -> None:
-    path = ROOT / category / "products.json"
-    items = load_catalog(path)
-    items = [item for item in items if item.get("slug") != entry["slug"]]
-    items.insert(0, entry)
-    write_catalog(path, items)
+@traced("dedupe")
+def record_possible_duplicates(product_id: str, title: str) -> list[dict]:
+    text = product_text(title)
+    matches: list[dict] = []
+
+    def apply(index: SimilarityIndex) -> None:
+        if STATE_PATH.exists():
+            sync_index(index, load_json(STATE_PATH))
+        matches[:] = index.query(text, exclude=[product_id])
+        index.add(product_id, text, title=title, kind="inventory")
+
+    update_index(apply)
+    return matches
 
 
 def fetch_amazon_product(url: str) -> dict:
-    response = requests.get(url, headers=HEADERS, timeout=30)
-    response.raise_for_status()
-    raw_html = response.text
-    title = extract_title(raw_html)
-    images = extract_dynamic_images(raw_html)
-    bullets = extract_bullets(raw_html)
-    category = guess_category(title, bullets)
+    with span("fetch_amazon_product", "network", url=url) as attrs:
+        raw_html, transfer = http.fetch_until(url, PageWatch())
+        attrs.update(bytes=transfer["bytes_read"], bytes_saved=transfer["bytes_saved"], stopped=transfer["stopped"])
+    fields, extraction = extract_page(raw_html)
     return {
-        "title": title,
-        "images": images,
-        "bullets": bullets,
-        "category": category,
+        **fields,
+        "category": guess_category(fields["title"], fields["bullets"]),
         "affiliate_url": normalize_affiliate_url(url),
         "source_url": url,
+        "extraction": extraction,
+        "transfer": transfer,
     }
 
 
+def undo_import_writes(previous: dict[Path, bytes | None], catalog_path: Path, slug: str, previous_card: dict | None) -> None:
+    # A failed build must not leave a half-imported product: the page source,
+    # the rendered page and the catalog card go back to what they were.
+    for path, data in previous.items():
+        if data is None:
+            path.unlink(missing_ok=True)
+        else:
+            serialize.write_bytes_atomic(path, data)
+    with file_lock(catalog_path):
+        items = load_catalog(catalog_path)
+        restored = [previous_card if item.get("slug") == slug else item for item in items]
+        restored = [item for item in restored if item is not None]
+        if restored != items:
+            write_catalog(catalog_path, restored)
+
+
 def import_product(url: str, category: str | None = None) -> dict:
     product = fetch_amazon_product(url)
     final_category = category or product["category"]
@@ -422,39 +457,70 @@ def import_product(url: str, category: str | None = None) -> dict:
     title = product["title"]
     slug = slugify(title)
     copy = generate_copy(title, final_category, product["bullets"])
-    out_dir = ROOT / final_category
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / f"{slug}.html"
-    html_content = render_product_page(
-        title=title,
-        category=final_category,
-        images=product["images"],
-        amazon_link=product["affiliate_url"],
-        meta_description=copy["meta_description"],
-        meta_keywords=copy["meta_keywords"],
-        intro=copy["intro"],
-        details=copy["details"],
-        why=copy["why"],
-        story_title=copy["story_title"],
-        story_paragraphs=copy["story_paragraphs"],
-    )
-    out_path.write_text(html_content, encoding="utf-8")
-    upsert_catalog(
-        final_category,
+    product_id = f"{final_category}/{slug}"
+    source_path = page_source_path(final_category, slug)
+    catalog_path = ROOT / final_category / "products.json"
+    previous = {path: path.read_bytes() if path.exists() else None for path in (source_path, ROOT / final_category / f"{slug}.html")}
+    previous_card = next((item for item in load_catalog(catalog_path) if item.get("slug") == slug), None)
+    # The page, its catalog entry and the site map are all derived from this
+    # record by the build graph, so a re-render never needs a new fetch.
+    write_json(
+        source_path,
         {
+            "id": product_id,
+            "category": final_category,
             "slug": slug,
-            "href": f"{slug}.html",
-            "image": product["images"][0] if product["images"] else "",
-            "alt": title,
-            "title": title,
-            "sub": copy["card_sub"],
+            "source_url": url,
+            "render": {
+                "title": title,
+                "images": product["images"],
+                "amazon_link": product["affiliate_url"],
+                "meta_description": copy["meta_description"],
+                "meta_keywords": copy["meta_keywords"],
+                "intro": copy["intro"],
+                "details": copy["details"],
+                "why": copy["why"],
+                "story_title": copy["story_title"],
+                "story_paragraphs": copy["story_paragraphs"],
+            },
+            "card": {
+                "slug": slug,
+                "href": f"{slug}.html",
+                "image": product["images"][0] if product["images"] else "",
+                "alt": title,
+                "title": title,
+                "sub": copy["card_sub"],
+            },
         },
     )
+    from nzgift.build import product_targets, run_build
+    from nzgift.lifecycle import record_import
+
+    try:
+        build = run_build(targets=product_targets(final_category, slug), with_deps=False)
+    except Exception:
+        undo_import_writes(previous, catalog_path, slug, previous_card)
+        raise
+    lifecycle = record_import(
+        product_id=product_id,
+        category=final_category,
+        slug=slug,
+        title=title,
+        amazon_url=product["affiliate_url"],
+        image=product["images"][0] if product["images"] else "",
+        source_url=url,
+    )
+    possible_duplicates = record_possible_duplicates(product_id, title)
     return {
         "title": title,
         "category": final_category,
         "slug": slug,
-        "path": str(out_path.relative_to(ROOT)),
+        "path": f"{final_category}/{slug}.html",
         "affiliate_url": product["affiliate_url"],
         "images": product["images"],
+        "possible_duplicates": possible_duplicates,
+        "build": build,
+        "lifecycle": lifecycle,
+        "extraction": product["extraction"],
+        "transfer": product["transfer"],
     }
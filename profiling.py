@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    import cProfile
+    import tracemalloc
+
+ROOT = Path(__file__).resolve().parent
+RUN_LOGS_DIR = ROOT / "data" / "run_logs"
+TOP_FUNCTIONS = 15
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 10
+
+
+def _split_profile_args(argv: list[str]) -> tuple[argparse.Namespace, list[str]]:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--profile-mem", action="store_true")
+    return parser.parse_known_args(argv)
+
+
+def _report_base(name: str) -> Path:
+    RUN_LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+    return RUN_LOGS_DIR / f"{stamp}-{name}"
+
+
+def _write_cpu_report(profiler: cProfile.Profile, base: Path) -> None:
+    import io
+    import pstats
+
+    pstats_path = base.with_suffix(".pstats")
+    profiler.dump_stats(pstats_path)
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+    base.with_suffix(".profile.txt").write_text(buffer.getvalue(), encoding="utf-8")
+
+    print(f"\n[profile] top {TOP_FUNCTIONS} functions by cumulative time ({pstats_path}):", file=sys.stderr)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    for (filename, line, func), (_, ncalls, tottime, cumtime, _) in rows:
+        location = Path(filename).name if filename != "~" else "<builtin>"
+        print(f"  {cumtime:8.3f}s cum {tottime:8.3f}s self {ncalls:>7} calls  {func} ({location}:{line})", file=sys.stderr)
+
+
+def _write_memory_report(snapshot: tracemalloc.Snapshot, peak: int, base: Path) -> None:
+    import tracemalloc
+
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    stats = snapshot.statistics("traceback")[:TOP_ALLOCATIONS]
+    lines = [f"peak traced memory: {peak / 1024 / 1024:.2f} MiB", ""]
+    for stat in stats:
+        lines.append(f"{stat.size / 1024:10.1f} KiB in {stat.count} blocks")
+        lines.extend(f"    {line}" for line in stat.traceback.format())
+    report_path = base.with_suffix(".memory.txt")
+    report_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    print(f"\n[profile-mem] peak {peak / 1024 / 1024:.2f} MiB, top allocations ({report_path}):", file=sys.stderr)
+    for stat in snapshot.statistics("lineno")[:5]:
+        frame = stat.traceback[0]
+        print(f"  {stat.size / 1024:10.1f} KiB  {Path(frame.filename).name}:{frame.lineno}", file=sys.stderr)
+
+
+def run_cli(main: Callable[[], Any], name: str) -> Any:
+    options, remaining = _split_profile_args(sys.argv[1:])
+    sys.argv = [sys.argv[0], *remaining]
+    if not options.profile and not options.profile_mem:
+        return main()
+
+    # Only pay for the profilers when they are asked for.
+    import cProfile
+    import tracemalloc
+
+    base = _report_base(name)
+    profiler = cProfile.Profile() if options.profile else None
+    if options.profile_mem:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        if profiler:
+            return profiler.runcall(main)
+        return main()
+    finally:
+        if options.profile_mem:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            _write_memory_report(snapshot, peak, base)
+        if profiler:
+            _write_cpu_report(profiler, base)
@@ -4,6 +4,8 @@ from typing import Optional, List
 import requests
 from bs4 import BeautifulSoup
 
+from profiling import run_cli
+
 HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
@@ -178,4 +180,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    run_cli(main, "scrape_amazon")
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Stand-in for Amazon so link checks, discovery and imports can be load-tested
+# offline. Point fetchers at it with AMAZON_BASE_URL=http://127.0.0.1:8765.
+#
+#   /dp/<ASIN>            product page (200)
+#   /s?k=<query>          search results linking to /dp/<ASIN> pages
+#   /<short-code>         amzn.to / a.co style 301 to a tagged /dp/ URL
+#   /fixture/404          404
+#   /fixture/503          503
+#   /fixture/redirect     301 -> /dp/B0FIXTURE1
+#   /fixture/slow?delay=2 200 after a delay
+#   /fixture/no-head      405 for HEAD, 200 for GET
+#
+# ASIN prefixes pick a behaviour too, so search results can mix cases:
+# B0404..., B0503..., B0SLOW..., B0OOS... (currently unavailable).
+
+DEFAULT_PORT = 8765
+DEFAULT_PADDING = 400_000
+SHORT_CODE_RE = re.compile(r"^/(?:d/)?([A-Za-z0-9]{5,9})$")
+
+
+def fixture_asin(seed: str) -> str:
+    return "B0" + hashlib.sha1(seed.encode("utf-8")).hexdigest()[:8].upper()
+
+
+def product_page(asin: str, *, padding: int, unavailable: bool = False) -> str:
+    title = f"Fixture New Zealand Gift {asin}"
+    images = [
+        {
+            "hiRes": f"https://m.media-amazon.com/images/I/{asin}{n}._SL1500_.jpg",
+            "large": f"https://m.media-amazon.com/images/I/{asin}{n}._AC_.jpg",
+            "physicalIdForMedia": f"{asin}{n}",
+        }
+        for n in range(4)
+    ]
+    bullets = "\n".join(
+        f'<li><span class="a-list-item">Fixture bullet {n} describing a Kiwi-made gift in plenty of detail.</span></li>'
+        for n in range(5)
+    )
+    availability = "Currently unavailable." if unavailable else "In Stock"
+    filler = "<!-- " + ("x" * max(padding, 0)) + " -->"
+    return f"""<!DOCTYPE html>
+<html><head><title>{title} : Amazon.com</title></head>
+<body>
+<span id="productTitle" class="a-size-large">{title}</span>
+<div id="availability"><span>{availability}</span></div>
+<script>
+var data = {{
+'colorImages': {{ 'initial': {json.dumps(images, separators=(",", ":"))} }},
+'colorToAsin': {{'initial': {{}}}},
+}};
+</script>
+<div id="feature-bullets"><ul>
+{bullets}
+</ul></div>
+</div>
+{filler}
+</body></html>
+"""
+
+
+def search_page(query: str, count: int = 8) -> str:
+    links = "\n".join(
+        f'<a class="a-link-normal" href="/Fixture-Item/dp/{fixture_asin(f"{query}:{n}")}?ref=sr_1_{n}">Result {n}</a>'
+        for n in range(count)
+    )
+    return f"<!DOCTYPE html><html><body>\n{links}\n</body></html>\n"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server_version = "AmazonFixture/1.0"
+    padding = DEFAULT_PADDING
+
+    def log_message(self, format: str, *args) -> None:
+        if getattr(self.server, "verbose", False):
+            super().log_message(format, *args)
+
+    def do_HEAD(self) -> None:
+        self.handle_request(head=True)
+
+    def do_GET(self) -> None:
+        self.handle_request(head=False)
+
+    def send_body(self, status: int, body: str, *, head: bool, content_type: str = "text/html; charset=utf-8") -> None:
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(payload)
+
+    def redirect(self, location: str) -> None:
+        self.send_response(301)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def handle_request(self, *, head: bool) -> None:
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        path = parsed.path
+
+        if path == "/fixture/404":
+            return self.send_body(404, "<html><body>Page Not Found</body></html>", head=head)
+        if path == "/fixture/503":
+            return self.send_body(503, "<html><body>Service Unavailable</body></html>", head=head)
+        if path == "/fixture/redirect":
+            return self.redirect("/dp/B0FIXTURE1?tag=nzgiftfinder-20")
+        if path == "/fixture/slow":
+            time.sleep(float(query.get("delay", ["2"])[0]))
+            return self.send_body(200, product_page("B0SLOW0000", padding=self.padding), head=head)
+        if path == "/fixture/no-head":
+            if head:
+                return self.send_body(405, "", head=True)
+            return self.send_body(200, product_page("B0NOHEAD00", padding=self.padding), head=head)
+        if path == "/s":
+            return self.send_body(200, search_page(query.get("k", [""])[0]), head=head)
+
+        asin_match = re.search(r"/(?:dp|gp/product)/([A-Z0-9]{10})", path)
+        if asin_match:
+            asin = asin_match.group(1)
+            if asin.startswith("B0404"):
+                return self.send_body(404, "<html><body>Page Not Found</body></html>", head=head)
+            if asin.startswith("B0503"):
+                return self.send_body(503, "<html><body>Service Unavailable</body></html>", head=head)
+            if asin.startswith("B0SLOW"):
+                time.sleep(2)
+            padding = int(query.get("pad", [str(self.padding)])[0])
+            page = product_page(asin, padding=padding, unavailable=asin.startswith("B0OOS"))
+            return self.send_body(200, page, head=head)
+
+        short = SHORT_CODE_RE.match(path)
+        if short:
+            return self.redirect(f"/dp/{fixture_asin(short.group(1))}?tag=nzgiftfinder-20&linkCode=ll1")
+
+        return self.send_body(404, "<html><body>Page Not Found</body></html>", head=head)
+
+
+def make_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT, *, verbose: bool = False) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve Amazon-like fixture responses for offline load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--padding", type=int, default=DEFAULT_PADDING, help="Bytes of filler after the product markup")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    FixtureHandler.padding = args.padding
+    server = make_server(args.host, args.port, verbose=args.verbose)
+    print(f"Amazon fixture server on http://{args.host}:{args.port} (AMAZON_BASE_URL=http://{args.host}:{args.port})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from profiling import run_cli
+
+# module name -> directory it is imported from (matches how each entry point runs)
+ENTRY_POINTS = {
+    "import_amazon_product": ROOT,
+    "scrape_amazon": ROOT,
+    "admin_app": ROOT,
+    "bootstrap_state": ROOT / "scripts",
+    "build_site_map": ROOT / "scripts",
+    "discover_amazon_candidates": ROOT / "scripts",
+    "validate_automation_state": ROOT / "scripts",
+    "run_copy_qa": ROOT / "scripts",
+    "check_affiliate_links": ROOT / "scripts",
+}
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> list[dict[str, Any]]:
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            rows.append(
+                {
+                    "self_us": int(match.group(1)),
+                    "cumulative_us": int(match.group(2)),
+                    "depth": (len(match.group(3)) - 1) // 2,
+                    "module": match.group(4),
+                }
+            )
+    return rows
+
+
+def measure(module: str, search_dir: Path, runs: int) -> dict[str, Any]:
+    code = f"import sys; sys.path[:0] = [{str(search_dir)!r}, {str(ROOT)!r}]; import {module}"
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "0"}
+    wall: list[float] = []
+    rows: list[dict[str, Any]] = []
+    error = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        wall.append(time.perf_counter() - started)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+            break
+        rows = parse_importtime(proc.stderr)
+
+    own_index = next((i for i in range(len(rows) - 1, -1, -1) if rows[i]["module"] == module), None)
+    own = rows[own_index] if own_index is not None else None
+    children: list[dict[str, Any]] = []
+    if own is not None:
+        # -X importtime prints children before their parent, one level deeper.
+        for row in reversed(rows[:own_index]):
+            if row["depth"] <= own["depth"]:
+                break
+            if row["depth"] == own["depth"] + 1:
+                children.append(row)
+    heaviest = sorted(children, key=lambda row: row["cumulative_us"], reverse=True)[:5]
+    return {
+        "module": module,
+        "error": error,
+        "wall_ms_median": round(statistics.median(wall) * 1000, 1),
+        "import_ms": round(own["cumulative_us"] / 1000, 1) if own else None,
+        "modules_loaded": len(rows),
+        "heaviest": [f"{row['module']} {row['cumulative_us'] / 1000:.1f}ms" for row in heaviest],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Summarise cold-start import time (-X importtime) per entry point.")
+    parser.add_argument("modules", nargs="*", help="Entry points to measure (defaults to all)")
+    parser.add_argument("--runs", type=int, default=5, help="Interpreter launches per entry point")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    names = args.modules or list(ENTRY_POINTS)
+    results = [measure(name, ENTRY_POINTS.get(name, ROOT), max(1, args.runs)) for name in names]
+    print(f"{'entry point':<28} {'wall ms':>8} {'import ms':>10} {'modules':>8}  heaviest direct imports")
+    for result in results:
+        if result["error"]:
+            print(f"{result['module']:<28} {'-':>8} {'-':>10} {'-':>8}  {result['error']}")
+            continue
+        print(
+            f"{result['module']:<28} {result['wall_ms_median']:>8} {result['import_ms']!s:>10} "
+            f"{result['modules_loaded']:>8}  {', '.join(result['heaviest'][:3])}"
+        )
+    print(json.dumps(results, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    run_cli(main, "bench_import_time")
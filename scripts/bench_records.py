@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bootstrap_state import normalize_product
+from nzgift.records import InventoryRecord, decode_all, encode
+from profiling import run_cli
+
+CATEGORIES = ("artwork", "books", "clothing", "food", "home", "jewelry", "skincare")
+
+
+def synthetic_inventory(count: int) -> list[dict[str, Any]]:
+    inventory = []
+    for index in range(count):
+        category = CATEGORIES[index % len(CATEGORIES)]
+        slug = f"sample-product-{index}"
+        product = {
+            "id": f"{category}/{slug}",
+            "slug": slug,
+            "title": f"Sample New Zealand Gift {index}",
+            "links": {
+                "amazon": f"https://www.amazon.com/dp/B{index:09d}?tag=nzgift-20",
+                "site": f"https://nzgiftfinder.com/{category}/{slug}.html",
+            },
+            "page": {"path": f"{category}/{slug}.html"},
+            "card": {"image": f"https://m.media-amazon.com/images/I/{index:011d}.jpg"},
+        }
+        inventory.append(normalize_product(product, category))
+    return inventory
+
+
+def retained_mb(build) -> tuple[Any, float]:
+    # What is still allocated once build() returns, i.e. the cost of keeping
+    # the result around rather than the transient parse peak. Timings are
+    # taken separately because tracing slows allocation several-fold.
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, round(retained / 1e6, 1)
+
+
+def timed(build) -> tuple[Any, float]:
+    started = time.perf_counter()
+    result = build()
+    return result, time.perf_counter() - started
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare dict and typed-record inventory loading at scale.")
+    parser.add_argument("--count", type=int, default=100_000, help="Synthetic inventory records")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    raw = json.dumps({"inventory": synthetic_inventory(args.count)})
+
+    payload, load_s = timed(lambda: json.loads(raw)["inventory"])
+    records, decode_s = timed(lambda: decode_all(InventoryRecord, payload, "inventory"))
+    encoded, encode_s = timed(lambda: [encode(record) for record in records])
+    if encoded != payload:
+        raise AssertionError("Encode did not round-trip the decoded layout")
+    _, dict_mb = retained_mb(lambda: json.loads(raw)["inventory"])
+    _, record_mb = retained_mb(lambda: decode_all(InventoryRecord, json.loads(raw)["inventory"], "inventory"))
+
+    print(f"{args.count} records, {len(raw) / 1e6:.1f} MB of JSON")
+    print(f"  json.loads       {load_s:7.3f}s")
+    print(f"  decode           {decode_s:7.3f}s  ({args.count / decode_s:,.0f} records/s)")
+    print(f"  encode           {encode_s:7.3f}s  ({args.count / encode_s:,.0f} records/s)")
+    print(f"  retained memory  dicts {dict_mb} MB, records {record_mb} MB ({record_mb / dict_mb:.0%})")
+    print("  round trip       identical")
+
+
+if __name__ == "__main__":
+    run_cli(main, "bench_records")
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench_records import synthetic_inventory
+from nzgift import serialize
+from nzgift.config import ROOT as SITE_ROOT
+from profiling import run_cli
+
+
+def catalog_items() -> list[dict[str, Any]]:
+    items: list[dict[str, Any]] = []
+    for path in sorted(SITE_ROOT.glob("*/products.json")):
+        items.extend(serialize.read_json(path))
+    return items
+
+
+def datasets(scale: int) -> dict[str, Any]:
+    items = catalog_items()
+    return {
+        "catalog": items * scale,
+        "product_state": {"inventory": synthetic_inventory(len(items) * scale)},
+    }
+
+
+@contextmanager
+def backend(name: str) -> Iterator[None]:
+    saved = serialize.orjson
+    if name == "json":
+        serialize.orjson = None
+    try:
+        yield
+    finally:
+        serialize.orjson = saved
+
+
+def median_ms(func: Callable[[], Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def bench(payload: Any, repeat: int, tmp_dir: Path) -> list[dict[str, Any]]:
+    rows = []
+    backends = ["json"] + (["orjson"] if serialize.orjson is not None else [])
+    for name in backends:
+        with backend(name):
+            for compact in (False, True):
+                data = serialize.dumps(payload, compact=compact)
+                rows.append(
+                    {
+                        "backend": name,
+                        "format": "compact" if compact else "pretty",
+                        "bytes": len(data),
+                        "dump_ms": median_ms(lambda: serialize.dumps(payload, compact=compact), repeat),
+                        "load_ms": median_ms(lambda: serialize.loads(data), repeat),
+                    }
+                )
+    data = serialize.dumps(payload, compact=True)
+    target = tmp_dir / "bench.json"
+    rows.append(
+        {
+            "write": "plain write_bytes",
+            "ms": median_ms(lambda: target.write_bytes(data), repeat),
+        }
+    )
+    rows.append(
+        {
+            "write": "atomic (rename only)",
+            "ms": median_ms(lambda: serialize.write_bytes_atomic(target, data, durable=False), repeat),
+        }
+    )
+    rows.append(
+        {
+            "write": "atomic + fsync",
+            "ms": median_ms(lambda: serialize.write_bytes_atomic(target, data), repeat),
+        }
+    )
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark data/ file codecs and write strategies.")
+    parser.add_argument("--scales", type=int, nargs="*", default=[1, 100], help="Catalog size multipliers")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (median is reported)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    print(f"default backend: {serialize.BACKEND}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            for name, payload in datasets(scale).items():
+                print(f"\n{name} x{scale}")
+                for row in bench(payload, max(1, args.repeat), Path(tmp)):
+                    if "write" in row:
+                        print(f"  {row['write']:<22} {row['ms']:>10.3f} ms")
+                    else:
+                        print(
+                            f"  {row['backend']:<7} {row['format']:<8} {row['bytes']:>11,} B"
+                            f"  dump {row['dump_ms']:>9.3f} ms  load {row['load_ms']:>9.3f} ms"
+                        )
+
+
+if __name__ == "__main__":
+    run_cli(main, "bench_serialize")
@@ -1,79 +1,40 @@
 from __future__ import annotations
 
-import json
-from datetime import datetime, UTC
+import sys
 from pathlib import Path
 from typing import Any
 
 ROOT = Path(__file__).resolve().parents[1]
-DATA_DIR = ROOT / "data"
-SITE_MAP_PATH = DATA_DIR / "site_map.json"
-STATE_PATH = DATA_DIR / "product_state.json"
-POST_QUEUE_PATH = DATA_DIR / "post_queue.json"
-PROPOSAL_QUEUE_PATH = DATA_DIR / "proposal_queue.json"
-RECHECK_QUEUE_PATH = DATA_DIR / "recheck_queue.json"
-RUN_LOGS_DIR = DATA_DIR / "run_logs"
-
-
-def now_iso() -> str:
-    return datetime.now(UTC).isoformat()
-
-
-def load_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from nzgift.config import (
+    POST_QUEUE_PATH,
+    PROPOSAL_PATH,
+    RECHECK_QUEUE_PATH,
+    RUN_LOGS_DIR,
+    SITE_MAP_PATH,
+    STATE_PATH,
+)
+from nzgift.lifecycle import new_inventory_record
+from nzgift.locking import file_lock
+from nzgift.records import encode
+from nzgift.state import load_json, now_iso, write_json
+from profiling import run_cli
 
 
 def normalize_product(product: dict[str, Any], category: str) -> dict[str, Any]:
-    amazon_url = product.get("links", {}).get("amazon", "")
-    site_url = product.get("links", {}).get("site", "")
-    return {
-        "id": product["id"],
-        "slug": product["slug"],
-        "title": product.get("title", ""),
-        "category": category,
-        "amazon_url": amazon_url,
-        "site_url": site_url,
-        "page_path": product.get("page", {}).get("path", ""),
-        "catalog_path": f"{category}/products.json",
-        "image": product.get("card", {}).get("image", ""),
-        "status": "live",
-        "archived": False,
-        "restored": False,
-        "last_checked": None,
-        "last_seen_in_stock": None,
-        "last_posted": None,
-        "archive_reason": None,
-        "archive_notes": None,
-        "archive_history": [],
-        "restore_history": [],
-        "post_history": [],
-        "check_history": [],
-        "dedupe": {
-            "stable_product_id": product["id"],
-            "amazon_url": amazon_url,
-            "site_url": site_url,
-            "slug": product["slug"],
-        },
-        "copy_qa": {
-            "last_checked": None,
-            "status": "unknown",
-            "notes": [],
-        },
-        "source": {
-            "import_method": "existing_repo_inventory",
-            "discovered_at": None,
-            "imported_at": None,
-        },
-        "timestamps": {
-            "created_at": now_iso(),
-            "updated_at": now_iso(),
-        },
-    }
-
-
-def write_json(path: Path, payload: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    record = new_inventory_record(
+        product_id=product["id"],
+        category=category,
+        slug=product["slug"],
+        title=product.get("title", ""),
+        amazon_url=product.get("links", {}).get("amazon", ""),
+        site_url=product.get("links", {}).get("site", ""),
+        page_path=product.get("page", {}).get("path", ""),
+        image=product.get("card", {}).get("image", ""),
+    )
+    return encode(record)
 
 
 def main() -> None:
@@ -147,12 +108,15 @@ def main() -> None:
     }
 
     RUN_LOGS_DIR.mkdir(parents=True, exist_ok=True)
-    write_json(STATE_PATH, state)
-    write_json(POST_QUEUE_PATH, post_queue)
-    write_json(PROPOSAL_QUEUE_PATH, proposal_queue)
-    write_json(RECHECK_QUEUE_PATH, recheck_queue)
+    # Bootstrap replaces all four files; holding their locks together keeps a
+    # concurrent job from seeing (or writing into) a half-reset set.
+    with file_lock(STATE_PATH, POST_QUEUE_PATH, PROPOSAL_PATH, RECHECK_QUEUE_PATH):
+        write_json(STATE_PATH, state)
+        write_json(POST_QUEUE_PATH, post_queue)
+        write_json(PROPOSAL_PATH, proposal_queue)
+        write_json(RECHECK_QUEUE_PATH, recheck_queue)
     print(f"Wrote {STATE_PATH.relative_to(ROOT)} with {len(inventory)} inventory records.")
 
 
 if __name__ == "__main__":
-    main()
+    run_cli(main, "bootstrap_state")
@@ -1,19 +1,26 @@
 from __future__ import annotations
 
-import json
 import re
+import sys
 from datetime import datetime, UTC
 from pathlib import Path
 from typing import Any
 
 ROOT = Path(__file__).resolve().parents[1]
-DATA_DIR = ROOT / "data"
-OUTPUT_PATH = DATA_DIR / "site_map.json"
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from amazon_extract import AMAZON_HOSTS
+from nzgift.config import DATA_DIR, SITE_MAP_PATH as OUTPUT_PATH
+from nzgift.state import load_json, write_json
+from profiling import run_cli
+
 CATEGORY_DIRS = [
     path.parent for path in sorted(ROOT.glob("*/products.json")) if path.parent.name != "data"
 ]
 STATIC_PAGES = ["about", "contact", "privacy", "terms"]
-AMAZON_LINK_RE = re.compile(r'href="(https?://[^\"]+)"', re.I)
+# Anchors only: <link> preconnect/preload hints to the image CDN are not outbound links.
+AMAZON_LINK_RE = re.compile(r'<a\s[^>]*?\bhref="(https?://[^"]+)"', re.I)
 META_DESC_RE = re.compile(
     r'<meta\s+name="description"\s+content="([^"]*)"\s*/?>', re.I | re.S
 )
@@ -30,10 +37,6 @@ def rel(path: Path) -> str:
     return path.relative_to(ROOT).as_posix()
 
 
-def load_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
-
-
 def extract_title(html: str) -> str:
     match = TITLE_RE.search(html)
     return clean(match.group(1)) if match else ""
@@ -50,7 +53,7 @@ def extract_meta_description(html: str) -> str:
 
 
 def extract_amazon_links(html: str) -> list[str]:
-    matches = [url for url in AMAZON_LINK_RE.findall(html) if "amazon." in url or "amzn.to" in url]
+    matches = [url for url in AMAZON_LINK_RE.findall(html) if any(host in url for host in AMAZON_HOSTS)]
     seen: list[str] = []
     for url in matches:
         if url not in seen:
@@ -133,14 +136,11 @@ def build_static_page(path: Path) -> dict[str, Any]:
     }
 
 
-def main() -> None:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+def build_payload(categories: list[dict[str, Any]]) -> dict[str, Any]:
     root_index = ROOT / "index.html"
     root_html = root_index.read_text(encoding="utf-8")
-    categories = [build_category(path) for path in CATEGORY_DIRS]
     total_products = sum(len(category["products"]) for category in categories)
-
-    payload = {
+    return {
         "generated_at": datetime.now(UTC).isoformat(),
         "source": "scripts/build_site_map.py",
         "site": {
@@ -167,9 +167,27 @@ def main() -> None:
         },
     }
 
-    OUTPUT_PATH.write_text(json.dumps(payload, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
-    print(f"Wrote {OUTPUT_PATH.relative_to(ROOT)} with {total_products} mapped products.")
 
+def patch_site_map(category_slugs: set[str] | None = None) -> dict[str, Any]:
+    # Rebuild only the named categories and reuse the rest from the current map.
+    existing: dict[str, dict[str, Any]] = {}
+    if category_slugs is not None and OUTPUT_PATH.exists():
+        for category in load_json(OUTPUT_PATH)["site"]["structure"]["categories"]:
+            existing[category["slug"]] = category
+    categories = [
+        existing[path.name] if path.name in existing and path.name not in category_slugs else build_category(path)
+        for path in CATEGORY_DIRS
+    ]
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    payload = build_payload(categories)
+    write_json(OUTPUT_PATH, payload)
+    return payload
+
+
+def main() -> None:
+    payload = patch_site_map()
+    total_products = payload["summary"]["product_count"]
+    print(f"Wrote {OUTPUT_PATH.relative_to(ROOT)} with {total_products} mapped products.")
 
 if __name__ == "__main__":
-    main()
+    run_cli(main, "build_site_map")
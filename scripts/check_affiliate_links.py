@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from build_site_map import extract_amazon_links, rel
+from nzgift import http
+from nzgift.config import DATA_DIR
+from nzgift.state import load_json, now_iso, update_json
+from profiling import run_cli
+
+CACHE_PATH = DATA_DIR / "link_health.json"
+PAGE_GLOBS = ["index.html", "*/index.html", "*/*.html"]
+SKIP_DIRS = {"templates", "admin_templates", "data", "venv", ".venv"}
+OK_TTL = timedelta(hours=24)
+FAILED_TTL = timedelta(hours=1)
+HEAD_FALLBACK_STATUSES = {403, 405, 501}
+
+
+def collect_links() -> dict[str, list[str]]:
+    pages_by_link: dict[str, list[str]] = {}
+    for pattern in PAGE_GLOBS:
+        for path in sorted(ROOT.glob(pattern)):
+            if path.parts[len(ROOT.parts)] in SKIP_DIRS:
+                continue
+            for url in extract_amazon_links(path.read_text(encoding="utf-8")):
+                pages_by_link.setdefault(url, []).append(rel(path))
+    return pages_by_link
+
+
+def is_fresh(entry: dict[str, Any] | None, now: datetime) -> bool:
+    if not entry or not entry.get("checked_at"):
+        return False
+    ttl = OK_TTL if entry.get("ok") else FAILED_TTL
+    return now - datetime.fromisoformat(entry["checked_at"]) < ttl
+
+
+class HostLimiter:
+    def __init__(self, per_host: int) -> None:
+        self.per_host = per_host
+        self.lock = threading.Lock()
+        self.semaphores: dict[str, threading.Semaphore] = {}
+
+    def for_url(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.Semaphore(self.per_host)
+            return self.semaphores[host]
+
+
+def check_link(url: str, limiter: HostLimiter, timeout: float) -> dict[str, Any]:
+    started = time.perf_counter()
+    method = "HEAD"
+    try:
+        # Every hop takes its own host's slot: short links redirect from
+        # amzn.to or a.co to amazon.com, which is the host that rate-limits.
+        response, hops = http.follow(method, url, guard=limiter.for_url, timeout=timeout)
+        if response.status_code in HEAD_FALLBACK_STATUSES:
+            method = "GET"
+            response, hops = http.follow(method, url, guard=limiter.for_url, timeout=timeout)
+    except requests.RequestException as exc:
+        return {
+            "ok": False,
+            "status": None,
+            "method": method,
+            "final_url": None,
+            "redirects": 0,
+            "tag_preserved": None,
+            "error": f"{type(exc).__name__}: {exc}",
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "checked_at": now_iso(),
+        }
+
+    original_tag = parse_qs(urlparse(url).query).get("tag")
+    final_tag = parse_qs(urlparse(response.url).query).get("tag")
+    return {
+        "ok": 200 <= response.status_code < 300,
+        "status": response.status_code,
+        "method": method,
+        "final_url": response.url,
+        "redirects": len(hops),
+        "tag_preserved": bool(final_tag) and (not original_tag or final_tag == original_tag),
+        "error": None,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "checked_at": now_iso(),
+    }
+
+
+def run_link_check(*, workers: int, per_host: int, timeout: float, force: bool) -> dict[str, Any]:
+    pages_by_link = collect_links()
+    cache = load_json(CACHE_PATH) if CACHE_PATH.exists() else {"links": {}}
+    cached = cache.get("links", {})
+    now = datetime.now(UTC)
+    pending = [url for url in pages_by_link if force or not is_fresh(cached.get(url), now)]
+
+    limiter = HostLimiter(per_host)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(pending, pool.map(lambda link: check_link(link, limiter, timeout), pending)))
+
+    def merge(current: dict[str, Any]) -> None:
+        # Another check may have refreshed links while this one ran; both keep theirs.
+        links = current.setdefault("links", {})
+        links.update(results)
+        for url, pages in pages_by_link.items():
+            links[url] = {**links.get(url, cached.get(url, {})), "pages": pages}
+        current["generated_at"] = now_iso()
+
+    checked = update_json(CACHE_PATH, merge, default=lambda: {"links": {}}, compact=True)["links"]
+
+    broken = {url: checked[url] for url in pages_by_link if not checked[url]["ok"]}
+    return {
+        "links": len(pages_by_link),
+        "checked": len(pending),
+        "cached": len(pages_by_link) - len(pending),
+        "broken": len(broken),
+        "elapsed_s": round(time.perf_counter() - started, 2),
+        "broken_links": {
+            url: {"status": entry["status"], "error": entry["error"], "pages": entry["pages"]}
+            for url, entry in broken.items()
+        },
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check every Amazon affiliate link on the site.")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent requests across all hosts")
+    parser.add_argument("--per-host", type=int, default=4, help="Concurrent requests per host")
+    parser.add_argument("--timeout", type=float, default=15.0, help="Per-request timeout in seconds")
+    parser.add_argument("--force", action="store_true", help="Ignore cached results and recheck everything")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    result = run_link_check(workers=args.workers, per_host=args.per_host, timeout=args.timeout, force=args.force)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    run_cli(main, "check_affiliate_links")
@@ -3,22 +3,39 @@ from __future__ import annotations
 import argparse
 import json
 import re
-from datetime import UTC, datetime
 from pathlib import Path
 from typing import Any
 from urllib.parse import quote_plus, urljoin, urlparse
 
-import requests
 import sys
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from product_pipeline import ALLOWED_CATEGORIES, HEADERS, clean_text, extract_dynamic_images, extract_title, guess_category
-DATA_DIR = ROOT / "data"
-STATE_PATH = DATA_DIR / "product_state.json"
-PROPOSAL_PATH = DATA_DIR / "proposal_queue.json"
+from amazon_extract import (
+    ALLOWED_CATEGORIES,
+    AVAILABILITY_MARKER,
+    LIST_ITEM_RE,
+    PRODUCT_MARKERS,
+    PageWatch,
+    canonical_amazon_url,
+    clean_text,
+    extract_asin,
+    extract_dynamic_images,
+    extract_page,
+    extract_title,
+    guess_category,
+)
+from nzgift import http
+from nzgift.config import PROPOSAL_PATH, STATE_PATH
+from nzgift.lifecycle import bump_stats, ensure_stats
+from nzgift.records import ProposalDedupe, ProposalRecord, ProposalSource, ProposalTimestamps, encode
+from nzgift.state import load_json, now_iso, update_json
+from profiling import run_cli
+from similarity_index import SimilarityIndex, load_index, product_text, sync_index, update_index
+from tracing import span, traced, write_run_log
+
 DEFAULT_QUERIES = [
     "new zealand gift",
     "kiwi gift",
@@ -31,47 +48,11 @@ SEARCH_URL_TEMPLATE = "https://www.amazon.com/s?k={query}"
 MAX_RESULTS_PER_QUERY = 8
 
 
-def now_iso() -> str:
-    return datetime.now(UTC).isoformat()
-
-
-def load_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
-
-
-def write_json(path: Path, payload: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
-
-
-_ASIN_PATTERNS = [
-    re.compile(r"/dp/([A-Z0-9]{10})(?:[/?]|$)", re.I),
-    re.compile(r"/gp/product/([A-Z0-9]{10})(?:[/?]|$)", re.I),
-]
-
-
-def extract_asin(url: str) -> str | None:
-    for pattern in _ASIN_PATTERNS:
-        match = pattern.search(url)
-        if match:
-            return match.group(1).upper()
-    return None
-
-
-def canonical_amazon_url(url: str) -> str:
-    asin = extract_asin(url)
-    if asin:
-        return f"https://www.amazon.com/dp/{asin}"
-    return url.split("?", 1)[0]
-
-
 def load_product_state() -> dict[str, Any]:
     return load_json(STATE_PATH)
 
 
-def load_or_create_proposals() -> dict[str, Any]:
-    if PROPOSAL_PATH.exists():
-        return load_json(PROPOSAL_PATH)
+def new_proposal_queue() -> dict[str, Any]:
     return {
         "generated_at": now_iso(),
         "schema_version": 1,
@@ -88,6 +69,27 @@ def load_or_create_proposals() -> dict[str, Any]:
     }
 
 
+def load_or_create_proposals() -> dict[str, Any]:
+    if PROPOSAL_PATH.exists():
+        return load_json(PROPOSAL_PATH)
+    return new_proposal_queue()
+
+
+def merge_discovery(queue: dict[str, Any], new_items: list[dict[str, Any]], run_record: dict[str, Any]) -> None:
+    # Applied to the queue as it is on disk at write time, so proposals that
+    # were reviewed or discovered by another run meanwhile are kept.
+    stats = ensure_stats(queue, "proposal")
+    items = queue.setdefault("items", [])
+    known = {item.get("id") for item in items}
+    for item in new_items:
+        if item["id"] not in known:
+            items.append(item)
+            bump_stats(stats, None, item["proposal_status"])
+    queue.setdefault("search_queries", run_record["queries"])
+    queue["run_history"] = [*queue.get("run_history", []), run_record][-20:]
+    queue["generated_at"] = now_iso()
+
+
 def existing_inventory_keys(state: dict[str, Any]) -> set[str]:
     keys: set[str] = set()
     for item in state.get("inventory", []):
@@ -112,11 +114,14 @@ def proposal_keys(queue: dict[str, Any]) -> set[str]:
 
 def fetch_search_html(query: str) -> str:
     url = SEARCH_URL_TEMPLATE.format(query=quote_plus(query))
-    response = requests.get(url, headers=HEADERS, timeout=30)
-    response.raise_for_status()
-    return response.text
+    with span("fetch_search_html", "network", query=query) as attrs:
+        response = http.get(url)
+        response.raise_for_status()
+        attrs["bytes"] = len(response.content)
+        return response.text
 
 
+@traced("parse")
 def extract_search_result_urls(raw_html: str) -> list[str]:
     hrefs = re.findall(r'href="([^"]+)"', raw_html)
     product_urls: list[str] = []
@@ -139,15 +144,15 @@ def extract_search_result_urls(raw_html: str) -> list[str]:
 
 
 def fetch_product_summary(url: str) -> dict[str, Any]:
-    response = requests.get(url, headers=HEADERS, timeout=30)
-    response.raise_for_status()
-    raw_html = response.text
-    title = extract_title(raw_html)
-    title = clean_text(title)
-    images = extract_dynamic_images(raw_html)
-    bullets = extract_bullets_from_html(raw_html)
+    with span("fetch_product_summary", "network", url=url) as attrs:
+        raw_html, transfer = http.fetch_until(url, PageWatch(SUMMARY_MARKERS))
+        attrs.update(bytes=transfer["bytes_read"], bytes_saved=transfer["bytes_saved"], stopped=transfer["stopped"])
+    fields, extraction = extract_page(raw_html, SUMMARY_FIELDS)
+    title = clean_text(fields["title"])
+    images = fields["images"]
+    bullets = fields["bullets"]
     category = guess_category(title, bullets)
-    unavailable_text = detect_unavailable_text(raw_html)
+    unavailable_text = fields["unavailable"]
     return {
         "title": title,
         "image": images[0] if images else "",
@@ -157,11 +162,14 @@ def fetch_product_summary(url: str) -> dict[str, Any]:
             "notes": unavailable_text,
         },
         "bullets": bullets[:3],
+        "extraction": extraction,
+        "transfer": transfer,
     }
 
 
+@traced("parse")
 def extract_bullets_from_html(raw_html: str) -> list[str]:
-    bullets = re.findall(r'<span class="a-list-item">(.*?)</span>', raw_html, re.S)
+    bullets = LIST_ITEM_RE.findall(raw_html)
     cleaned: list[str] = []
     for bullet in bullets:
         text = clean_text(bullet)
@@ -172,6 +180,7 @@ def extract_bullets_from_html(raw_html: str) -> list[str]:
     return cleaned[:5]
 
 
+@traced("parse")
 def detect_unavailable_text(raw_html: str) -> str | None:
     phrases = [
         "currently unavailable",
@@ -186,65 +195,65 @@ def detect_unavailable_text(raw_html: str) -> str | None:
     return None
 
 
-def build_candidate(query: str, url: str, summary: dict[str, Any]) -> dict[str, Any]:
+SUMMARY_FIELDS = {
+    "title": (extract_title, "NZ Gift"),
+    "images": (extract_dynamic_images, []),
+    "bullets": (extract_bullets_from_html, []),
+    "unavailable": (detect_unavailable_text, None),
+}
+SUMMARY_MARKERS = {**PRODUCT_MARKERS, "availability": AVAILABILITY_MARKER}
+
+
+@traced("dedupe")
+def build_candidate(
+    query: str,
+    url: str,
+    summary: dict[str, Any],
+    index: SimilarityIndex | None = None,
+) -> dict[str, Any]:
     asin = extract_asin(url)
     discovered_at = now_iso()
     proposal_status = "archived" if summary["availability"]["status"] == "out_of_stock" else "pending"
-    return {
-        "id": f"proposal/{asin or re.sub(r'[^a-z0-9]+', '-', url.lower()).strip('-')}",
-        "asin": asin,
-        "amazon_url": url,
-        "canonical_url": canonical_amazon_url(url),
-        "title": summary.get("title", ""),
-        "category_guess": summary.get("category_guess", "artwork"),
-        "image": summary.get("image", ""),
-        "bullets": summary.get("bullets", []),
-        "proposal_status": proposal_status,
-        "inventory_status": summary.get("availability", {}).get("status", "unknown"),
-        "search_query": query,
-        "review_notes": summary.get("availability", {}).get("notes"),
-        "review_history": [
+    proposal_id = f"proposal/{asin or re.sub(r'[^a-z0-9]+', '-', url.lower()).strip('-')}"
+    text = product_text(summary.get("title", ""))
+    possible_duplicates = index.query(text, exclude=[proposal_id]) if index is not None else []
+    if index is not None:
+        index.add(proposal_id, text, title=summary.get("title", ""), kind="proposal")
+    availability = summary.get("availability", {})
+    record = ProposalRecord(
+        id=proposal_id,
+        asin=asin,
+        amazon_url=url,
+        canonical_url=canonical_amazon_url(url),
+        title=summary.get("title", ""),
+        category_guess=summary.get("category_guess", "artwork"),
+        image=summary.get("image", ""),
+        bullets=summary.get("bullets", []),
+        proposal_status=proposal_status,
+        inventory_status=availability.get("status", "unknown"),
+        search_query=query,
+        review_notes=availability.get("notes"),
+        review_history=[
             {
                 "timestamp": discovered_at,
                 "status": proposal_status,
-                "reason": summary.get("availability", {}).get("notes") or "newly_discovered",
+                "reason": availability.get("notes") or "newly_discovered",
             }
         ],
-        "source": {
-            "type": "amazon_search",
-            "discovered_at": discovered_at,
-            "last_seen_at": discovered_at,
-        },
-        "timestamps": {
-            "created_at": discovered_at,
-            "updated_at": discovered_at,
-            "proposed_at": discovered_at,
-            "approved_at": None,
-            "rejected_at": None,
-            "archived_at": discovered_at if proposal_status == "archived" else None,
-            "imported_at": None,
-        },
-        "dedupe": {
-            "canonical_url": canonical_amazon_url(url),
-            "asin": asin,
-        },
-    }
-
-
-def refresh_stats(queue: dict[str, Any]) -> None:
-    counts = {
-        "pending": 0,
-        "approved": 0,
-        "rejected": 0,
-        "archived": 0,
-        "imported": 0,
-    }
-    for item in queue.get("items", []):
-        status = item.get("proposal_status")
-        if status in counts:
-            counts[status] += 1
-    queue["stats"] = counts
-    queue["generated_at"] = now_iso()
+        source=ProposalSource(discovered_at=discovered_at, last_seen_at=discovered_at),
+        timestamps=ProposalTimestamps(
+            created_at=discovered_at,
+            updated_at=discovered_at,
+            proposed_at=discovered_at,
+            archived_at=discovered_at if proposal_status == "archived" else None,
+        ),
+        dedupe=ProposalDedupe(
+            canonical_url=canonical_amazon_url(url),
+            asin=asin,
+            possible_duplicates=possible_duplicates,
+        ),
+    )
+    return encode(record)
 
 
 def run_discovery(queries: list[str], limit: int) -> dict[str, Any]:
@@ -252,6 +261,8 @@ def run_discovery(queries: list[str], limit: int) -> dict[str, Any]:
     queue = load_or_create_proposals()
     inventory_seen = existing_inventory_keys(state)
     proposal_seen = proposal_keys(queue)
+    index = load_index()
+    sync_index(index, state, queue)
     new_items: list[dict[str, Any]] = []
     run_record: dict[str, Any] = {
         "timestamp": now_iso(),
@@ -259,6 +270,9 @@ def run_discovery(queries: list[str], limit: int) -> dict[str, Any]:
         "new_items": 0,
         "skipped_existing_inventory": 0,
         "skipped_existing_proposals": 0,
+        "flagged_possible_duplicates": 0,
+        "extraction_budget_trips": [],
+        "transfer": {"pages": 0, "bytes_read": 0, "bytes_saved": 0, "stopped_early": 0},
         "errors": [],
     }
 
@@ -289,19 +303,30 @@ def run_discovery(queries: list[str], limit: int) -> dict[str, Any]:
                 run_record["errors"].append({"query": query, "stage": "product", "url": canonical, "error": str(exc)})
                 continue
 
-            item = build_candidate(query, canonical, summary)
-            queue.setdefault("items", []).append(item)
+            transfer = run_record["transfer"]
+            transfer["pages"] += 1
+            transfer["bytes_read"] += summary["transfer"]["bytes_read"]
+            transfer["bytes_saved"] += summary["transfer"]["bytes_saved"] or 0
+            transfer["stopped_early"] += summary["transfer"]["stopped"] == "complete"
+            if summary["extraction"]["tripped"]:
+                run_record["extraction_budget_trips"].append({"url": canonical, **summary["extraction"]})
+            item = build_candidate(query, canonical, summary, index)
+            if item["dedupe"]["possible_duplicates"]:
+                run_record["flagged_possible_duplicates"] += 1
             proposal_seen.add(canonical)
             if asin:
                 proposal_seen.add(f"asin:{asin}")
             new_items.append(item)
 
     run_record["new_items"] = len(new_items)
-    queue.setdefault("search_queries", queries)
-    queue.setdefault("run_history", []).append(run_record)
-    queue["run_history"] = queue["run_history"][-20:]
-    refresh_stats(queue)
-    write_json(PROPOSAL_PATH, queue)
+    update_json(
+        PROPOSAL_PATH,
+        lambda current: merge_discovery(current, new_items, run_record),
+        default=new_proposal_queue,
+    )
+    # The in-memory index only served this run's queries; the saved one is
+    # brought up to date against the files as they are now.
+    update_index(lambda current: sync_index(current, load_product_state(), load_json(PROPOSAL_PATH)))
     return {"new_items": new_items, "run_record": run_record, "proposal_path": str(PROPOSAL_PATH)}
 
 
@@ -309,15 +334,20 @@ def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Discover Amazon candidates for NZ Gift Finder proposal review.")
     parser.add_argument("queries", nargs="*", help="Optional search queries to override the defaults")
     parser.add_argument("--limit", type=int, default=6, help="Maximum new proposals to add in one run")
+    parser.add_argument("--trace-chrome", action="store_true", help="Also write a Chrome trace file to data/run_logs")
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
     queries = args.queries or DEFAULT_QUERIES
-    result = run_discovery(queries, max(1, args.limit))
+    try:
+        result = run_discovery(queries, max(1, args.limit))
+    finally:
+        trace_paths = write_run_log("discovery", chrome=args.trace_chrome)
+    result["trace"] = trace_paths
     print(json.dumps(result, indent=2, ensure_ascii=False))
 
 
 if __name__ == "__main__":
-    main()
+    run_cli(main, "discover_amazon_candidates")
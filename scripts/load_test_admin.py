@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from profiling import run_cli
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def one_request(base_url: str, import_url: str | None, timeout: float) -> tuple[float, int | None]:
+    started = time.perf_counter()
+    if import_url:
+        body = urlencode({"import_url": import_url, "import_category": "food"}).encode("utf-8")
+        request = Request(base_url, data=body, method="POST")
+    else:
+        request = Request(base_url)
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except URLError:
+        status = None
+    return time.perf_counter() - started, status
+
+
+def run_load_test(base_url: str, *, concurrency: int, requests: int, import_url: str | None, timeout: float) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: one_request(base_url, import_url, timeout), range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status != 200)
+    return {
+        "url": base_url,
+        "mode": "import" if import_url else "form",
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure concurrent operator throughput against the admin app.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--import-url",
+        help="POST this product URL as an import on every request (pair with AMAZON_BASE_URL and the fixture server)",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    result = run_load_test(
+        args.url,
+        concurrency=args.concurrency,
+        requests=args.requests,
+        import_url=args.import_url,
+        timeout=args.timeout,
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    run_cli(main, "load_test_admin")
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from amazon_extract import AMAZON_HOSTS
+from nzgift.config import STATE_PATH
+from nzgift.state import load_json, now_iso, update_json
+from product_pipeline import REQUIRED_SNIPPETS
+from profiling import run_cli
+
+
+SEARCH_PHRASES = [
+    "new zealand gift",
+    "kiwi gift",
+    "gifts from nz",
+    "new zealand food gift",
+    "new zealand book",
+    "new zealand skincare gift",
+    "new zealand jewelry gift",
+    "new zealand clothing gift",
+    "new zealand artwork gift",
+    "gift ideas",
+]
+MAX_PHRASE_REPEATS = 8
+MAX_PHRASE_DENSITY = 0.04
+CTA_RE = re.compile(r'<a\s[^>]*class="cta"[^>]*>', re.I)
+HREF_RE = re.compile(r'href="([^"]+)"', re.I)
+MAIN_IMAGE_RE = re.compile(r'id="mainProductImage"[^>]*?src="([^"]*)"|src="([^"]*)"[^>]*?id="mainProductImage"', re.S)
+SCRIPT_STYLE_RE = re.compile(r"<(script|style)\b.*?</\1>", re.I | re.S)
+TAG_RE = re.compile(r"<[^>]+>")
+# Titles of other products, not this page's copy.
+RELATED_RE = re.compile(r'<section class="related-gifts">.*?</section>', re.S)
+
+
+def visible_text(html: str) -> str:
+    return re.sub(r"\s+", " ", TAG_RE.sub(" ", SCRIPT_STYLE_RE.sub(" ", html))).strip().lower()
+
+
+def lint_page(html: str, slug: str = "") -> list[str]:
+    notes: list[str] = []
+    missing = [snippet for snippet in REQUIRED_SNIPPETS if snippet not in html]
+    if missing:
+        notes.append(f"missing_required_content: {missing}")
+
+    ctas = list(CTA_RE.finditer(html))
+    amazon_links = []
+    for cta in ctas:
+        href = HREF_RE.search(cta.group(0))
+        if href and any(host in href.group(1) for host in AMAZON_HOSTS):
+            amazon_links.append(href.group(1))
+    if len(amazon_links) < 2:
+        notes.append(f"expected_two_amazon_ctas: found {len(amazon_links)}")
+    elif len(set(amazon_links)) > 1:
+        notes.append("amazon_cta_urls_differ")
+
+    story_at = html.find("story-section")
+    if story_at == -1:
+        notes.append("missing_story_section")
+    elif ctas and story_at < ctas[0].start():
+        notes.append("story_section_before_first_cta")
+    elif len(ctas) >= 2 and ctas[-1].start() < story_at:
+        notes.append("second_cta_not_after_story")
+
+    text = visible_text(RELATED_RE.sub("", html))
+    if "affiliate link" not in text:
+        notes.append("missing_affiliate_disclaimer")
+
+    image = MAIN_IMAGE_RE.search(html)
+    image_src = (image.group(1) or image.group(2)) if image else ""
+    if image and "media-amazon.com" not in image_src:
+        notes.append(f"main_image_not_from_amazon: {image_src}")
+
+    if "swanndri" not in slug and "Swanndri" in html:
+        notes.append("template_text_leak: Swanndri")
+
+    word_count = max(len(text.split()), 1)
+    for phrase in SEARCH_PHRASES:
+        repeats = text.count(phrase)
+        density = repeats * len(phrase.split()) / word_count
+        if repeats > MAX_PHRASE_REPEATS or density > MAX_PHRASE_DENSITY:
+            notes.append(f"keyword_stuffing: '{phrase}' x{repeats}")
+    return notes
+
+
+def check_record(task: tuple[str, str, str | None]) -> dict[str, Any]:
+    product_id, page_path, previous_hash = task
+    path = ROOT / page_path
+    if not page_path or not path.exists():
+        return {"id": product_id, "status": "fail", "notes": [f"missing_page: {page_path}"], "content_hash": None}
+    raw = path.read_bytes()
+    content_hash = hashlib.sha256(raw).hexdigest()
+    if content_hash == previous_hash:
+        return {"id": product_id, "skipped": True}
+    notes = lint_page(raw.decode("utf-8"), slug=path.stem)
+    return {
+        "id": product_id,
+        "status": "fail" if notes else "pass",
+        "notes": notes,
+        "content_hash": content_hash,
+    }
+
+
+def run_copy_qa(
+    state: dict[str, Any], *, workers: int | None = None, force: bool = False
+) -> tuple[dict[str, Any], dict[str, dict[str, Any]]]:
+    # Returns the summary and the new copy_qa block per product id; state is
+    # only read, so the results can be applied to whatever is on disk later.
+    by_id = {item["id"]: item for item in state.get("inventory", [])}
+    updates: dict[str, dict[str, Any]] = {}
+    tasks = [
+        (
+            item["id"],
+            item.get("page_path", ""),
+            None if force else item.get("copy_qa", {}).get("content_hash"),
+        )
+        for item in by_id.values()
+    ]
+    summary = {"checked": 0, "skipped": 0, "passed": 0, "failed": 0, "failures": {}}
+    if not tasks:
+        return summary, updates
+
+    checked_at = now_iso()
+    chunksize = max(1, len(tasks) // ((workers or 4) * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(check_record, tasks, chunksize=chunksize):
+            if result.get("skipped"):
+                summary["skipped"] += 1
+                continue
+            summary["checked"] += 1
+            summary["passed" if result["status"] == "pass" else "failed"] += 1
+            if result["notes"]:
+                summary["failures"][result["id"]] = result["notes"]
+            updates[result["id"]] = {
+                "last_checked": checked_at,
+                "status": result["status"],
+                "notes": result["notes"],
+                "content_hash": result["content_hash"],
+            }
+    return summary, updates
+
+
+def apply_copy_qa(state: dict[str, Any], updates: dict[str, dict[str, Any]]) -> None:
+    for item in state.get("inventory", []):
+        if item["id"] in updates:
+            item["copy_qa"] = updates[item["id"]]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Lint product page copy and record results in product_state.json.")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (defaults to CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-check pages even if their content hash is unchanged")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    summary, updates = run_copy_qa(load_json(STATE_PATH), workers=args.workers, force=args.force)
+    if updates:
+        update_json(STATE_PATH, lambda state: apply_copy_qa(state, updates))
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    run_cli(main, "run_copy_qa")
@@ -1,142 +1,338 @@
 from __future__ import annotations
 
+import argparse
 import copy
 import json
+import os
+import sys
+import time
+from collections import deque
+from itertools import chain, islice
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
 
 ROOT = Path(__file__).resolve().parents[1]
-DATA_DIR = ROOT / "data"
-STATE_PATH = DATA_DIR / "product_state.json"
-PROPOSAL_PATH = DATA_DIR / "proposal_queue.json"
-REQUIRED_FIELDS = {
-    "id",
-    "slug",
-    "title",
-    "category",
-    "amazon_url",
-    "site_url",
-    "page_path",
-    "status",
-    "archived",
-    "restored",
-    "last_checked",
-    "last_seen_in_stock",
-    "last_posted",
-    "archive_reason",
-    "dedupe",
-    "timestamps",
-}
-VALID_STATUSES = {"live", "archived", "restored"}
-VALID_PROPOSAL_STATUSES = {"pending", "approved", "rejected", "archived", "imported"}
-
-
-def load_state() -> dict:
-    return json.loads(STATE_PATH.read_text(encoding="utf-8"))
-
-
-def load_proposals() -> dict:
-    return json.loads(PROPOSAL_PATH.read_text(encoding="utf-8"))
-
-
-def validate_inventory(state: dict) -> None:
-    inventory = state.get("inventory")
-    if not isinstance(inventory, list) or not inventory:
-        raise AssertionError("Inventory must be a non-empty list")
-
-    seen_ids: set[str] = set()
-    seen_amazon_keys: set[tuple[str, str]] = set()
-    for entry in inventory:
-        missing = REQUIRED_FIELDS - set(entry.keys())
-        if missing:
-            raise AssertionError(f"Missing required fields for {entry.get('id')}: {sorted(missing)}")
-        if entry["status"] not in VALID_STATUSES:
-            raise AssertionError(f"Invalid status for {entry['id']}: {entry['status']}")
-        if entry["id"] in seen_ids:
-            raise AssertionError(f"Duplicate id: {entry['id']}")
-        seen_ids.add(entry["id"])
-        dedupe_key = entry["dedupe"].get("stable_product_id")
-        if dedupe_key != entry["id"]:
-            raise AssertionError(f"Dedupe mismatch for {entry['id']}")
-        amazon_url = entry.get("amazon_url")
-        if amazon_url:
-            amazon_pair = (entry["category"], amazon_url)
-            if amazon_pair in seen_amazon_keys:
-                raise AssertionError(f"Duplicate Amazon URL in category inventory: {amazon_pair}")
-            seen_amazon_keys.add(amazon_pair)
-
-
-def validate_proposals(proposals: dict) -> None:
-    items = proposals.get("items")
-    if not isinstance(items, list):
-        raise AssertionError("Proposal items must be a list")
-
-    seen_urls: set[str] = set()
-    seen_asins: set[str] = set()
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from amazon_extract import extract_asin
+from nzgift.config import PROPOSAL_PATH, SITE_MAP_PATH, STATE_PATH
+from nzgift.lifecycle import TransitionError, apply_inventory, apply_proposal
+from nzgift.records import InventoryRecord, ProposalRecord, RecordError, decode, encode
+from nzgift.serialize import iter_array
+from nzgift.state import load_json
+from profiling import run_cli
+
+CHUNK_SIZE = 500
+# Below this much input (state plus proposals) starting a process pool costs
+# more than it saves, so a run without --workers checks records in-process.
+PARALLEL_MIN_BYTES = 4_000_000
+MAX_PRINTED = 50
+OPEN_PROPOSAL_STATUSES = {"pending", "approved"}
+
+# (path, problem), e.g. ("inventory[3].dedupe.stable_product_id", "does not match id ...")
+Violation = tuple[str, str]
+# What the parent needs from each record for the cross-record and cross-file
+# checks, so workers never ship whole records back.
+InventoryKey = tuple[str, str, str, str, str, str, str]
+ProposalKey = tuple[str, str, str, str | None, str]
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[tuple[int, list[Any]]]:
+    iterator = iter(items)
+    start = 0
+    while chunk := list(islice(iterator, size)):
+        yield start, chunk
+        start += len(chunk)
+
+
+def bounded_map(pool: Executor | None, func: Callable[[Any], Any], items: Iterable[Any], window: int) -> Iterator[Any]:
+    # Executor.map submits everything up front, which would pull the whole file
+    # into memory; keep only `window` chunks in flight and yield in order.
+    if pool is None:
+        yield from map(func, items)
+        return
+    pending: deque = deque()
     for item in items:
-        required = {"id", "amazon_url", "canonical_url", "proposal_status", "timestamps", "dedupe"}
-        missing = required - set(item.keys())
-        if missing:
-            raise AssertionError(f"Missing proposal fields for {item.get('id')}: {sorted(missing)}")
-        status = item["proposal_status"]
-        if status not in VALID_PROPOSAL_STATUSES:
-            raise AssertionError(f"Invalid proposal status for {item['id']}: {status}")
-        canonical_url = item["canonical_url"]
-        if canonical_url in seen_urls:
-            raise AssertionError(f"Duplicate proposal canonical url: {canonical_url}")
-        seen_urls.add(canonical_url)
-        asin = item.get("asin")
-        if asin:
-            if asin in seen_asins:
-                raise AssertionError(f"Duplicate proposal ASIN: {asin}")
-            seen_asins.add(asin)
-
-
-def simulate_lifecycle(state: dict, proposals: dict) -> None:
-    sample = copy.deepcopy(state["inventory"][0])
-
-    sample["status"] = "archived"
-    sample["archived"] = True
-    sample["restored"] = False
-    sample["archive_reason"] = "amazon_unavailable"
-    sample["archive_history"].append({"reason": sample["archive_reason"]})
-    if not sample["archived"] or sample["status"] != "archived":
-        raise AssertionError("Archive transition failed")
-
-    sample["status"] = "restored"
-    sample["archived"] = False
-    sample["restored"] = True
-    sample["archive_reason"] = None
-    sample["restore_history"].append({"reason": "back_in_stock"})
-    if sample["archived"] or sample["status"] != "restored" or not sample["restored"]:
-        raise AssertionError("Restore transition failed")
-    if not sample["page_path"] or not sample["site_url"]:
-        raise AssertionError("Restore transition lost required page fields")
-
-    proposal = {
-        "id": "proposal/B000000000",
-        "amazon_url": "https://www.amazon.com/dp/B000000000",
-        "canonical_url": "https://www.amazon.com/dp/B000000000",
-        "asin": "B000000000",
-        "proposal_status": "pending",
-        "timestamps": {"created_at": "now", "updated_at": "now"},
-        "dedupe": {"canonical_url": "https://www.amazon.com/dp/B000000000", "asin": "B000000000"},
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def check_inventory_chunk(chunk: tuple[int, list[dict]]) -> tuple[list[Violation], list[InventoryKey]]:
+    start, items = chunk
+    violations: list[Violation] = []
+    keys: list[InventoryKey] = []
+    for offset, item in enumerate(items):
+        where = f"inventory[{start + offset}]"
+        try:
+            record = decode(InventoryRecord, item, where)
+        except RecordError as exc:
+            violations.append((exc.path, exc.problem))
+            continue
+        if record.dedupe.stable_product_id != record.id:
+            violations.append((f"{where}.dedupe.stable_product_id", f"does not match id {record.id!r}"))
+        if record.archived != (record.status == "archived"):
+            violations.append((f"{where}.archived", f"{record.archived} disagrees with status {record.status!r}"))
+        if record.restored != (record.status == "restored"):
+            violations.append((f"{where}.restored", f"{record.restored} disagrees with status {record.status!r}"))
+        keys.append((where, record.id, record.category, record.slug, record.amazon_url, record.status, record.page_path))
+    return violations, keys
+
+
+def check_proposal_chunk(chunk: tuple[int, list[dict]]) -> tuple[list[Violation], list[ProposalKey]]:
+    start, items = chunk
+    violations: list[Violation] = []
+    keys: list[ProposalKey] = []
+    for offset, item in enumerate(items):
+        where = f"proposals.items[{start + offset}]"
+        try:
+            record = decode(ProposalRecord, item, where)
+        except RecordError as exc:
+            violations.append((exc.path, exc.problem))
+            continue
+        if record.dedupe.canonical_url != record.canonical_url:
+            violations.append((f"{where}.dedupe.canonical_url", "does not match canonical_url"))
+        keys.append((where, record.id, record.canonical_url, record.asin, record.proposal_status))
+    return violations, keys
+
+
+# Shown by --help, since these fail on files other than the one being checked.
+CROSS_FILE_CHECKS = """\
+cross-file checks (skipped, with a violation saying so, if site_map.json is missing):
+  - live and restored products must be in site_map.json, under the same category
+    and page path, and in <category>/products.json; archived ones are exempt
+  - every site_map.json product and products.json card must be in inventory
+  - pending and approved proposals must not repeat an inventory ASIN
+  After moving or editing pages by hand, run `nzgift build-map` before validating.
+"""
+
+
+class SiteIndex:
+    # Hash indexes over site_map.json and the category products.json files,
+    # built once and checked against each inventory record as it streams past.
+    def __init__(self, site_map: dict[str, Any]) -> None:
+        self.products: dict[str, tuple[str, str]] = {}
+        self.catalog_slugs: set[tuple[str, str]] = set()
+        for category in site_map["site"]["structure"]["categories"]:
+            for product in category.get("products", []):
+                self.products[product["id"]] = (category["slug"], product.get("page", {}).get("path", ""))
+            catalog_path = ROOT / category.get("products_json", f"{category['slug']}/products.json")
+            if catalog_path.exists():
+                self.catalog_slugs.update((category["slug"], item["slug"]) for item in load_json(catalog_path))
+        self.unseen = set(self.products)
+        self.unlisted = set(self.catalog_slugs)
+
+    def check(self, key: InventoryKey) -> list[Violation]:
+        where, product_id, category, slug, _, status, page_path = key
+        violations: list[Violation] = []
+        self.unseen.discard(product_id)
+        self.unlisted.discard((category, slug))
+        mapped = self.products.get(product_id)
+        if mapped is None:
+            if status != "archived":
+                violations.append((where, f"{product_id!r} is not in site_map.json"))
+        else:
+            if mapped[0] != category:
+                violations.append((f"{where}.category", f"site_map.json files it under {mapped[0]!r}"))
+            if page_path and mapped[1] and mapped[1] != page_path:
+                violations.append((f"{where}.page_path", f"site_map.json has {mapped[1]!r}"))
+        if status != "archived" and (category, slug) not in self.catalog_slugs:
+            violations.append((where, f"{status} product missing from {category}/products.json"))
+        return violations
+
+    def leftovers(self) -> list[Violation]:
+        violations = [(f"site_map[{product_id!r}]", "not in inventory") for product_id in sorted(self.unseen)]
+        violations.extend(
+            (f"{category}/products.json[{slug!r}]", "not in inventory") for category, slug in sorted(self.unlisted)
+        )
+        return violations
+
+
+def simulate_lifecycle(sample: dict[str, Any], proposal_urls: set[str], proposal_asins: set[str]) -> list[Violation]:
+    # Works on one copied record and one synthetic proposal; the real queue is
+    # only consulted through the dedupe indexes built during the pass.
+    violations: list[Violation] = []
+    try:
+        record = decode(InventoryRecord, copy.deepcopy(sample), "lifecycle.inventory")
+    except RecordError:
+        # Already reported by the main pass.
+        return violations
+
+    try:
+        if record.status == "archived":
+            apply_inventory(record, "restore", "now")
+        apply_inventory(record, "archive", "now", "amazon_unavailable")
+        if not record.archived or record.archive_reason != "amazon_unavailable":
+            violations.append(("lifecycle.archive", "archive transition failed"))
+        apply_inventory(record, "restore", "now")
+        if record.archived or not record.restored or record.archive_reason is not None:
+            violations.append(("lifecycle.restore", "restore transition failed"))
+    except TransitionError as exc:
+        violations.append(("lifecycle.inventory", str(exc)))
+    if not record.page_path or not record.site_url:
+        violations.append(("lifecycle.restore", "restore transition lost required page fields"))
+    try:
+        decode(InventoryRecord, encode(record), "lifecycle.inventory")
+    except RecordError as exc:
+        violations.append((exc.path, exc.problem))
+
+    proposal = decode(
+        ProposalRecord,
+        {
+            "id": "proposal/B000000000",
+            "amazon_url": "https://www.amazon.com/dp/B000000000",
+            "canonical_url": "https://www.amazon.com/dp/B000000000",
+            "asin": "B000000000",
+            "proposal_status": "pending",
+            "timestamps": {"created_at": "now", "updated_at": "now"},
+            "dedupe": {"canonical_url": "https://www.amazon.com/dp/B000000000", "asin": "B000000000"},
+        },
+    )
+    if proposal.canonical_url in proposal_urls or proposal.asin in proposal_asins:
+        violations.append(("lifecycle.proposal", "synthetic proposal collides with the queue"))
+    try:
+        apply_proposal(proposal, "approve", "now")
+        apply_proposal(proposal, "import", "now")
+        if decode(ProposalRecord, encode(proposal)).timestamps.imported_at != "now":
+            violations.append(("lifecycle.proposal", "import transition failed"))
+    except (TransitionError, RecordError) as exc:
+        violations.append(("lifecycle.proposal", str(exc)))
+    return violations
+
+
+def validate(
+    *,
+    state_path: Path = STATE_PATH,
+    proposal_path: Path = PROPOSAL_PATH,
+    site_map_path: Path = SITE_MAP_PATH,
+    workers: int = 1,
+    chunk_size: int = CHUNK_SIZE,
+) -> dict[str, Any]:
+    started = time.perf_counter()
+    violations: list[Violation] = []
+    site = SiteIndex(load_json(site_map_path)) if site_map_path.exists() else None
+    if site is None:
+        violations.append((site_map_path.name, "missing, so cross-file checks were skipped"))
+
+    counts = {"inventory": 0, "proposals": 0}
+    seen_ids: dict[str, str] = {}
+    seen_amazon: dict[tuple[str, str], str] = {}
+    inventory_asins: set[str] = set()
+    seen_urls: dict[str, str] = {}
+    seen_asins: dict[str, str] = {}
+
+    inventory = iter_array(state_path, "inventory")
+    sample = next(inventory, None)
+    pool = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        chunks = chunked(chain([sample], inventory) if sample is not None else (), chunk_size)
+        for chunk_violations, keys in bounded_map(pool, check_inventory_chunk, chunks, workers * 2):
+            violations.extend(chunk_violations)
+            for key in keys:
+                where, product_id, category, _, amazon_url, _, _ = key
+                counts["inventory"] += 1
+                first = seen_ids.setdefault(product_id, where)
+                if first != where:
+                    violations.append((where, f"duplicate id {product_id!r}, first at {first}"))
+                if amazon_url:
+                    first = seen_amazon.setdefault((category, amazon_url), where)
+                    if first != where:
+                        violations.append((f"{where}.amazon_url", f"duplicate in {category}, first at {first}"))
+                    asin = extract_asin(amazon_url)
+                    if asin:
+                        inventory_asins.add(asin)
+                if site is not None:
+                    violations.extend(site.check(key))
+        if sample is None:
+            violations.append(("inventory", "must be a non-empty list"))
+
+        if proposal_path.exists():
+            chunks = chunked(iter_array(proposal_path, "items"), chunk_size)
+            for chunk_violations, keys in bounded_map(pool, check_proposal_chunk, chunks, workers * 2):
+                violations.extend(chunk_violations)
+                for where, _, canonical_url, asin, status in keys:
+                    counts["proposals"] += 1
+                    first = seen_urls.setdefault(canonical_url, where)
+                    if first != where:
+                        violations.append((f"{where}.canonical_url", f"duplicate, first at {first}"))
+                    if not asin:
+                        continue
+                    first = seen_asins.setdefault(asin, where)
+                    if first != where:
+                        violations.append((f"{where}.asin", f"duplicate, first at {first}"))
+                    if status in OPEN_PROPOSAL_STATUSES and asin in inventory_asins:
+                        violations.append((f"{where}.asin", f"{status} proposal for a product already in inventory"))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if site is not None:
+        violations.extend(site.leftovers())
+    if sample is not None:
+        violations.extend(simulate_lifecycle(sample, set(seen_urls), set(seen_asins)))
+    return {
+        "passed": not violations,
+        "counts": counts,
+        "violation_count": len(violations),
+        "violations": [{"path": path, "problem": problem} for path, problem in violations],
+        "workers": workers,
+        "elapsed_s": round(time.perf_counter() - started, 3),
     }
-    proposals = copy.deepcopy(proposals)
-    proposals.setdefault("items", []).append(proposal)
-    validate_proposals(proposals)
-    proposals["items"][0]["proposal_status"] = "rejected"
-    if proposals["items"][0]["proposal_status"] != "rejected":
-        raise AssertionError("Proposal rejection transition failed")
+
+
+def default_workers() -> int:
+    size = sum(path.stat().st_size for path in (STATE_PATH, PROPOSAL_PATH) if path.exists())
+    return (os.cpu_count() or 1) if size >= PARALLEL_MIN_BYTES else 1
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Validate product state, proposals and their agreement with the site.",
+        epilog=CROSS_FILE_CHECKS,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes for record checks (default: 1, or one per CPU for large state files)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Records per worker task")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    return parser.parse_args()
 
 
 def main() -> None:
-    state = load_state()
-    proposals = load_proposals()
-    validate_inventory(state)
-    validate_proposals(proposals)
-    simulate_lifecycle(state, proposals)
-    print("Automation state validation passed.")
+    args = parse_args()
+    report = validate(workers=max(1, args.workers or default_workers()), chunk_size=max(1, args.chunk_size))
+    counts = report["counts"]
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        for violation in report["violations"][:MAX_PRINTED]:
+            print(f"{violation['path']}: {violation['problem']}")
+        if report["violation_count"] > MAX_PRINTED:
+            print(f"... and {report['violation_count'] - MAX_PRINTED} more (use --json for all)")
+    if not report["passed"]:
+        raise SystemExit(
+            f"Automation state validation failed: {report['violation_count']} violation(s) in "
+            f"{counts['inventory']} inventory records and {counts['proposals']} proposals."
+        )
+    if not args.json:
+        print(
+            f"Automation state validation passed ({counts['inventory']} inventory records, "
+            f"{counts['proposals']} proposals, {report['elapsed_s']}s)."
+        )
 
 
 if __name__ == "__main__":
-    main()
+    run_cli(main, "validate_automation_state")
@@ -0,0 +1,87 @@
+# serve_admin.py
+# Production entry point for the admin tool: admin_app under gunicorn with
+# several worker processes, each running a pool of request threads. The dev
+# server is already threaded, so the gain is in CPU work (parsing, rendering,
+# templating), which one process runs on a single core because of the GIL and
+# gunicorn spreads over one core per worker. On a single-core machine there is
+# no throughput gain to be had; imports also serialize on the data-file locks.
+# Workers still add request timeouts, crash isolation and no debugger.
+#
+# scripts/load_test_admin.py, 16 clients, on a 1-CPU machine (imports against
+# scripts/amazon_fixture_server.py):
+#
+#   server                       form req/s  p50/p95 ms    import req/s  p50/p95 ms
+#   serve --dev (FLASK_DEBUG=0)  743-771     20/29-31      48.9          107/1245
+#   gunicorn 4 workers x 4       637-662     23-24/43-45   38.4          268/1099
+#
+# One core means gunicorn's extra processes only add switching and lock waits.
+# Re-measure on the production host, with its core count, before picking workers.
+#
+# Run from repo root: python serve_admin.py --workers 3 --threads 4
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+
+def default_workers() -> int:
+    return int(os.getenv("ADMIN_WORKERS", str(min(4, multiprocessing.cpu_count() + 1))))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the NZ Gift Finder admin app with gunicorn.")
+    parser.add_argument("--host", default=os.getenv("ADMIN_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ADMIN_PORT", "5000")))
+    parser.add_argument("--workers", type=int, default=default_workers(), help="Worker processes")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("ADMIN_THREADS", "4")), help="Threads per worker")
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=int(os.getenv("ADMIN_TIMEOUT", "180")),
+        help="Seconds before a stuck request's worker is restarted (imports and LLM calls are slow)",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError as exc:
+        raise SystemExit("gunicorn is not installed. Run: pip install -r requirements.txt") from exc
+
+    class AdminApplication(BaseApplication):
+        def load_config(self) -> None:
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", args.timeout)
+            self.cfg.set("accesslog", "-")
+            # Each worker imports admin_app itself and builds its own client
+            # and templates in create_app(), so nothing is shared across forks.
+            self.cfg.set("preload_app", False)
+
+        def load(self):
+            from admin_app import create_app
+
+            return create_app()
+
+    # Workers read this when they import metrics, so /metrics reports the sum
+    # over all of them rather than whichever worker answered. It is fresh per
+    # server start, which resets the counters the way a restart would.
+    metrics_dir = tempfile.mkdtemp(prefix="nzgift-admin-metrics-")
+    os.environ["NZGIFT_METRICS_DIR"] = metrics_dir
+    print(f"Serving admin on http://{args.host}:{args.port} with {args.workers} workers x {args.threads} threads")
+    try:
+        AdminApplication().run()
+    finally:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
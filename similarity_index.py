@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import re
+import unicodedata
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from nzgift import serialize
+from nzgift.state import update_json
+
+ROOT = Path(__file__).resolve().parent
+INDEX_PATH = ROOT / "data" / "similarity_index.json"
+
+# 20 bands of 3 rows: pairs with Jaccard ~0.5 collide in at least one band
+# about 93% of the time, pairs under ~0.2 almost never do.
+NUM_PERM = 60
+BANDS = 20
+ROWS = NUM_PERM // BANDS
+DUPLICATE_THRESHOLD = 0.45
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20260314)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)
+]
+STOPWORDS = {
+    "a", "an", "and", "by", "for", "from", "in", "of", "on", "the", "to", "with",
+    "new", "zealand", "nz", "kiwi", "gift", "gifts", "pack", "set",
+}
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def product_text(title: str) -> str:
+    # Titles only: bootstrapped inventory has no bullets, and indexed and
+    # queried text must be built from the same fields to be comparable.
+    return title or ""
+
+
+def shingles(text: str) -> set[str]:
+    words = [word for word in normalize_text(text).split() if word not in STOPWORDS]
+    tokens = set(words)
+    tokens.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return tokens
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(tokens: set[str]) -> list[int]:
+    if not tokens:
+        return [_MERSENNE_PRIME] * NUM_PERM
+    hashed = [_token_hash(token) for token in tokens]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashed) for a, b in _PERMUTATIONS]
+
+
+def estimate_similarity(left: list[int], right: list[int]) -> float:
+    matches = sum(1 for a, b in zip(left, right) if a == b)
+    return matches / NUM_PERM
+
+
+def _band_keys(signature: list[int]) -> list[str]:
+    return [
+        f"{band}:{hash(tuple(signature[band * ROWS:(band + 1) * ROWS])) & 0xFFFFFFFFFFFF:x}"
+        for band in range(BANDS)
+    ]
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()[:16]
+
+
+class SimilarityIndex:
+    def __init__(self) -> None:
+        self.entries: dict[str, dict[str, Any]] = {}
+        self.buckets: dict[str, set[str]] = {}
+
+    def add(self, key: str, text: str, *, title: str = "", kind: str = "inventory") -> None:
+        digest = _digest(text)
+        existing = self.entries.get(key)
+        if existing and existing["digest"] == digest:
+            return
+        if existing:
+            self.remove(key)
+        signature = minhash(shingles(text))
+        self.entries[key] = {"title": title, "kind": kind, "digest": digest, "signature": signature}
+        for band_key in _band_keys(signature):
+            self.buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if not entry:
+            return
+        for band_key in _band_keys(entry["signature"]):
+            bucket = self.buckets.get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def query(
+        self,
+        text: str,
+        *,
+        threshold: float = DUPLICATE_THRESHOLD,
+        exclude: Iterable[str] = (),
+        limit: int = 5,
+    ) -> list[dict[str, Any]]:
+        signature = minhash(shingles(text))
+        skip = set(exclude)
+        candidates: set[str] = set()
+        for band_key in _band_keys(signature):
+            candidates.update(self.buckets.get(band_key, ()))
+        matches = []
+        for key in candidates - skip:
+            entry = self.entries[key]
+            score = estimate_similarity(signature, entry["signature"])
+            if score >= threshold:
+                matches.append({"id": key, "title": entry["title"], "kind": entry["kind"], "score": round(score, 3)})
+        matches.sort(key=lambda match: (-match["score"], match["id"]))
+        return matches[:limit]
+
+    def to_payload(self) -> dict[str, Any]:
+        return {
+            "schema_version": 1,
+            "num_perm": NUM_PERM,
+            "bands": BANDS,
+            "entries": self.entries,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict[str, Any]) -> "SimilarityIndex":
+        index = cls()
+        if payload.get("num_perm") != NUM_PERM or payload.get("bands") != BANDS:
+            return index
+        for key, entry in payload.get("entries", {}).items():
+            index.entries[key] = entry
+            for band_key in _band_keys(entry["signature"]):
+                index.buckets.setdefault(band_key, set()).add(key)
+        return index
+
+
+def load_index(path: Path = INDEX_PATH) -> SimilarityIndex:
+    if not path.exists():
+        return SimilarityIndex()
+    return SimilarityIndex.from_payload(serialize.read_json(path))
+
+
+def update_index(apply: Callable[[SimilarityIndex], Any], path: Path = INDEX_PATH) -> SimilarityIndex:
+    # Import, discovery and the build all write the index. apply runs on the
+    # current file under nzgift.state's version check, and is re-run on a
+    # fresh read if another process saved in between.
+    updated: list[SimilarityIndex] = []
+
+    def change(payload: dict[str, Any]) -> dict[str, Any]:
+        index = SimilarityIndex.from_payload(payload)
+        apply(index)
+        updated[:] = [index]
+        return index.to_payload()
+
+    update_json(path, change, default=lambda: SimilarityIndex().to_payload(), compact=True)
+    return updated[0]
+
+
+def sync_index(
+    index: SimilarityIndex,
+    state: dict[str, Any] | None = None,
+    proposals: dict[str, Any] | None = None,
+) -> None:
+    for item in (state or {}).get("inventory", []):
+        index.add(item["id"], product_text(item.get("title", "")), title=item.get("title", ""), kind="inventory")
+    if proposals is None:
+        return
+    proposal_ids: set[str] = set()
+    for item in proposals.get("items", []):
+        key = item["id"]
+        proposal_ids.add(key)
+        index.add(
+            key,
+            product_text(item.get("title", "")),
+            title=item.get("title", ""),
+            kind="proposal",
+        )
+    stale = [key for key, entry in index.entries.items() if entry["kind"] == "proposal" and key not in proposal_ids]
+    for key in stale:
+        index.remove(key)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from amazon_extract import (
+    PRODUCT_FIELDS,
+    PageWatch,
+    canonical_amazon_url,
+    extract_asin,
+    extract_page,
+    guess_category,
+)
+from amazon_fixture_server import product_page
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "amazon"
+
+
+def page(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def test_gallery_page():
+    values, report = extract_page(page("product_gallery.html"))
+    assert values["title"] == "Tui & Kowhai Art Print, A4 – New Zealand Native Bird Wall Art"
+    # One image per media id, hiRes preferred over large.
+    assert values["images"] == [
+        "https://m.media-amazon.com/images/I/71tuiMain._AC_SL1500_.jpg",
+        "https://m.media-amazon.com/images/I/41tuiSide._AC_.jpg",
+        "https://m.media-amazon.com/images/I/71tuiFrame._AC_SL1500_.jpg",
+    ]
+    # Short, duplicated and Amazon/review boilerplate bullets are dropped; at most five kept.
+    assert values["bullets"] == [
+        "Giclée print of a tūī feeding on kōwhai flowers, painted in Wellington",
+        "Printed on 310gsm cotton rag paper with archival pigment inks & signed",
+        "Fits a standard A4 frame; mat and frame are not included",
+        "A thoughtful gift for birthdays, housewarmings and Matariki",
+        "Each print is checked by hand before it is packed and sent",
+    ]
+    assert report["truncated"] is False and report["tripped"] == [] and report["skipped"] == []
+    assert guess_category(values["title"], values["bullets"]) == "artwork"
+
+
+def test_page_without_gallery_falls_back_to_head_title_and_dynamic_image():
+    values, _ = extract_page(page("product_legacy.html"))
+    assert values["title"] == "Manuka Honey UMF 10+ 500g from Aotearoa"
+    assert values["images"] == [
+        "https://m.media-amazon.com/images/I/71honeyJar._SL1500_.jpg",
+        "https://m.media-amazon.com/images/I/51honeyJar._SX300_.jpg",
+    ]
+    assert values["bullets"] == ["Raw manuka honey from hives in the Northland bush, tested for UMF 10+"]
+    assert guess_category(values["title"], values["bullets"]) == "food"
+
+
+def test_unclosed_markup_is_parsed_in_one_pass():
+    raw = page("product_unclosed.html")
+    head, _, items = raw.partition("<li>")
+    values, report = extract_page(head + "<li>" + items * 50, seconds=60)
+    assert values == {"title": "Pathological Fixture Page", "images": [], "bullets": []}
+    # Backtracking through ~2 MB of unclosed items would take minutes.
+    assert report["elapsed_ms"] < 2000
+
+
+def test_fixture_server_page():
+    values, _ = extract_page(product_page("B0FIXTURE1", padding=1000))
+    assert values["title"] == "Fixture New Zealand Gift B0FIXTURE1"
+    assert len(values["images"]) == 4
+    assert len(values["bullets"]) == 5
+
+
+def test_oversized_page_is_cut_and_reported():
+    raw = page("product_gallery.html")
+    cut = raw.index('<div id="feature-bullets"')
+    values, report = extract_page(raw, max_chars=cut)
+    assert values["title"].startswith("Tui & Kowhai") and len(values["images"]) == 3
+    assert values["bullets"] == []
+    assert report["truncated"] is True and report["tripped"] == ["size"] and report["chars"] == len(raw)
+
+
+def test_spent_time_budget_leaves_defaults():
+    values, report = extract_page(page("product_gallery.html"), seconds=-1)
+    assert values == {name: default for name, (_, default) in PRODUCT_FIELDS.items()}
+    assert values["images"] is not PRODUCT_FIELDS["images"][1]
+    assert report["skipped"] == ["title", "images", "bullets"] and report["tripped"] == ["time"]
+
+
+def test_page_watch_stops_once_every_field_is_complete():
+    raw = page("product_gallery.html")
+    watch = PageWatch()
+    done_at = None
+    for end in range(512, len(raw) + 512, 512):
+        if watch.feed(raw[:end]):
+            done_at = end
+            break
+    assert done_at is not None
+    assert done_at < len(raw)
+    assert raw.index("</ul>\n</div>") < done_at
+
+
+def test_page_watch_keeps_waiting_on_unclosed_markup():
+    watch = PageWatch()
+    assert watch.feed(page("product_unclosed.html")) is False
+    assert set(watch.waiting) == {"title", "images", "bullets"}
+
+
+@pytest.mark.parametrize(
+    "url, asin, canonical",
+    [
+        (
+            "https://www.amazon.com/Tui-Kowhai-Print/dp/b0ctuiprnt?tag=nzgiftfinder-20&th=1",
+            "B0CTUIPRNT",
+            "https://www.amazon.com/dp/B0CTUIPRNT",
+        ),
+        ("https://www.amazon.com/gp/product/B0DJRH76R5/ref=x", "B0DJRH76R5", "https://www.amazon.com/dp/B0DJRH76R5"),
+        ("https://www.amazon.com/dp/B0DJRH76R5", "B0DJRH76R5", "https://www.amazon.com/dp/B0DJRH76R5"),
+        ("https://amzn.to/3xYzAbC?tag=nzgiftfinder-20", None, "https://amzn.to/3xYzAbC"),
+        ("https://www.amazon.com/dp/B0DJRH76R5X", None, "https://www.amazon.com/dp/B0DJRH76R5X"),
+    ],
+)
+def test_asin_and_canonical_url(url, asin, canonical):
+    assert extract_asin(url) == asin
+    assert canonical_amazon_url(url) == canonical
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import pytest
+
+from nzgift import build, state
+from nzgift.build import Stage, levels, product_targets, select
+
+
+def stage(name: str, deps: set[str] = frozenset()) -> Stage:
+    return Stage(name, [], [], lambda changed: None, set(deps))
+
+
+def names(graph_levels: list[list[Stage]]) -> list[list[str]]:
+    return [[item.name for item in level] for level in graph_levels]
+
+
+def test_levels_put_each_stage_after_its_deps():
+    graph = {
+        "site_map": stage("site_map", {"render:b", "catalog"}),
+        "catalog": stage("catalog"),
+        "render:b": stage("render:b", {"related"}),
+        "render:a": stage("render:a", {"related"}),
+        "related": stage("related", {"catalog"}),
+    }
+    assert names(levels(graph)) == [["catalog"], ["related"], ["render:a", "render:b"], ["site_map"]]
+
+
+def test_levels_ignore_deps_outside_the_selection():
+    graph = {"render:a": stage("render:a", {"related"}), "catalog": stage("catalog")}
+    assert names(levels(graph)) == [["catalog", "render:a"]]
+
+
+def test_levels_report_a_cycle():
+    graph = {"a": stage("a", {"b"}), "b": stage("b", {"a"}), "c": stage("c")}
+    with pytest.raises(ValueError, match="cycle among: a, b"):
+        levels(graph)
+
+
+def test_select_pulls_in_upstream_stages_unless_told_not_to():
+    graph = {
+        "catalog": stage("catalog"),
+        "related": stage("related", {"catalog"}),
+        "render:a": stage("render:a", {"related"}),
+        "render:b": stage("render:b", {"related"}),
+    }
+    assert set(select(graph, ["render:a"])) == {"catalog", "related", "render:a"}
+    assert set(select(graph, ["render:a"], with_deps=False)) == {"render:a"}
+    assert select(graph, None) is graph
+    with pytest.raises(ValueError, match="Unknown build target"):
+        select(graph, ["render:missing"])
+
+
+def test_product_targets_cover_the_page_its_category_and_the_site_map():
+    assert product_targets("books", "kiwi-cookbook") == [
+        "render:books/kiwi-cookbook",
+        "catalog:books",
+        "shards:books",
+        "site_map",
+    ]
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    # A small graph over files in tmp_path: upper -> shout, plus an
+    # unrelated copy stage.
+    monkeypatch.setattr(state, "STORE", state.StateStore())
+    monkeypatch.setattr(build, "ROOT", tmp_path)
+    monkeypatch.setattr(build, "BUILD_STATE_PATH", tmp_path / "build_state.json")
+    source, other = tmp_path / "source.txt", tmp_path / "other.txt"
+    upper, shout, copy = tmp_path / "upper.txt", tmp_path / "shout.txt", tmp_path / "copy.txt"
+    source.write_text("kia ora")
+    other.write_text("one")
+    calls: list[tuple[str, set | None]] = []
+
+    def step(name, transform, inputs, output):
+        def run(changed):
+            calls.append((name, changed and {path.name for path in changed}))
+            output.write_text(transform(inputs[0].read_text()))
+
+        return Stage(name, inputs, [output], run)
+
+    def graph():
+        stages = [
+            step("upper", str.upper, [source], upper),
+            step("shout", lambda text: text.split()[0] + "!", [upper], shout),
+            step("copy", str, [other], copy),
+        ]
+        stages[1].deps = {"upper"}
+        return {item.name: item for item in stages}
+
+    monkeypatch.setattr(build, "build_graph", graph)
+    return tmp_path, calls
+
+
+def test_first_build_runs_everything_then_nothing(tree):
+    root, calls = tree
+    result = build.run_build(workers=2)
+    assert sorted(result["ran"]) == ["copy", "shout", "upper"]
+    assert (root / "shout.txt").read_text() == "KIA!"
+    assert all(changed is None for _, changed in calls)
+
+    calls.clear()
+    result = build.run_build(workers=2)
+    assert result["ran"] == [] and result["skipped"] == 3
+    assert calls == []
+
+
+def test_only_stages_with_changed_inputs_run(tree):
+    root, calls = tree
+    build.run_build(workers=2)
+    calls.clear()
+    (root / "source.txt").write_text("kia ora koutou")
+    result = build.run_build(workers=2)
+    assert result["ran"] == ["upper", "shout"]
+    assert calls == [("upper", {"source.txt"}), ("shout", {"upper.txt"})]
+
+
+def test_a_stage_whose_input_came_out_identical_is_skipped(tree):
+    root, calls = tree
+    build.run_build(workers=2)
+    calls.clear()
+    # A different source that upper-cases to the same text.
+    (root / "source.txt").write_text("KIA ORA")
+    result = build.run_build(workers=2)
+    assert result["ran"] == ["upper"]
+    assert result["skipped"] == 2
+
+
+def test_missing_outputs_and_force_rebuild(tree):
+    root, calls = tree
+    build.run_build(workers=2)
+    (root / "copy.txt").unlink()
+    assert build.run_build(workers=2)["ran"] == ["copy"]
+    assert sorted(build.run_build(workers=2, force=True)["ran"]) == ["copy", "shout", "upper"]
+
+
+def test_dry_run_lists_work_without_doing_it(tree):
+    root, calls = tree
+    result = build.run_build(dry_run=True)
+    assert sorted(result["ran"]) == ["copy", "shout", "upper"]
+    assert calls == [] and not (root / "build_state.json").exists()
+
+
+def test_a_failed_stage_stops_its_dependents(tree, monkeypatch):
+    root, calls = tree
+    graph = build.build_graph()
+
+    def broken(changed):
+        raise OSError("disk full")
+
+    graph["upper"].run = broken
+    monkeypatch.setattr(build, "build_graph", lambda: graph)
+    with pytest.raises(RuntimeError, match="upper.*OSError: disk full"):
+        build.run_build(workers=2)
+    assert not (root / "shout.txt").exists()
+    assert (root / "copy.txt").exists()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import json
+import sys
+
+import pytest
+
+from nzgift import lifecycle, serialize, state
+from nzgift.lifecycle import (
+    Transaction,
+    TransitionError,
+    apply_inventory,
+    apply_proposal,
+    ensure_stats,
+    new_inventory_record,
+)
+from nzgift.records import ProposalDedupe, ProposalRecord, ProposalTimestamps, encode
+
+
+def inventory_record(status: str = "live"):
+    record = new_inventory_record(
+        product_id="books/kiwi-cookbook",
+        category="books",
+        slug="kiwi-cookbook",
+        title="Kiwi Cookbook",
+        amazon_url="https://www.amazon.com/dp/B000000001",
+        site_url="/books/kiwi-cookbook.html",
+        page_path="books/kiwi-cookbook.html",
+    )
+    record.status = status
+    return record
+
+
+def proposal_record(status: str = "pending", item_id: str = "proposal/B000000002") -> ProposalRecord:
+    url = "https://www.amazon.com/dp/B000000002"
+    return ProposalRecord(
+        id=item_id,
+        amazon_url=url,
+        canonical_url=url,
+        proposal_status=status,
+        timestamps=ProposalTimestamps(created_at="t0", updated_at="t0"),
+        dedupe=ProposalDedupe(canonical_url=url, asin="B000000002"),
+        asin="B000000002",
+    )
+
+
+def test_archive_then_restore_an_inventory_record():
+    record = inventory_record()
+    apply_inventory(record, "archive", "t1", "amazon_unavailable", "gone")
+    assert (record.status, record.archived, record.restored) == ("archived", True, False)
+    assert record.archive_reason == "amazon_unavailable"
+    assert record.archive_history == [{"timestamp": "t1", "reason": "amazon_unavailable", "notes": "gone"}]
+
+    apply_inventory(record, "restore", "t2")
+    assert (record.status, record.archived, record.restored) == ("restored", False, True)
+    assert record.archive_reason is None and record.archive_notes is None
+    assert record.last_seen_in_stock == "t2"
+    assert record.timestamps.updated_at == "t2"
+
+
+@pytest.mark.parametrize(
+    "status, action",
+    [("live", "restore"), ("restored", "restore"), ("archived", "archive"), ("live", "delete")],
+)
+def test_invalid_inventory_transitions_are_refused(status, action):
+    record = inventory_record(status)
+    with pytest.raises(TransitionError):
+        apply_inventory(record, action, "t1")
+    assert record.status == status
+    assert record.archive_history == [] and record.restore_history == []
+
+
+def test_proposal_moves_through_review_and_import():
+    record = proposal_record()
+    apply_proposal(record, "approve", "t1")
+    apply_proposal(record, "import", "t2", reason="books/kiwi-cookbook")
+    assert record.proposal_status == "imported"
+    assert (record.timestamps.approved_at, record.timestamps.imported_at) == ("t1", "t2")
+    assert [entry["status"] for entry in record.review_history] == ["approved", "imported"]
+    assert record.review_history[-1]["reason"] == "books/kiwi-cookbook"
+
+
+@pytest.mark.parametrize(
+    "status, action",
+    [("pending", "import"), ("imported", "reject"), ("imported", "reopen"), ("approved", "approve")],
+)
+def test_invalid_proposal_transitions_are_refused(status, action):
+    record = proposal_record(status)
+    with pytest.raises(TransitionError, match="cannot"):
+        apply_proposal(record, action, "t1")
+    assert record.proposal_status == status
+
+
+def test_reopen_returns_a_rejected_proposal_to_pending():
+    record = proposal_record("rejected")
+    apply_proposal(record, "reopen", "t1", notes="worth another look")
+    assert record.proposal_status == "pending"
+    assert record.timestamps.proposed_at == "t1"
+    assert record.review_notes == "worth another look"
+
+
+def test_ensure_stats_counts_files_without_stats():
+    payload = {"inventory": [{"status": "live"}, {"status": "live"}, {"status": "archived"}]}
+    stats = ensure_stats(payload, "inventory")
+    assert stats == {"live": 2, "archived": 1, "restored": 0, "total_products": 3}
+    assert payload["stats"] is stats
+
+
+def test_ensure_stats_keeps_complete_stats_as_they_are():
+    stats = {"live": 7, "archived": 0, "restored": 0, "total_products": 7}
+    payload = {"inventory": [], "stats": stats}
+    assert ensure_stats(payload, "inventory") == {"live": 7, "archived": 0, "restored": 0, "total_products": 7}
+
+
+def test_ensure_stats_recounts_partial_proposal_stats():
+    payload = {"items": [{"proposal_status": "pending"}, {"proposal_status": "approved"}], "stats": {"pending": 9}}
+    stats = ensure_stats(payload, "proposal")
+    assert stats["pending"] == 1 and stats["approved"] == 1 and stats["imported"] == 0
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "STORE", state.StateStore())
+    state_path, proposal_path = tmp_path / "product_state.json", tmp_path / "proposal_queue.json"
+    serialize.write_json(state_path, {"inventory": [encode(inventory_record())]})
+    serialize.write_json(proposal_path, {"items": [encode(proposal_record())]})
+    return state_path, proposal_path
+
+
+def test_transaction_commits_every_change_and_keeps_stats(files):
+    state_path, proposal_path = files
+    with Transaction(state_path=state_path, proposal_path=proposal_path) as txn:
+        txn.transition("inventory", "books/kiwi-cookbook", "archive", reason="manual")
+        txn.transition("proposal", "proposal/B000000002", "approve")
+    inventory = json.loads(state_path.read_text())
+    proposals = json.loads(proposal_path.read_text())
+    assert inventory["inventory"][0]["status"] == "archived"
+    assert inventory["stats"] == {"live": 0, "archived": 1, "restored": 0, "total_products": 1}
+    assert proposals["items"][0]["proposal_status"] == "approved"
+    assert proposals["stats"]["pending"] == 0 and proposals["stats"]["approved"] == 1
+
+
+def test_transaction_writes_nothing_when_a_transition_fails(files):
+    state_path, proposal_path = files
+    before = state_path.read_bytes(), proposal_path.read_bytes()
+    with pytest.raises(TransitionError):
+        with Transaction(state_path=state_path, proposal_path=proposal_path) as txn:
+            txn.transition("inventory", "books/kiwi-cookbook", "archive")
+            txn.transition("proposal", "proposal/B000000002", "import")
+    assert (state_path.read_bytes(), proposal_path.read_bytes()) == before
+
+
+def test_transaction_refuses_files_changed_since_read(files):
+    state_path, proposal_path = files
+    txn = Transaction(state_path=state_path, proposal_path=proposal_path)
+    txn.transition("inventory", "books/kiwi-cookbook", "archive")
+    serialize.write_json(state_path, {"inventory": [encode(inventory_record())], "note": "theirs"})
+    with pytest.raises(state.VersionConflict):
+        txn.commit()
+    assert json.loads(state_path.read_text())["note"] == "theirs"
+
+
+def test_cli_reports_a_persistent_conflict_without_a_traceback(monkeypatch):
+    def conflict(func):
+        raise state.VersionConflict(state.Path("product_state.json"), None, (1, 2, 3))
+
+    monkeypatch.setattr(lifecycle, "with_retries", conflict)
+    monkeypatch.setattr(sys, "argv", ["lifecycle", "inventory", "archive", "books/kiwi-cookbook"])
+    with pytest.raises(SystemExit, match="No changes written: product_state.json changed on disk"):
+        lifecycle.main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import http.client
+import threading
+
+import pytest
+
+from nzgift import preview
+from nzgift.preview import make_server, parse_range
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-9", (0, 9)),
+        ("bytes=5-", (5, 99)),
+        ("bytes=-3", (97, 99)),
+        ("bytes=-500", (0, 99)),
+        ("bytes=90-200", (90, 99)),
+        (" bytes=0-0 ", (0, 0)),
+        # Unsatisfiable ranges are returned as such; the handler answers 416.
+        ("bytes=-0", (100, 99)),
+        ("bytes=150-", (150, 99)),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=-", "bytes=0-1,5-6", "items=0-9", "bytes=a-b", "bytes 0-9", ""])
+def test_parse_range_ignores_what_it_does_not_serve(header):
+    assert parse_range(header, 100) is None
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / "index.html").write_text("<html><body>home</body></html>")
+    (tmp_path / "style.3f9a1c2b.css").write_bytes(b"0123456789")
+    server = make_server("127.0.0.1", 0, root=tmp_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def get(path: str, **headers) -> http.client.HTTPResponse:
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        response.body = response.read()
+        connection.close()
+        return response
+
+    yield get
+    server.shutdown()
+    server.server_close()
+
+
+def test_serves_ranges_of_a_file(site):
+    response = site("/style.3f9a1c2b.css", Range="bytes=2-4")
+    assert response.status == 206
+    assert response.body == b"234"
+    assert response.getheader("Content-Range") == "bytes 2-4/10"
+    assert response.getheader("Cache-Control") == preview.IMMUTABLE_CACHE
+
+
+def test_refuses_a_range_past_the_end(site):
+    response = site("/style.3f9a1c2b.css", Range="bytes=20-")
+    assert response.status == 416
+    assert response.getheader("Content-Range") == "bytes */10"
+
+
+def test_revalidates_with_the_etag(site):
+    first = site("/")
+    assert first.status == 200 and first.body.endswith(b"</html>")
+    assert first.getheader("Cache-Control") == preview.REVALIDATE_CACHE
+    assert site("/", **{"If-None-Match": first.getheader("ETag")}).status == 304
+
+
+def test_default_root_prefers_a_built_dist(tmp_path, monkeypatch):
+    monkeypatch.setattr(preview, "DIST_DIR", tmp_path / "dist")
+    assert preview.default_root() == preview.ROOT
+    (tmp_path / "dist").mkdir()
+    (tmp_path / "dist" / "index.html").write_text("<html></html>")
+    assert preview.default_root() == tmp_path / "dist"
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from nzgift.config import DATA_DIR
+from nzgift.records import (
+    ENCODE_ORDER,
+    InventoryRecord,
+    ProposalRecord,
+    RecordError,
+    decode,
+    decode_all,
+    encode,
+)
+
+
+def inventory_payload(**changes) -> dict:
+    payload = {
+        "id": "books/kiwi-cookbook",
+        "slug": "kiwi-cookbook",
+        "title": "Kiwi Cookbook",
+        "category": "books",
+        "amazon_url": "https://www.amazon.com/dp/B000000001",
+        "site_url": "/books/kiwi-cookbook.html",
+        "page_path": "books/kiwi-cookbook.html",
+        "catalog_path": "books/products.json",
+        "image": "",
+        "status": "live",
+        "archived": False,
+        "restored": False,
+        "last_checked": None,
+        "last_seen_in_stock": None,
+        "last_posted": None,
+        "archive_reason": None,
+        "archive_notes": None,
+        "archive_history": [],
+        "restore_history": [],
+        "post_history": [],
+        "check_history": [],
+        "dedupe": {"stable_product_id": "books/kiwi-cookbook", "amazon_url": "", "site_url": "", "slug": ""},
+        "copy_qa": {"last_checked": None, "status": "unknown", "notes": [], "content_hash": None},
+        "source": {"import_method": "manual", "discovered_at": None, "imported_at": "t0"},
+        "timestamps": {"created_at": "t0", "updated_at": "t0"},
+    }
+    payload.update(changes)
+    return payload
+
+
+def test_round_trip_keeps_fields_in_written_order():
+    payload = inventory_payload()
+    encoded = encode(decode(InventoryRecord, payload))
+    assert encoded == payload
+    assert list(encoded) == list(ENCODE_ORDER[InventoryRecord])
+
+
+def test_round_trip_keeps_unknown_keys():
+    payload = inventory_payload(featured_until="2026-12-25", tags=["xmas"])
+    record = decode(InventoryRecord, payload)
+    assert record.extra == {"featured_until": "2026-12-25", "tags": ["xmas"]}
+    assert encode(record) == payload
+
+
+def test_missing_optional_fields_get_their_defaults():
+    payload = inventory_payload()
+    for name in ("catalog_path", "image", "copy_qa", "source"):
+        del payload[name]
+    record = decode(InventoryRecord, payload)
+    assert record.catalog_path == "" and record.copy_qa.status == "unknown"
+    assert record.source.import_method == "existing_repo_inventory"
+    assert record.copy_qa.notes is not decode(InventoryRecord, payload).copy_qa.notes
+
+
+def test_errors_name_the_path_to_the_bad_value():
+    items = [inventory_payload(), inventory_payload(id=7)]
+    with pytest.raises(RecordError, match=r"^inventory\[1\]\.id: expected str, got int$"):
+        decode_all(InventoryRecord, items, "inventory")
+
+    nested = inventory_payload(dedupe={"amazon_url": ""})
+    with pytest.raises(RecordError, match=r"inventory\[0\]\.dedupe: missing required field 'stable_product_id'"):
+        decode_all(InventoryRecord, [nested], "inventory")
+
+
+def test_missing_required_field():
+    payload = inventory_payload()
+    del payload["title"]
+    with pytest.raises(RecordError, match="InventoryRecord: missing required field 'title'"):
+        decode(InventoryRecord, payload)
+
+
+@pytest.mark.parametrize(
+    "changes, problem",
+    [
+        ({"status": "deleted"}, "status: invalid value 'deleted'"),
+        ({"title": True}, "title: expected str, got bool"),
+        ({"archived": 0}, "archived: expected bool, got int"),
+        ({"last_checked": 5}, "last_checked: expected null | str, got int"),
+        ({"dedupe": []}, "dedupe: expected an object, got list"),
+    ],
+)
+def test_rejects_wrong_types_and_values(changes, problem):
+    with pytest.raises(RecordError) as excinfo:
+        decode(InventoryRecord, inventory_payload(**changes), "item")
+    assert str(excinfo.value) == f"item.{problem}"
+
+
+def test_decode_all_wants_a_list():
+    with pytest.raises(RecordError, match="items: expected a list, got dict"):
+        decode_all(ProposalRecord, {}, "items")
+
+
+def test_interned_values_are_shared():
+    first, second = decode_all(InventoryRecord, [inventory_payload(), inventory_payload()], "inventory")
+    assert first.category is second.category
+    assert first.status is second.status
+
+
+def test_committed_proposal_queue_round_trips():
+    path = DATA_DIR / "proposal_queue.json"
+    if not path.exists():
+        pytest.skip("no proposal queue in this checkout")
+    items = json.loads(path.read_bytes()).get("items", [])
+    encoded = [encode(record) for record in decode_all(ProposalRecord, items, "items")]
+    # Decoding fills in defaults for keys older writers left out; nothing
+    # already there may change, and a second pass is a no-op.
+    for before, after in zip(items, encoded):
+        for key, value in before.items():
+            if isinstance(value, dict):
+                assert after[key] | value == after[key], (before["id"], key)
+            else:
+                assert after[key] == value, (before["id"], key)
+    assert [encode(record) for record in decode_all(ProposalRecord, encoded, "items")] == encoded
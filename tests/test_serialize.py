@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from nzgift import serialize
+from nzgift.config import ROOT
+
+needs_orjson = pytest.mark.skipif(serialize.orjson is None, reason="orjson is not installed or NZGIFT_JSON=stdlib")
+
+DATA_FILES = sorted(
+    path
+    for pattern in ("*/products.json", "*/catalog/*.json", "data/*.json")
+    for path in ROOT.glob(pattern)
+    if path.parts[len(ROOT.parts)] != "dist"
+)
+
+
+def stdlib_dumps(payload, **options) -> bytes:
+    saved = serialize.orjson
+    serialize.orjson = None
+    try:
+        return serialize.dumps(payload, **options)
+    finally:
+        serialize.orjson = saved
+
+
+def sample_payloads() -> list:
+    from bench_records import synthetic_inventory
+
+    return [
+        {"inventory": synthetic_inventory(20), "stats": {"live": 20, "total_products": 20}},
+        # Titles and copy carry macrons and curly quotes.
+        {"title": "Pounamu twist — Māori greenstone “koru” pendant", "sub": "Te reo: kia ora"},
+        # related_index.json and link_health.json hold floats.
+        {"neighbours": {"books/a": [["books/b", 0.4213], ["food/c", 0.05]]}, "elapsed_ms": 12.5, "score": 1.0},
+        {"empty_list": [], "empty_object": {}, "null": None, "flags": [True, False], "nested": [[], [{}]]},
+    ]
+
+
+@needs_orjson
+@pytest.mark.parametrize("compact", [False, True], ids=["pretty", "compact"])
+def test_backends_agree_on_data_files(compact):
+    assert DATA_FILES, "no JSON data files found"
+    for path in DATA_FILES:
+        payload = json.loads(path.read_bytes())
+        assert serialize.dumps(payload, compact=compact) == stdlib_dumps(payload, compact=compact), path
+
+
+@needs_orjson
+@pytest.mark.parametrize("compact", [False, True], ids=["pretty", "compact"])
+def test_backends_agree_on_written_payloads(compact):
+    for payload in sample_payloads():
+        assert serialize.dumps(payload, compact=compact) == stdlib_dumps(payload, compact=compact)
+
+
+def test_committed_files_are_already_in_written_form():
+    # Loading and rewriting a committed file must not produce a diff.
+    # Catalogs are written ASCII-escaped, the way write_catalog does.
+    for path in (ROOT / "books" / "products.json", ROOT / "data" / "proposal_queue.json"):
+        if path.exists():
+            written = serialize.dumps(json.loads(path.read_bytes()), ensure_ascii=path.name == "products.json")
+            assert written == path.read_bytes(), path
+
+
+def test_unsupported_values_fall_back_to_stdlib():
+    assert serialize.dumps({1: 2**70}, compact=True) == b'{"1":1180591620717411303424}\n'
+
+
+def test_iter_array_yields_items_of_one_key(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text('{"stats": {"live": 2}, "inventory": [{"id": "a"}, {"id": "b"}], "after": []}')
+    assert [item["id"] for item in serialize.iter_array(path, "inventory")] == ["a", "b"]
+    assert list(serialize.iter_array(path, "missing")) == []
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import pytest
+
+from nzgift import state
+from similarity_index import (
+    DUPLICATE_THRESHOLD,
+    SimilarityIndex,
+    load_index,
+    shingles,
+    sync_index,
+    update_index,
+)
+
+SCARF = "Merino Possum Wool Travel Scarf Charcoal"
+
+
+@pytest.fixture
+def index() -> SimilarityIndex:
+    index = SimilarityIndex()
+    index.add("clothing/scarf", SCARF, title=SCARF)
+    index.add("jewellery/koru", "Pounamu Greenstone Koru Pendant Necklace", title="Koru pendant")
+    return index
+
+
+def test_shingles_drop_stopwords_accents_and_punctuation():
+    assert shingles("The Māori Kōwhai—Gift Set for NZ") == {"maori", "kowhai", "maori kowhai"}
+
+
+def test_query_finds_a_near_duplicate_title(index):
+    matches = index.query("Merino Possum Wool Travel Scarf Grey")
+    assert [match["id"] for match in matches] == ["clothing/scarf"]
+    assert matches[0]["score"] >= DUPLICATE_THRESHOLD
+    assert (matches[0]["title"], matches[0]["kind"]) == (SCARF, "inventory")
+
+
+def test_query_ignores_unrelated_titles(index):
+    assert index.query("Manuka Honey UMF 10+ 500g") == []
+    assert index.query("") == []
+
+
+def test_threshold_decides_what_counts_as_a_duplicate(index):
+    gloves = "Merino Possum Wool Gloves Charcoal"
+    assert index.query(gloves) == []
+    assert [match["id"] for match in index.query(gloves, threshold=0.4)] == ["clothing/scarf"]
+
+
+def test_query_excludes_the_given_ids(index):
+    assert index.query(SCARF)[0]["score"] == 1.0
+    assert index.query(SCARF, exclude=["clothing/scarf"]) == []
+
+
+def test_changed_text_replaces_the_old_signature(index):
+    index.add("clothing/scarf", "Manuka Honey UMF 10+ 500g")
+    assert index.query(SCARF) == []
+    assert [match["id"] for match in index.query("Manuka Honey UMF 10+ 250g")] == ["clothing/scarf"]
+    index.remove("clothing/scarf")
+    assert "clothing/scarf" not in index.entries
+    assert all("clothing/scarf" not in bucket for bucket in index.buckets.values())
+
+
+def test_sync_index_drops_proposals_no_longer_queued():
+    index = SimilarityIndex()
+    inventory = {"inventory": [{"id": "clothing/scarf", "title": SCARF}]}
+    queued = {"items": [{"id": "proposal/A", "title": "Koru Pendant"}, {"id": "proposal/B", "title": "Tui Print"}]}
+    sync_index(index, inventory, queued)
+    assert {key: entry["kind"] for key, entry in index.entries.items()} == {
+        "clothing/scarf": "inventory",
+        "proposal/A": "proposal",
+        "proposal/B": "proposal",
+    }
+    sync_index(index, inventory, {"items": queued["items"][1:]})
+    assert set(index.entries) == {"clothing/scarf", "proposal/B"}
+    # Without a proposal queue, proposals are left alone.
+    sync_index(index, {"inventory": []})
+    assert set(index.entries) == {"clothing/scarf", "proposal/B"}
+
+
+def test_update_index_saves_and_reloads(tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "STORE", state.StateStore())
+    path = tmp_path / "similarity_index.json"
+    update_index(lambda index: index.add("clothing/scarf", SCARF, title=SCARF), path)
+    update_index(lambda index: index.add("jewellery/koru", "Pounamu Koru Pendant"), path)
+    loaded = load_index(path)
+    assert set(loaded.entries) == {"clothing/scarf", "jewellery/koru"}
+    assert loaded.query("Merino Possum Wool Travel Scarf Grey")[0]["id"] == "clothing/scarf"
+
+
+def test_an_index_built_with_other_parameters_starts_over():
+    payload = SimilarityIndex().to_payload() | {"num_perm": 128, "entries": {"x": {"signature": [1] * 128}}}
+    assert SimilarityIndex.from_payload(payload).entries == {}
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from nzgift import serialize, state
+from nzgift.state import VersionConflict, commit_json, read_versioned, update_json, version_of, with_retries
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    # The shared cache is process-wide; each test starts from an empty one.
+    monkeypatch.setattr(state, "STORE", state.StateStore())
+    monkeypatch.setattr(state.time, "sleep", lambda seconds: None)
+
+
+def write(path, payload) -> None:
+    # As another process would: an atomic replace, so the version changes.
+    serialize.write_json(path, payload)
+
+
+def test_with_retries_reruns_after_a_conflict(tmp_path):
+    calls = []
+
+    def attempt():
+        calls.append(1)
+        if len(calls) < 3:
+            raise VersionConflict(tmp_path / "x.json", None, (1, 2, 3))
+        return "done"
+
+    assert with_retries(attempt) == "done"
+    assert len(calls) == 3
+
+
+def test_with_retries_gives_up_after_its_attempts(tmp_path):
+    calls = []
+
+    def attempt():
+        calls.append(1)
+        raise VersionConflict(tmp_path / "x.json", None, None)
+
+    with pytest.raises(VersionConflict, match="x.json changed on disk"):
+        with_retries(attempt, attempts=4)
+    assert len(calls) == 4
+
+
+def test_with_retries_does_not_retry_other_errors():
+    calls = []
+
+    def attempt():
+        calls.append(1)
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        with_retries(attempt)
+    assert len(calls) == 1
+
+
+def test_write_refuses_a_file_replaced_since_it_was_loaded(tmp_path):
+    path = tmp_path / "state.json"
+    write(path, {"n": 1})
+    payload = state.load_json(path)
+    write(path, {"n": 2})  # another process
+    payload["n"] += 10
+    with pytest.raises(VersionConflict) as excinfo:
+        state.write_json(path, payload)
+    assert excinfo.value.expected != excinfo.value.found
+    assert json.loads(path.read_text()) == {"n": 2}
+
+
+def test_update_json_reapplies_on_a_fresh_read_after_a_conflict(tmp_path):
+    path = tmp_path / "counter.json"
+    write(path, {"n": 0})
+    raced = []
+
+    def bump(payload):
+        if not raced:
+            raced.append(1)
+            write(path, {"n": 5})  # lands between this read and the write
+        payload["n"] += 1
+
+    assert update_json(path, bump)["n"] == 6
+    assert json.loads(path.read_text()) == {"n": 6}
+
+
+def test_update_json_creates_the_file_from_default(tmp_path):
+    path = tmp_path / "new.json"
+    update_json(path, lambda payload: payload["items"].append("a"), default=lambda: {"items": []})
+    assert json.loads(path.read_text()) == {"items": ["a"]}
+
+
+def test_commit_json_writes_nothing_when_any_file_conflicts(tmp_path):
+    first, second = tmp_path / "a.json", tmp_path / "b.json"
+    write(first, {"v": 1})
+    write(second, {"v": 1})
+    a, a_version = read_versioned(first)
+    b, b_version = read_versioned(second)
+    write(second, {"v": "theirs"})
+    a["v"] = b["v"] = "mine"
+    with pytest.raises(VersionConflict):
+        commit_json([(first, a, a_version), (second, b, b_version)])
+    assert json.loads(first.read_text()) == {"v": 1}
+    assert json.loads(second.read_text()) == {"v": "theirs"}
+
+
+def test_commit_json_expects_a_missing_file_to_stay_missing(tmp_path):
+    path = tmp_path / "queue.json"
+    assert version_of(path) is None
+    commit_json([(path, {"items": []}, None)])
+    assert json.loads(path.read_text()) == {"items": []}
+    with pytest.raises(VersionConflict):
+        commit_json([(path, {"items": ["late"]}, None)])
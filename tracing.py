@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+
+from nzgift import serialize
+
+ROOT = Path(__file__).resolve().parent
+RUN_LOGS_DIR = ROOT / "data" / "run_logs"
+MAX_SPANS = 50_000
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_spans: deque[dict[str, Any]] = deque(maxlen=MAX_SPANS)
+_local = threading.local()
+_next_id = 0
+_id_lock = threading.Lock()
+_epoch_ns = time.perf_counter_ns()
+
+
+def _new_span_id() -> int:
+    global _next_id
+    with _id_lock:
+        _next_id += 1
+        return _next_id
+
+
+@contextmanager
+def span(name: str, stage: str, **attrs: Any) -> Iterator[dict[str, Any]]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    span_id = _new_span_id()
+    parent_id = stack[-1] if stack else None
+    stack.append(span_id)
+    start = time.perf_counter_ns()
+    error = None
+    try:
+        yield attrs
+    except BaseException as exc:
+        error = type(exc).__name__
+        raise
+    finally:
+        duration = time.perf_counter_ns() - start
+        stack.pop()
+        _spans.append(
+            {
+                "id": span_id,
+                "parent": parent_id,
+                "name": name,
+                "stage": stage,
+                "start_us": (start - _epoch_ns) // 1000,
+                "duration_us": duration // 1000,
+                "thread": threading.get_ident(),
+                "error": error,
+                "attrs": attrs,
+            }
+        )
+
+
+def traced(stage: str, name: str | None = None) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(span_name, stage):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def collected_spans() -> list[dict[str, Any]]:
+    return list(_spans)
+
+
+def reset() -> None:
+    _spans.clear()
+
+
+def _percentile(sorted_values: list[int], pct: float) -> int:
+    if not sorted_values:
+        return 0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(spans: list[dict[str, Any]], key: str = "stage") -> dict[str, dict[str, float]]:
+    grouped: dict[str, list[int]] = {}
+    for record in spans:
+        grouped.setdefault(record[key], []).append(record["duration_us"])
+    summary: dict[str, dict[str, float]] = {}
+    for group, durations in sorted(grouped.items()):
+        durations.sort()
+        summary[group] = {
+            "count": len(durations),
+            "total_ms": round(sum(durations) / 1000, 3),
+            "p50_ms": round(_percentile(durations, 50) / 1000, 3),
+            "p95_ms": round(_percentile(durations, 95) / 1000, 3),
+        }
+    return summary
+
+
+def chrome_trace(spans: list[dict[str, Any]]) -> dict[str, Any]:
+    pid = os.getpid()
+    return {
+        "traceEvents": [
+            {
+                "name": record["name"],
+                "cat": record["stage"],
+                "ph": "X",
+                "ts": record["start_us"],
+                "dur": record["duration_us"],
+                "pid": pid,
+                "tid": record["thread"],
+                "args": {**record["attrs"], "error": record["error"]} if record["error"] else record["attrs"],
+            }
+            for record in spans
+        ],
+        "displayTimeUnit": "ms",
+    }
+
+
+def write_run_log(run_name: str, *, chrome: bool = False, extra: dict[str, Any] | None = None) -> dict[str, str]:
+    spans = collected_spans()
+    RUN_LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+    base = RUN_LOGS_DIR / f"{stamp}-{run_name}"
+
+    spans_path = base.with_suffix(".spans.jsonl")
+    with spans_path.open("w", encoding="utf-8") as handle:
+        for record in spans:
+            handle.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    summary_path = base.with_suffix(".summary.json")
+    summary = {
+        "run": run_name,
+        "generated_at": datetime.now(UTC).isoformat(),
+        "span_count": len(spans),
+        "stages": summarize(spans, "stage"),
+        "spans": summarize(spans, "name"),
+        **(extra or {}),
+    }
+    serialize.write_json(summary_path, summary)
+
+    paths = {"spans": str(spans_path), "summary": str(summary_path)}
+    if chrome:
+        trace_path = base.with_suffix(".trace.json")
+        trace_path.write_text(json.dumps(chrome_trace(spans), default=str), encoding="utf-8")
+        paths["chrome_trace"] = str(trace_path)
+    reset()
+    return paths